@@ -8,15 +8,20 @@
 # Imports
 
 
+import hashlib
 import httplib
 import httplib2
 import logging
 import os
+import Queue
 import simplejson as json
 import socket
+import threading
 import time
 import urllib
 
+from collections import OrderedDict
+
 from analysis_engine import settings
 
 
@@ -27,6 +32,19 @@ logger = logging.getLogger(name=__name__)
 
 TIMEOUT = 15
 
+# Maximum number of idle HTTP clients, each with its own keep-alive
+# connections, kept by an HTTP API handler for reuse.
+POOL_SIZE = 4
+
+# The delay between retrying requests is multiplied by BACKOFF after each
+# failed attempt, up to MAX_DELAY seconds.
+BACKOFF = 2
+MAX_DELAY = 60
+
+# Status of cached responses.
+CACHE_OK = 'ok'
+CACHE_NOT_FOUND = 'not_found'
+
 
 ##############################################################################
 # Exceptions
@@ -81,6 +99,242 @@ class UnknownAPIError(APIError):
     pass
 
 
+##############################################################################
+# HTTP Connection Pool
+
+
+class HTTPConnectionPool(object):
+    '''
+    Pool of httplib2.Http clients which keep their connections to the API
+    server alive between requests.
+
+    httplib2.Http is not thread safe, so a client is taken from the pool for
+    each request and returned to the pool afterwards. Nodes may be derived in
+    several threads at once, in which case additional clients are created.
+    Clients created in a parent process are discarded after forking, as
+    their sockets are shared with the parent.
+    '''
+
+    def __init__(self, size=POOL_SIZE):
+        '''
+        :param size: Maximum number of idle clients to keep.
+        :type size: int
+        '''
+        self.size = size
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+    def _create(self, timeout):
+        '''
+        :param timeout: Request timeout in seconds.
+        :type timeout: int
+        :rtype: httplib2.Http
+        '''
+        disable_validation = not os.path.exists(settings.CA_CERTIFICATE_FILE)
+        return httplib2.Http(
+            ca_certs=settings.CA_CERTIFICATE_FILE,
+            disable_ssl_certificate_validation=disable_validation,
+            timeout=timeout,
+            proxy_info=settings.API_PROXY_INFO,
+        )
+
+    def acquire(self, timeout=TIMEOUT):
+        '''
+        Take an idle client from the pool or create one.
+
+        :param timeout: Request timeout in seconds.
+        :type timeout: int
+        :rtype: httplib2.Http
+        '''
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked since the clients were created.
+                self._clients = {}
+                self._pid = os.getpid()
+            clients = self._clients.get(timeout)
+            if clients:
+                return clients.pop()
+        return self._create(timeout)
+
+    def release(self, http, timeout=TIMEOUT):
+        '''
+        Return a client to the pool after a successful request. The client
+        is closed if the pool is full.
+
+        :param http: Client taken from the pool with acquire.
+        :type http: httplib2.Http
+        :param timeout: Request timeout which the client was acquired with.
+        :type timeout: int
+        '''
+        with self._lock:
+            if self._pid == os.getpid():
+                clients = self._clients.setdefault(timeout, [])
+                if sum(len(c) for c in self._clients.values()) < self.size:
+                    clients.append(http)
+                    return
+        self.discard(http)
+
+    @staticmethod
+    def discard(http):
+        '''
+        Close the connections of a client which will not be reused, e.g.
+        after a connection error.
+
+        :param http: Client taken from the pool with acquire.
+        :type http: httplib2.Http
+        '''
+        for connection in getattr(http, 'connections', {}).values():
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close(self):
+        '''
+        Close the connections of all idle clients.
+        '''
+        with self._lock:
+            clients = [http for c in self._clients.values() for http in c]
+            self._clients = {}
+        for http in clients:
+            self.discard(http)
+
+
+##############################################################################
+# Response Cache
+
+
+class ResponseCache(object):
+    '''
+    Cache of API responses keyed by URL. Responses are held in memory,
+    evicting the least recently used, and are optionally also stored on disk
+    so that they are reused by later processes.
+
+    Entries are (status, content) tuples, where status is CACHE_OK with the
+    JSON content of the response or CACHE_NOT_FOUND with the error message.
+    Any object with the same get and set methods may be used as the cache of
+    an HTTP API handler.
+    '''
+
+    def __init__(self, size=None, directory=None):
+        '''
+        :param size: Maximum number of entries held in memory. Defaults to API_CACHE_SIZE.
+        :type size: int or None
+        :param directory: Directory to store entries within or None to only hold entries in memory.
+        :type directory: str or None
+        '''
+        self.size = settings.API_CACHE_SIZE if size is None else size
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha1(key).hexdigest() + '.json')
+
+    def get(self, key):
+        '''
+        :param key: URL of the request.
+        :type key: str
+        :returns: The entry or None if it is not cached or has expired.
+        :rtype: (str, str) or None
+        '''
+        now = time.time()
+        with self._lock:
+            cached = self._entries.pop(key, None)
+            if cached is not None and cached[0] > now:
+                # Most recently used entries are last.
+                self._entries[key] = cached
+                return cached[1]
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as cache_file:
+                stored = json.load(cache_file)
+        except (IOError, ValueError):
+            return None
+        if stored.get('key') != key or stored.get('expires', 0) <= now:
+            return None
+        entry = (stored['status'], stored['content'])
+        self._hold(key, entry, stored['expires'])
+        return entry
+
+    def set(self, key, entry, ttl):
+        '''
+        :param key: URL of the request.
+        :type key: str
+        :param entry: Status and content of the response.
+        :type entry: (str, str)
+        :param ttl: Time in seconds for which the entry is valid.
+        :type ttl: int or float
+        '''
+        expires = time.time() + ttl
+        self._hold(key, entry, expires)
+        if not self.directory:
+            return
+        path = self._path(key)
+        temp_path = '%s.%d.%d.tmp' % (path, os.getpid(),
+                                      threading.current_thread().ident)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(temp_path, 'w') as cache_file:
+                json.dump({'key': key, 'expires': expires,
+                           'status': entry[0], 'content': entry[1]},
+                          cache_file)
+            # Replacing the file is atomic, so other processes read either
+            # the previous or the new entry.
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            logger.warning("Unable to store API response in '%s'.", path,
+                           exc_info=True)
+
+    def _hold(self, key, entry, expires):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.size <= 0:
+                return
+            self._entries[key] = (expires, entry)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        '''
+        Remove all entries held in memory. Entries stored on disk are kept.
+        '''
+        with self._lock:
+            self._entries.clear()
+
+
+class _PendingRequest(object):
+    '''
+    A request in progress which other threads requesting the same URL wait
+    for rather than making the same request.
+    '''
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.content = None
+        self.error = None
+
+    def finish(self, content=None, error=None):
+        self.content = content
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        '''
+        :raises APIError: The error raised by the request.
+        :returns: Decoded JSON content of the response.
+        :rtype: dict
+        '''
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return json.loads(self.content)
+
+
 ##############################################################################
 # HTTP API Handler
 
@@ -90,17 +344,37 @@ class APIHandlerHTTP(object):
     Restful HTTP API Handler.
     '''
 
-    def __init__(self, attempts=3, delay=2):
+    def __init__(self, attempts=3, delay=2, pool_size=POOL_SIZE, cache=None,
+                 max_delay=MAX_DELAY):
         '''
         Initialises an HTTP API handler.
 
         :param attempts: Number of retry attempts before raising an exception.
         :type attempts: int
-        :param delay: Time to wait between retrying requests.
+        :param delay: Time to wait before retrying the first failed request. The delay is multiplied by BACKOFF for each further attempt.
         :type delay: int or float
+        :param pool_size: Maximum number of idle HTTP clients to keep for reuse.
+        :type pool_size: int
+        :param cache: Cache of responses. Defaults to a ResponseCache of API_CACHE_SIZE entries stored within API_CACHE_DIR.
+        :type cache: ResponseCache or None
+        :param max_delay: Maximum time to wait between retrying requests.
+        :type max_delay: int or float
         '''
         self.attempts = max(attempts, 1)
         self.delay = abs(delay)
+        self.max_delay = max_delay
+        self.pool = HTTPConnectionPool(pool_size)
+        if cache is None:
+            cache = ResponseCache(directory=settings.API_CACHE_DIR)
+        self.cache = cache
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def close(self):
+        '''
+        Close the connections kept alive by the handler.
+        '''
+        self.pool.close()
 
     def _request(self, uri, method='GET', body='', timeout=TIMEOUT):
         '''
@@ -123,27 +397,25 @@ class APIHandlerHTTP(object):
         :raises JSONDecodeError: If status code is 200, but content is not
                 JSON.
         '''
-        # Prepare the request object:
+        # Prepare the request object, reusing a kept alive connection:
         body = urllib.urlencode(body)
-        disable_validation = not os.path.exists(settings.CA_CERTIFICATE_FILE)
-        http = httplib2.Http(
-            ca_certs=settings.CA_CERTIFICATE_FILE,
-            disable_ssl_certificate_validation=disable_validation,
-            timeout=timeout,
-            proxy_info=settings.API_PROXY_INFO,
-        )
-        
-        # Attempt to make the API request:
-        socket_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(timeout)
+        http = self.pool.acquire(timeout)
+
+        # Attempt to make the API request. The client was created with the
+        # timeout, so the process-wide socket default is left alone as
+        # requests are made from several threads at once:
         try:
             response, content = http.request(uri, method, body)
         except (httplib2.ServerNotFoundError, socket.error, AttributeError):
             # Usually a result of errors with DNS...
             logger.exception("Connection Error")
+            self.pool.discard(http)
             raise APIConnectionError(uri, method, body)
-        finally:
-            socket.setdefaulttimeout(socket_timeout)
+        except Exception:
+            self.pool.discard(http)
+            raise
+        else:
+            self.pool.release(http, timeout)
 
         # Check the status code of the response:
         status = int(response['status'])
@@ -193,21 +465,141 @@ class APIHandlerHTTP(object):
                 logger.info('API Request args: %s | kwargs: %s', args, kwargs)
                 return self._request(*args, **kwargs)
             except (APIConnectionError, UnknownAPIError) as error:
+                if attempt == self.attempts - 1:
+                    logger.exception("'%s' error in request after %d "
+                                     "attempts.", error, self.attempts)
+                    break
+                delay = min(self.delay * BACKOFF ** attempt, self.max_delay)
                 msg = "'%s' error in request, retrying in %.2f seconds..."
-                logger.exception(msg, error, self.delay)
-                time.sleep(self.delay)
+                logger.exception(msg, error, delay)
+                time.sleep(delay)
         if isinstance(error, Exception):
             raise error
 
+    def _cached_request(self, uri, endpoint):
+        '''
+        Request a URI, reusing the cached response if the endpoint's
+        responses are cached. NotFoundError is also cached so that missing
+        entries are not requested repeatedly. When several threads request
+        the same URI at once, only one request is made.
+
+        :param uri: URI to request.
+        :type uri: str
+        :param endpoint: Name of the endpoint within API_CACHE_TTLS.
+        :type endpoint: str
+        :raises Exception: If self._attempt_request() does so.
+        :returns: Decoded JSON object if successful.
+        :rtype: dict
+        '''
+        ttl = settings.API_CACHE_TTLS.get(endpoint)
+        if not ttl:
+            return self._attempt_request(uri)
+        entry = self.cache.get(uri)
+        if entry is None:
+            with self._pending_lock:
+                pending = self._pending.get(uri)
+                if pending is None:
+                    # Check again as the request may have finished since.
+                    entry = self.cache.get(uri)
+                    if entry is None:
+                        request = self._pending[uri] = _PendingRequest()
+            if pending is not None:
+                return pending.wait()
+        if entry is not None:
+            status, content = entry
+            if status == CACHE_NOT_FOUND:
+                raise NotFoundError(content, uri, 'GET')
+            return json.loads(content)
+
+        content = error = None
+        try:
+            response = self._attempt_request(uri)
+            content = json.dumps(response)
+            self.cache.set(uri, (CACHE_OK, content), ttl)
+        except BaseException as error:
+            if isinstance(error, NotFoundError):
+                message = error.args[0] if error.args else ''
+                self.cache.set(uri, (CACHE_NOT_FOUND, message),
+                               settings.API_CACHE_NOT_FOUND_TTL)
+            raise
+        finally:
+            with self._pending_lock:
+                del self._pending[uri]
+            # Threads waiting for the same URI are given the response or the
+            # error.
+            request.finish(content, error)
+        return response
+
+    def _request_all(self, function, arguments):
+        '''
+        Call a function making requests with each of the arguments
+        concurrently so that the requests take about as long as a single
+        request. Up to the pool size of threads are used so that each has its
+        own keep-alive connection.
+
+        :param function: Function making a request.
+        :type function: callable
+        :param arguments: Positional arguments of each call.
+        :type arguments: [tuple]
+        :raises APIError: The first error other than NotFoundError raised by the calls.
+        :returns: Result of each call, or None if it raised NotFoundError.
+        :rtype: list
+        '''
+        results = [None] * len(arguments)
+        errors = []
+        calls = Queue.Queue()
+        for call in enumerate(arguments):
+            calls.put(call)
+
+        def make_calls():
+            while True:
+                try:
+                    index, args = calls.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results[index] = function(*args)
+                except NotFoundError:
+                    pass
+                except Exception as error:
+                    errors.append((index, error))
+
+        # The calling thread also makes calls.
+        threads = [threading.Thread(target=make_calls) for _ in
+                   range(min(self.pool.size, len(arguments)) - 1)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        make_calls()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise min(errors)[1]
+        return results
+
 
 ##############################################################################
 # API Handler Lookup Function
 
 
+# Handler instances created by get_api_handler keyed by the handler path and
+# instantiation arguments.
+_api_handlers = {}
+
+_api_handlers_lock = threading.Lock()
+
+
 def get_api_handler(handler_path, *args, **kwargs):
     '''
     Returns an instance of the class specified by the handler_path.
 
+    Handlers are created once per process for each handler path and set of
+    instantiation arguments and then shared by every caller, so that the
+    local handler's data files are loaded once and the HTTP handler's
+    connections are kept alive. Results returned by a handler should
+    therefore not be modified. Use clear_api_handlers to create new
+    handlers, e.g. after changing settings.
+
     :param handler_path: Path to handler module, e.g. project.module.APIHandler
     :type handler_path: string
     :param args: Handler class instantiation args.
@@ -215,6 +607,29 @@ def get_api_handler(handler_path, *args, **kwargs):
     :param kwargs: Handler class instantiation kwargs.
     :type kwargs: dict
     '''
+    key = (handler_path, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable arguments cannot be looked up, so are not shared.
+        return _create_api_handler(handler_path, *args, **kwargs)
+    handler = _api_handlers.get(key)
+    if handler is None:
+        with _api_handlers_lock:
+            handler = _api_handlers.get(key)
+            if handler is None:
+                handler = _create_api_handler(handler_path, *args, **kwargs)
+                _api_handlers[key] = handler
+    return handler
+
+
+def _create_api_handler(handler_path, *args, **kwargs):
+    '''
+    Imports and instantiates the class specified by the handler_path.
+
+    :param handler_path: Path to handler module, e.g. project.module.APIHandler
+    :type handler_path: string
+    '''
     import_path_split = handler_path.split('.')
     class_name = import_path_split.pop()
     module_path = '.'.join(import_path_split)
@@ -224,5 +639,19 @@ def get_api_handler(handler_path, *args, **kwargs):
     return handler_class(*args, **kwargs)
 
 
+def clear_api_handlers():
+    '''
+    Closes and forgets the handlers created by get_api_handler so that new
+    handlers are created by subsequent calls.
+    '''
+    with _api_handlers_lock:
+        handlers = _api_handlers.values()
+        _api_handlers.clear()
+    for handler in handlers:
+        close = getattr(handler, 'close', None)
+        if close is not None:
+            close()
+
+
 ##############################################################################
 # vim:et:ft=python:nowrap:sts=4:sw=4:ts=4
@@ -7,6 +7,7 @@
 ##############################################################################
 # Imports
 
+import numpy as np
 import os
 import simplejson
 import urllib
@@ -19,9 +20,198 @@ from operator import itemgetter
 from analysis_engine.api_handler import (APIHandlerHTTP,
                                          IncompleteEntryError,
                                          NotFoundError)
+from analysis_engine.api_snapshot import (CodeLookup,
+                                          Snapshot,
+                                          airport_columns,
+                                          runway_columns)
 from analysis_engine.library import bearing_and_distance
 
 
+# Radius of the earth used by bearing_and_distance.
+EARTH_RADIUS = 6371000  # metres
+
+
+##############################################################################
+# Spatial Index
+
+
+def _unit_vectors(latitudes, longitudes):
+    '''
+    :param latitudes: Latitudes in decimal degrees.
+    :type latitudes: [float] or np.ndarray
+    :param longitudes: Longitudes in decimal degrees.
+    :type longitudes: [float] or np.ndarray
+    :returns: Points on the unit sphere of the locations.
+    :rtype: np.ndarray of shape (n, 3)
+    '''
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack((cos_latitudes * np.cos(longitudes),
+                            cos_latitudes * np.sin(longitudes),
+                            np.sin(latitudes)))
+
+
+class LocationIndex(object):
+    '''
+    Spatial index of locations for nearest location lookups.
+
+    The locations are stored within a KD-tree as points on the unit sphere.
+    The straight line (chord) distance between points on the sphere
+    increases with the great circle distance, so the nearest points within
+    the tree are the nearest locations. The distances of the nearest
+    locations are calculated with bearing_and_distance so that the result is
+    the same as comparing the distance to every location.
+    '''
+
+    # Chord distances within this relative tolerance of the nearest are
+    # compared by their great circle distance.
+    TOLERANCE = 1e-9
+
+    # Number of accepted locations below which they are compared directly
+    # rather than searched for within the tree.
+    DIRECT_COUNT = 16
+
+    def __init__(self, latitudes, longitudes):
+        '''
+        :param latitudes: Latitudes of the locations in decimal degrees.
+        :type latitudes: [float]
+        :param longitudes: Longitudes of the locations in decimal degrees.
+        :type longitudes: [float]
+        '''
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self._kd_tree = None
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @property
+    def _tree(self):
+        '''
+        The KD-tree is built when it is first used so that loading data
+        which is not searched is not delayed.
+        '''
+        if self._kd_tree is None:
+            from scipy.spatial import cKDTree
+            self._kd_tree = cKDTree(_unit_vectors(self.latitudes,
+                                                  self.longitudes))
+        return self._kd_tree
+
+    def _distance(self, latitude, longitude, index):
+        return bearing_and_distance(latitude, longitude,
+                                    self.latitudes[index],
+                                    self.longitudes[index])[1]
+
+    def _nearest_of(self, latitude, longitude, indices):
+        '''
+        :returns: Index and distance of the nearest of the locations, the first if several are equally near.
+        :rtype: (int, float)
+        '''
+        return min((self._distance(latitude, longitude, index), index)
+                   for index in indices)[::-1]
+
+    def _limit(self, chord):
+        return chord * (1 + self.TOLERANCE) + self.TOLERANCE
+
+    def within(self, latitude, longitude, distance):
+        '''
+        :param latitude: Latitude in decimal degrees.
+        :type latitude: float
+        :param longitude: Longitude in decimal degrees.
+        :type longitude: float
+        :param distance: Great circle distance in metres.
+        :type distance: float
+        :returns: Whether each location is within the distance of the location.
+        :rtype: np.ndarray of bool
+        '''
+        within = np.zeros(len(self), dtype=bool)
+        if len(self):
+            # Length of the chord between points on the unit sphere the
+            # distance apart.
+            chord = 2 * np.sin(min(distance / (2.0 * EARTH_RADIUS), np.pi / 2))
+            point = _unit_vectors([latitude], [longitude])[0]
+            within[self._tree.query_ball_point(point, chord)] = True
+        return within
+
+    def nearest(self, latitude, longitude, accept=None):
+        '''
+        Where locations are equally near, the first is returned.
+
+        :param latitude: Latitude in decimal degrees.
+        :type latitude: float
+        :param longitude: Longitude in decimal degrees.
+        :type longitude: float
+        :param accept: Whether each location may be returned, or None to accept all locations.
+        :type accept: np.ndarray of bool or None
+        :returns: Index and distance in metres of the nearest accepted location, or None if no location is accepted.
+        :rtype: (int, float) or None
+        '''
+        if accept is not None:
+            accepted = np.flatnonzero(accept)
+            if len(accepted) <= self.DIRECT_COUNT:
+                if not len(accepted):
+                    return None
+                return self._nearest_of(latitude, longitude, accepted.tolist())
+        elif not len(self):
+            return None
+        point = _unit_vectors([latitude], [longitude])[0]
+        k = self.DIRECT_COUNT
+        while True:
+            k = min(k, len(self))
+            all_chords, indices = self._tree.query(point, k=k)
+            all_chords = np.atleast_1d(all_chords)
+            chords = all_chords
+            indices = np.atleast_1d(indices)
+            if accept is not None:
+                chords = chords[accept[indices]]
+                indices = indices[accept[indices]]
+            if len(chords):
+                limit = self._limit(chords[0])
+                # All locations which are almost as near as the nearest are
+                # compared, so the search continues until a location beyond
+                # the limit is found.
+                if k == len(self) or all_chords[-1] > limit:
+                    break
+            k *= 2
+        return self._nearest_of(latitude, longitude,
+                                indices[chords <= limit].tolist())
+
+    def nearest_many(self, latitudes, longitudes):
+        '''
+        Lookup of the nearest location to each of many locations with a
+        single search of the tree. The results are the same as those of
+        nearest.
+
+        :param latitudes: Latitudes in decimal degrees.
+        :type latitudes: [float]
+        :param longitudes: Longitudes in decimal degrees.
+        :type longitudes: [float]
+        :returns: Index and distance in metres of the nearest location to each location, or None if there are no locations.
+        :rtype: [(int, float) or None]
+        '''
+        if not len(self):
+            return [None] * len(latitudes)
+        if not len(latitudes):
+            return []
+        k = min(self.DIRECT_COUNT, len(self))
+        all_chords, all_indices = self._tree.query(
+            _unit_vectors(latitudes, longitudes), k=k)
+        all_chords = np.reshape(all_chords, (len(latitudes), k))
+        all_indices = np.reshape(all_indices, (len(latitudes), k))
+        results = []
+        for latitude, longitude, chords, indices in zip(
+                latitudes, longitudes, all_chords, all_indices):
+            limit = self._limit(chords[0])
+            if k < len(self) and chords[-1] <= limit:
+                # More locations are almost as near than were searched for.
+                results.append(self.nearest(latitude, longitude))
+            else:
+                results.append(self._nearest_of(
+                    latitude, longitude, indices[chords <= limit].tolist()))
+        return results
+
+
 ##############################################################################
 # Analysis Engine API Handlers
 
@@ -125,6 +315,46 @@ class AnalysisEngineAPI(object):
         '''
         raise NotImplementedError
 
+    def get_nearest_airports(self, coordinates):
+        '''
+        Will return the nearest airport to each of the specified locations.
+        Handlers look up all of the airports at once where they can.
+
+        :param coordinates: Latitude and longitude in decimal degrees of each location.
+        :type coordinates: [(float, float)]
+        :raises InvalidAPIInputError: If latitude or longitude are out of
+                bounds.
+        :returns: Airport info dictionary for each location, or None where an airport cannot be found.
+        :rtype: [dict or None]
+        '''
+        airports = []
+        for latitude, longitude in coordinates:
+            try:
+                airports.append(self.get_nearest_airport(latitude, longitude))
+            except NotFoundError:
+                airports.append(None)
+        return airports
+
+    def get_nearest_runways(self, queries):
+        '''
+        Will return the nearest runway for each of the queries. Handlers look
+        up all of the runways at once where they can.
+
+        :param queries: Arguments of get_nearest_runway for each runway, e.g. {'airport': 2461, 'heading': 14, 'ils_freq': 110.3}.
+        :type queries: [dict]
+        :raises InvalidAPIInputError: If latitude, longitude or heading are out
+                of bounds.
+        :returns: Runway info dictionary for each query, or None where a runway cannot be found.
+        :rtype: [dict or None]
+        '''
+        runways = []
+        for query in queries:
+            try:
+                runways.append(self.get_nearest_runway(**query))
+            except NotFoundError:
+                runways.append(None)
+        return runways
+
 
 ########################################
 # Dummy API Handler
@@ -175,7 +405,7 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
             'base_url': BASE_URL.rstrip('/'),
             'tail_number': tail_number,
         }
-        return self._attempt_request(url)['aircraft']
+        return self._cached_request(url, 'aircraft')['aircraft']
     
     def get_analyser_profiles(self, tail_number):
         '''
@@ -192,7 +422,8 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
             'base_url': BASE_URL.rstrip('/'),
             'tail_number': tail_number,
         }
-        return self._attempt_request(url)['analyser_profiles']
+        response = self._cached_request(url, 'analyser_profiles')
+        return response['analyser_profiles']
     
     def get_airport(self, code):
         '''
@@ -210,7 +441,7 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
             'base_url': BASE_URL.rstrip('/'),
             'code': code,
         }
-        return self._attempt_request(url)['airport']
+        return self._cached_request(url, 'airport')['airport']
 
     def get_nearest_airport(self, latitude, longitude):
         '''
@@ -231,7 +462,7 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
             'base_url': BASE_URL.rstrip('/'),
             'll': '%f,%f' % (latitude, longitude),
         }
-        return self._attempt_request(url)['airport']
+        return self._cached_request(url, 'nearest_airport')['airport']
 
     def get_nearest_runway(self, airport, heading, latitude=None,
                            longitude=None, ils_freq=None, hint=None):
@@ -275,13 +506,44 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
         if hint in ['takeoff', 'landing', 'approach']:
             params['hint'] = hint
         url += '?' + urllib.urlencode(params)
-        runway = self._attempt_request(url)['runway']
+        runway = self._cached_request(url, 'nearest_runway')['runway']
         if not runway.get('end'):
             raise IncompleteEntryError(
                 "Runway ident '%s' at '%s' has no end" %
                 (runway.get('identifier', 'unknown'), airport))
         return runway
 
+    def get_nearest_airports(self, coordinates):
+        '''
+        Returns the nearest airport to each of the specified locations. The
+        requests are made concurrently.
+
+        :param coordinates: Latitude and longitude in decimal degrees of each location.
+        :type coordinates: [(float, float)]
+        :raises InvalidAPIInputError: If latitude or longitude are out of
+                bounds.
+        :returns: Airport info dictionary for each location, or None where an airport cannot be found.
+        :rtype: [dict or None]
+        '''
+        return self._request_all(self.get_nearest_airport,
+                                 [tuple(c) for c in coordinates])
+
+    def get_nearest_runways(self, queries):
+        '''
+        Returns the nearest runway for each of the queries. The requests are
+        made concurrently.
+
+        :param queries: Arguments of get_nearest_runway for each runway, e.g. {'airport': 2461, 'heading': 14, 'ils_freq': 110.3}.
+        :type queries: [dict]
+        :raises InvalidAPIInputError: If latitude, longitude or heading are out
+                of bounds.
+        :returns: Runway info dictionary for each query, or None where a runway cannot be found.
+        :rtype: [dict or None]
+        '''
+        return self._request_all(
+            lambda query: self.get_nearest_runway(**query),
+            [(query,) for query in queries])
+
     def get_data_exports(self, tail_number):
         '''
         Will either return data exports configuration for an aircraft matching
@@ -298,7 +560,7 @@ class AnalysisEngineAPIHandlerHTTP(AnalysisEngineAPI, APIHandlerHTTP):
             'base_url': BASE_URL.rstrip('/'),
             'tail_number': tail_number,
         }
-        return self._attempt_request(url)['data_exports']
+        return self._cached_request(url, 'data_exports')['data_exports']
 
 
 # Local API Handler
@@ -319,19 +581,119 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
     
     def __init__(self):
         '''
-        Load aircraft, airports and runways from yaml config files.
+        Load aircraft, airports and runways from yaml config files, or from
+        a compiled snapshot if LOCAL_API_SNAPSHOT_PATH is set, and index the
+        airports and runways for the nearest airport and runway lookups.
         '''
         from analysis_engine.settings import (
             LOCAL_API_AIRCRAFT_PATH,
             LOCAL_API_AIRPORT_PATH,
             LOCAL_API_RUNWAY_PATH,
             LOCAL_API_EXPORTS_PATH,
+            LOCAL_API_SNAPSHOT_PATH,
         )
-        self.aircraft = self._load_data(LOCAL_API_AIRCRAFT_PATH)
-        self.airports = self._load_data(LOCAL_API_AIRPORT_PATH)
-        self.runways = self._load_data(LOCAL_API_RUNWAY_PATH)
-        self.exports = self._load_data(LOCAL_API_EXPORTS_PATH)
-    
+        if LOCAL_API_SNAPSHOT_PATH:
+            # Records are decoded from the snapshot when they are accessed.
+            snapshot = Snapshot(LOCAL_API_SNAPSHOT_PATH)
+            self.aircraft = snapshot.aircraft
+            self.airports = snapshot.airports
+            self.runways = snapshot.runways
+            self.exports = snapshot.exports
+            self._build_indexes(snapshot.airport_columns(),
+                                snapshot.runway_columns())
+        else:
+            self.aircraft = self._load_data(LOCAL_API_AIRCRAFT_PATH)
+            self.airports = self._load_data(LOCAL_API_AIRPORT_PATH)
+            self.runways = self._load_data(LOCAL_API_RUNWAY_PATH)
+            self.exports = self._load_data(LOCAL_API_EXPORTS_PATH)
+            self._build_indexes()
+
+    def _build_indexes(self, airports=None, runways=None):
+        '''
+        Build the airport code lookup and the spatial indexes of the airports
+        and runways.
+
+        :param airports: Columns of the airports, see api_snapshot.airport_columns. Created from self.airports if not provided.
+        :type airports: OrderedDict of np.ndarray or None
+        :param runways: Columns of the runways, see api_snapshot.runway_columns. Created from self.runways if not provided.
+        :type runways: OrderedDict of np.ndarray or None
+        '''
+        if airports is None:
+            airports = airport_columns(self.airports)
+        if runways is None:
+            runways = runway_columns(self.runways)
+        self._airport_codes = CodeLookup(
+            airports['int_codes'], airports['int_positions'],
+            airports['str_codes'], airports['str_positions'])
+
+        # Positions within self.airports and self.runways of the locations
+        # within each index.
+        located = ~np.isnan(airports['latitude']) & \
+            ~np.isnan(airports['longitude'])
+        self._airport_positions = np.flatnonzero(located)
+        self._airport_index = LocationIndex(airports['latitude'][located],
+                                            airports['longitude'][located])
+        self._airport_latitudes = airports['latitude']
+        self._airport_longitudes = airports['longitude']
+
+        located = ~np.isnan(runways['latitude']) & \
+            ~np.isnan(runways['longitude'])
+        self._runway_positions = np.flatnonzero(located)
+        self._runway_index = LocationIndex(runways['latitude'][located],
+                                           runways['longitude'][located])
+
+        self._runway_headings = runways['magnetic_heading'][located]
+        self._runway_ils_freqs = runways['ils_freq'][located]
+
+    def _runway_filter(self, airport_position, heading, ils_freq):
+        '''
+        The runways do not record their airport, so the runways within
+        LOCAL_API_RUNWAY_AIRPORT_RADIUS of the airport are accepted. Of
+        those, the runways within LOCAL_API_RUNWAY_HEADING_TOLERANCE of the
+        heading are accepted. If none of them match the heading, all of the
+        airport's runways are accepted rather than a runway of another
+        airport. The runways with the ILS localizer frequency are then preferred
+        unless none of them have it.
+
+        :param airport_position: Position of the airport within self.airports or None.
+        :type airport_position: int or None
+        :param heading: Magnetic heading or None.
+        :type heading: float or None
+        :param ils_freq: ILS localizer frequency in MHz or None.
+        :type ils_freq: float or None
+        :returns: Whether each runway within the runway index is accepted, or None to accept all runways.
+        :rtype: np.ndarray of bool or None
+        '''
+        from analysis_engine.settings import (
+            LOCAL_API_RUNWAY_AIRPORT_RADIUS,
+            LOCAL_API_RUNWAY_HEADING_TOLERANCE,
+        )
+        if airport_position is None:
+            return None
+        latitude = self._airport_latitudes[airport_position]
+        longitude = self._airport_longitudes[airport_position]
+        if np.isnan(latitude) or np.isnan(longitude):
+            return None
+        accept = self._runway_index.within(latitude, longitude,
+                                           LOCAL_API_RUNWAY_AIRPORT_RADIUS)
+        if not accept.any():
+            return None
+        if heading is not None:
+            with np.errstate(invalid='ignore'):
+                matched = accept & (
+                    np.abs((self._runway_headings - heading + 180) % 360 - 180)
+                    <= LOCAL_API_RUNWAY_HEADING_TOLERANCE)
+            if matched.any():
+                accept = matched
+        if ils_freq:
+            # While ILS frequency is recorded in MHz, the runways store KHz.
+            with np.errstate(invalid='ignore'):
+                filtered = accept & (
+                    np.abs(self._runway_ils_freqs - ils_freq * 1000) < 1)
+            if filtered.any():
+                accept = filtered
+        return accept
+
     def get_aircraft(self, tail_number):
         '''
         Will either return an aircraft matching the tail number or raise an
@@ -360,14 +722,11 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         :returns: Airport info dictionary.
         :rtype: dict
         '''
-        for airport in self.airports:
-            if code in (airport.get('id'), airport['code'].get('iata'),
-                        airport['code'].get('icao')):
-                break
-        else:
+        position = self._airport_codes.get(code)
+        if position is None:
             raise NotFoundError("Local API Handler: Airport with code '%s' "
                                 "could not be found." % code)
-        return airport
+        return self.airports[position]
     
     def get_analyser_profiles(self, tail_number):
         '''
@@ -390,70 +749,107 @@ class AnalysisEngineAPIHandlerLocal(AnalysisEngineAPI):
         :type latitude: float
         :param longitude: Longitude value for looking up a runway.
         :type longitude: float
+        :raises NotFoundError: If there are no airports with a location.
         :returns: Airport dictionary.
         :rtype: dict
         '''
-        airports = []
-        for airport in self.airports:
-            if 'latitude' not in airport or 'longitude' not in airport:
-                continue
-            airport = copy(airport)
-            airport['distance'] = bearing_and_distance(latitude, longitude,
-                                                       airport['latitude'],
-                                                       airport['longitude'])[1]
-            airports.append(airport)
-        
-        airport = min(airports, key=itemgetter('distance'))
+        nearest = self._airport_index.nearest(latitude, longitude)
+        if nearest is None:
+            raise NotFoundError('Local API Handler: Airport could not be found')
+        return self._nearest_airport(*nearest)
+
+    def _nearest_airport(self, index, distance):
+        airport = copy(self.airports[self._airport_positions[index]])
+        airport['distance'] = distance
         return airport
 
-    def get_nearest_runway(self, airport_id, heading, latitude=None,
+    def get_nearest_airports(self, coordinates):
+        '''
+        Get the nearest airport to each of the locations from a pre-defined
+        list, searching the airport index once.
+
+        :param coordinates: Latitude and longitude of each location.
+        :type coordinates: [(float, float)]
+        :returns: Airport dictionary for each location, or None if there are no airports with a location.
+        :rtype: [dict or None]
+        '''
+        if not coordinates:
+            return []
+        latitudes, longitudes = zip(*coordinates)
+        return [self._nearest_airport(*nearest) if nearest else None
+                for nearest in self._airport_index.nearest_many(latitudes,
+                                                                longitudes)]
+
+    def get_nearest_runway(self, airport, heading, latitude=None,
                            longitude=None, ils_freq=None, hint=None):
         '''
         Get the nearest runway from a pre-defined list.
 
-        :param airport_id: ID of the airport
-        :param heading: Not used.
+        When the airport is known, the nearest of its runways matching the
+        heading is returned, preferring those with the ILS frequency. The
+        nearest of the airport's runways is returned if none of them match
+        the heading.
+
+        :param airport: Either ICAO code, IATA code or database ID of airport.
+        :type airport: int or str
+        :param heading: Magnetic heading.
+        :type heading: float
         :param latitude: Latitude value for looking up a runway.
         :type latitude: float
         :param longitude: Longitude value for looking up a runway.
         :type longitude: float
-        :param ils_freq: Not used.
+        :param ils_freq: ILS localizer frequency of the runway in MHz.
+        :type ils_freq: float
         :param hint: Not used.
         :raises NotFoundError:  If longitude or latitude is not defined.
         :returns: Runway dictionary.
         :rtype: dict
         '''
-        if not latitude or not longitude:
-            # Not precise
-            if airport_id:
-                try:
-                    airport = self.get_airport(airport_id)
-                except NotFoundError:
-                    airport = None
-
-            if airport:
-                # If we know the airport we'll use the closest runway
-                latitude = airport['latitude']
-                longitude = airport['longitude']
+        airport_position = None
+        if airport:
+            airport_position = self._airport_codes.get(airport)
+
+        if (not latitude or not longitude) and airport_position is not None:
+            # Not precise. If we know the airport we'll use the closest runway
+            airport = self.airports[airport_position]
+            latitude = airport.get('latitude')
+            longitude = airport.get('longitude')
 
         if not latitude or not longitude:
             # Still no luck? Fail.
             raise NotFoundError('Local API Handler: Runway could not be found')
 
-        runways = []
-        for runway in self.runways:
-            runway = copy(runway)
-            runway_coords = runway.get('start', runway.get('end'))
-            if not runway_coords:
-                continue
-            runway['distance'] = bearing_and_distance(
-                latitude, longitude, runway_coords['latitude'],
-                runway_coords['longitude'])[1]
-            runways.append(runway)
-
-        runway = min(runways, key=itemgetter('distance'))
+        nearest = self._runway_index.nearest(
+            latitude, longitude,
+            accept=self._runway_filter(airport_position, heading, ils_freq))
+        if nearest is None:
+            raise NotFoundError('Local API Handler: Runway could not be found')
+        index, distance = nearest
+        runway = copy(self.runways[self._runway_positions[index]])
+        runway['distance'] = distance
         return runway
 
+    def get_nearest_runways(self, queries):
+        '''
+        Get the nearest runway for each of the queries from a pre-defined
+        list. Identical queries, e.g. for repeated approaches to the same
+        runway, are only looked up once.
+
+        :param queries: Arguments of get_nearest_runway for each runway, e.g. {'airport': 2461, 'heading': 14}.
+        :type queries: [dict]
+        :returns: Runway dictionary for each query, or None where a runway cannot be found.
+        :rtype: [dict or None]
+        '''
+        found = {}
+        runways = []
+        for query in queries:
+            key = tuple(sorted(query.items()))
+            if key not in found:
+                found[key] = super(AnalysisEngineAPIHandlerLocal,
+                                   self).get_nearest_runways([query])[0]
+            runways.append(copy(found[key]))
+        return runways
+
     def get_data_exports(self, tail_number):
         '''
         Will either return data exports configuration for an aircraft matching
@@ -0,0 +1,707 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Compiled snapshots of the local API handler's data.
+
+Parsing the YAML or JSON of a full aircraft, airport and runway dataset
+dominates the start up time of the local API handler. A snapshot stores the
+same data within a binary file which is memory-mapped when it is loaded:
+
+ * The columns used to index the airports and runways, e.g. coordinates and
+   airport codes, are arrays which are used without being copied.
+ * The records are encoded with references into a table of interned
+   strings and are only decoded when they are accessed.
+
+Snapshots are mapped read-only, so the pages of the file are shared by
+every process which loads the snapshot, including forked worker processes.
+Snapshots are replaced rather than overwritten when they are compiled so
+that processes which have the previous snapshot mapped are not affected.
+
+Compile a snapshot of the configured data files with:
+
+    python -m analysis_engine.api_snapshot local_api.snapshot
+
+and set LOCAL_API_SNAPSHOT_PATH to the path of the snapshot.
+'''
+
+##############################################################################
+# Imports
+
+import argparse
+import mmap
+import numbers
+import numpy as np
+import operator
+import os
+import simplejson
+import struct
+import tempfile
+
+from collections import OrderedDict
+
+
+##############################################################################
+# Constants
+
+MAGIC = 'FDASNAP\x00'
+
+# Version of the snapshot format. Increment if the format changes so that
+# snapshots compiled in a previous format are rejected rather than misread.
+SNAPSHOT_VERSION = 1
+
+# Magic, format version and length of the JSON directory of sections.
+_HEADER = struct.Struct('<8sII')
+
+# Sections are aligned so that their arrays can be used without copying.
+_ALIGNMENT = 8
+
+_COUNT = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+_INTEGER = struct.Struct('<q')
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+##############################################################################
+# Exceptions
+
+
+class SnapshotError(Exception):
+    '''
+    Error raised when data cannot be stored within a snapshot or a snapshot
+    cannot be read.
+    '''
+    pass
+
+
+##############################################################################
+# Columns
+
+
+def airport_columns(airports):
+    '''
+    Columns used to index the airports. The codes are the id, IATA and ICAO
+    codes of the airports sorted for lookups with CodeLookup.
+
+    :param airports: Airport records.
+    :type airports: [dict]
+    :returns: Latitude and longitude of each airport (NaN if not known) and the sorted integer and string codes with the position of the airport of each code.
+    :rtype: OrderedDict of np.ndarray
+    '''
+    latitudes = []
+    longitudes = []
+    int_codes = []
+    int_positions = []
+    str_codes = []
+    str_positions = []
+    for position, airport in enumerate(airports):
+        if 'latitude' in airport and 'longitude' in airport:
+            latitudes.append(airport['latitude'])
+            longitudes.append(airport['longitude'])
+        else:
+            latitudes.append(None)
+            longitudes.append(None)
+        codes = airport.get('code') or {}
+        for code in (airport.get('id'), codes.get('iata'),
+                     codes.get('icao')):
+            key = _code_key(code)
+            if isinstance(key, (int, long)):
+                int_codes.append(key)
+                int_positions.append(position)
+            elif key is not None:
+                str_codes.append(key)
+                str_positions.append(position)
+    int_codes, int_positions = _sort_codes(
+        np.array(int_codes, dtype=np.int64), int_positions)
+    str_codes, str_positions = _sort_codes(
+        np.array(str_codes, dtype=str) if str_codes else np.zeros(0, 'S1'),
+        str_positions)
+    return OrderedDict([
+        ('latitude', np.array(latitudes, dtype=float)),
+        ('longitude', np.array(longitudes, dtype=float)),
+        ('int_codes', int_codes),
+        ('int_positions', int_positions),
+        ('str_codes', str_codes),
+        ('str_positions', str_positions),
+    ])
+
+
+def runway_columns(runways):
+    '''
+    Columns used to index the runways. The location of a runway is its
+    start, or its end if the start is not known.
+
+    :param runways: Runway records.
+    :type runways: [dict]
+    :returns: Latitude, longitude, magnetic heading and ILS localizer frequency in KHz of each runway (NaN if not known).
+    :rtype: OrderedDict of np.ndarray
+    '''
+    columns = OrderedDict((name, []) for name in (
+        'latitude', 'longitude', 'magnetic_heading', 'ils_freq'))
+    for runway in runways:
+        runway_coords = runway.get('start', runway.get('end')) or {}
+        columns['latitude'].append(runway_coords.get('latitude'))
+        columns['longitude'].append(runway_coords.get('longitude'))
+        columns['magnetic_heading'].append(runway.get('magnetic_heading'))
+        columns['ils_freq'].append(
+            (runway.get('localizer') or {}).get('frequency'))
+    return OrderedDict((name, np.array(values, dtype=float))
+                       for name, values in columns.iteritems())
+
+
+def _code_key(code):
+    '''
+    :returns: Integer or byte string to look up the code with, or None if the code cannot be looked up.
+    :rtype: int or str or None
+    '''
+    if isinstance(code, numbers.Integral):
+        code = int(code)
+        return code if _INT64_MIN <= code <= _INT64_MAX else None
+    elif isinstance(code, float) and code.is_integer():
+        return _code_key(int(code))
+    elif isinstance(code, unicode):
+        return code.encode('utf-8')
+    elif isinstance(code, str):
+        return code
+    else:
+        return None
+
+
+def _sort_codes(codes, positions):
+    # A stable sort keeps the first airport with a code first.
+    order = np.argsort(codes, kind='mergesort')
+    return codes[order], np.array(positions, dtype=np.int64)[order]
+
+
+class CodeLookup(object):
+    '''
+    Lookup of airport positions by code from the sorted code columns of
+    airport_columns. Where airports share a code, the first is returned.
+    '''
+
+    def __init__(self, int_codes, int_positions, str_codes, str_positions):
+        '''
+        :param int_codes: Sorted integer codes.
+        :type int_codes: np.ndarray
+        :param int_positions: Position of the airport of each integer code.
+        :type int_positions: np.ndarray
+        :param str_codes: Sorted string codes.
+        :type str_codes: np.ndarray
+        :param str_positions: Position of the airport of each string code.
+        :type str_positions: np.ndarray
+        '''
+        self._int_codes = int_codes
+        self._int_positions = int_positions
+        self._str_codes = str_codes
+        self._str_positions = str_positions
+
+    def get(self, code):
+        '''
+        :param code: Either the id, ICAO or IATA of the airport.
+        :type code: int or str
+        :returns: Position of the airport or None if it cannot be found.
+        :rtype: int or None
+        '''
+        key = _code_key(code)
+        if key is None:
+            return None
+        elif isinstance(key, (int, long)):
+            codes, positions = self._int_codes, self._int_positions
+        else:
+            codes, positions = self._str_codes, self._str_positions
+        index = np.searchsorted(codes, key)
+        if index < len(codes) and codes[index] == key:
+            return int(positions[index])
+        return None
+
+
+##############################################################################
+# Encoding
+
+
+class _StringTable(object):
+    '''
+    Interned strings of a snapshot being compiled. Each distinct string is
+    stored once.
+    '''
+
+    def __init__(self):
+        self._indices = {}
+        self.strings = []
+
+    def index(self, string):
+        '''
+        :param string: UTF-8 encoded string.
+        :type string: str
+        :returns: Index of the string within the table.
+        :rtype: int
+        '''
+        index = self._indices.get(string)
+        if index is None:
+            index = self._indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+
+def _encode(value, strings, chunks):
+    '''
+    Encode a value as a tag character followed by its data. Strings are
+    stored as indices into the string table and tuples are stored as lists.
+
+    :param value: Value to encode.
+    :param strings: Table of interned strings.
+    :type strings: _StringTable
+    :param chunks: Encoded data to append to.
+    :type chunks: [str]
+    :raises SnapshotError: If the value is of a type which cannot be stored.
+    '''
+    if value is None:
+        chunks.append('N')
+    elif value is True:
+        chunks.append('T')
+    elif value is False:
+        chunks.append('F')
+    elif isinstance(value, (int, long)):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            chunks.append('i' + _INTEGER.pack(value))
+        else:
+            chunks.append('I' + _COUNT.pack(strings.index(str(value))))
+    elif isinstance(value, float):
+        chunks.append('f' + _FLOAT.pack(value))
+    elif isinstance(value, str):
+        chunks.append('s' + _COUNT.pack(strings.index(value)))
+    elif isinstance(value, unicode):
+        chunks.append('u' + _COUNT.pack(strings.index(value.encode('utf-8'))))
+    elif isinstance(value, (list, tuple)):
+        chunks.append('l' + _COUNT.pack(len(value)))
+        for item in value:
+            _encode(item, strings, chunks)
+    elif isinstance(value, dict):
+        chunks.append('d' + _COUNT.pack(len(value)))
+        for key, item in value.iteritems():
+            _encode(key, strings, chunks)
+            _encode(item, strings, chunks)
+    else:
+        raise SnapshotError("Value '%r' of type '%s' cannot be stored within "
+                            "a snapshot." % (value, type(value).__name__))
+
+
+def _records_sections(name, records, strings):
+    '''
+    :returns: Sections of the offsets and data of the encoded records.
+    :rtype: [(str, np.ndarray)]
+    '''
+    offsets = [0]
+    data = []
+    for record in records:
+        chunks = []
+        _encode(record, strings, chunks)
+        data.extend(chunks)
+        offsets.append(offsets[-1] + sum(len(c) for c in chunks))
+    return [
+        (name + '.offsets', np.array(offsets, dtype=np.int64)),
+        (name + '.data', np.frombuffer(''.join(data), dtype=np.uint8)),
+    ]
+
+
+def _mapping_sections(name, mapping, strings):
+    '''
+    The records of a mapping are stored in the order of their sorted keys so
+    that they can be looked up without decoding the keys.
+
+    :raises SnapshotError: If the keys are not strings.
+    :returns: Sections of the sorted keys and the records.
+    :rtype: [(str, np.ndarray)]
+    '''
+    keys = []
+    for key in mapping:
+        if not isinstance(key, basestring):
+            raise SnapshotError("Key '%r' of '%s' is not a string." %
+                                (key, name))
+        keys.append(_code_key(key))
+    keys = np.array(keys, dtype=str) if keys else np.zeros(0, 'S1')
+    items = mapping.values()
+    order = np.argsort(keys, kind='mergesort')
+    return [(name + '.keys', keys[order])] + _records_sections(
+        name, [items[index] for index in order], strings)
+
+
+def write_snapshot(path, aircraft, airports, runways, exports):
+    '''
+    Write a snapshot of the local API handler's data. The snapshot is
+    written to a temporary file which then replaces any existing snapshot.
+
+    :param path: Path of the snapshot to write.
+    :type path: str
+    :param aircraft: Aircraft info by tail number.
+    :type aircraft: dict
+    :param airports: Airport records.
+    :type airports: [dict]
+    :param runways: Runway records.
+    :type runways: [dict]
+    :param exports: Data exports configuration by tail number.
+    :type exports: dict
+    :raises SnapshotError: If the data cannot be stored within a snapshot.
+    '''
+    airports = airports or []
+    runways = runways or []
+    strings = _StringTable()
+    sections = []
+    sections.extend(_mapping_sections('aircraft', aircraft or {}, strings))
+    sections.extend(_records_sections('airports', airports, strings))
+    sections.extend(_records_sections('runways', runways, strings))
+    sections.extend(_mapping_sections('exports', exports or {}, strings))
+    for name, column in airport_columns(airports).iteritems():
+        sections.append(('airports.' + name, column))
+    for name, column in runway_columns(runways).iteritems():
+        sections.append(('runways.' + name, column))
+    string_offsets = np.cumsum([0] + [len(s) for s in strings.strings])
+    sections.append(('strings.offsets', string_offsets.astype(np.int64)))
+    sections.append(('strings.data', np.frombuffer(''.join(strings.strings),
+                                                   dtype=np.uint8)))
+
+    directory = OrderedDict()
+    offset = 0
+    for name, array in sections:
+        directory[name] = OrderedDict([
+            ('dtype', array.dtype.str),
+            ('shape', array.shape),
+            ('offset', offset),
+        ])
+        offset = _align(offset + array.nbytes)
+    directory_json = simplejson.dumps(directory)
+    data_start = _align(_HEADER.size + len(directory_json))
+
+    # A unique temporary file within the same directory, so that snapshots
+    # compiled at the same time do not write to the same file and the
+    # rename does not cross file systems.
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as snapshot_file:
+            snapshot_file.write(_HEADER.pack(MAGIC, SNAPSHOT_VERSION,
+                                             len(directory_json)))
+            snapshot_file.write(directory_json)
+            for name, array in sections:
+                # Pad to the aligned start of the section.
+                snapshot_file.write('\x00' * (
+                    data_start + directory[name]['offset'] -
+                    snapshot_file.tell()))
+                snapshot_file.write(array.tostring())
+        # mkstemp creates the file readable only by its owner.
+        os.chmod(temp_path, 0644)
+        os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+##############################################################################
+# Decoding
+
+
+class _Strings(object):
+    '''
+    Strings of the string table of a snapshot which are decoded when they
+    are first referenced. Decoded strings are shared by all records.
+    '''
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+        self._strings = {}
+
+    def get(self, tag, index):
+        '''
+        :param tag: 's' for a byte string, 'u' for a unicode string or 'I' for an integer stored as a string.
+        :type tag: str
+        :param index: Index of the string within the table.
+        :type index: int
+        '''
+        key = (tag, index)
+        string = self._strings.get(key)
+        if string is None:
+            string = self._data[self._offsets[index]:
+                                self._offsets[index + 1]].tostring()
+            if tag == 'u':
+                string = string.decode('utf-8')
+            elif tag == 'I':
+                string = int(string)
+            string = self._strings.setdefault(key, string)
+        return string
+
+
+def _decode(data, offset, strings):
+    '''
+    Decode a value encoded by _encode.
+
+    :param data: Encoded data.
+    :type data: str
+    :param offset: Offset of the value within the data.
+    :type offset: int
+    :param strings: String table of the snapshot.
+    :type strings: _Strings
+    :returns: The value and the offset following it.
+    :rtype: (object, int)
+    '''
+    tag = data[offset]
+    offset += 1
+    if tag == 'N':
+        return None, offset
+    elif tag == 'T':
+        return True, offset
+    elif tag == 'F':
+        return False, offset
+    elif tag == 'i':
+        return _INTEGER.unpack_from(data, offset)[0], offset + _INTEGER.size
+    elif tag == 'f':
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+    count = _COUNT.unpack_from(data, offset)[0]
+    offset += _COUNT.size
+    if tag in 'suI':
+        return strings.get(tag, count), offset
+    elif tag == 'l':
+        items = []
+        for _ in xrange(count):
+            item, offset = _decode(data, offset, strings)
+            items.append(item)
+        return items, offset
+    elif tag == 'd':
+        items = {}
+        for _ in xrange(count):
+            key, offset = _decode(data, offset, strings)
+            items[key], offset = _decode(data, offset, strings)
+        return items, offset
+    raise SnapshotError("Unknown tag '%s' within snapshot records." % tag)
+
+
+class RecordList(object):
+    '''
+    Read-only sequence of the records of a snapshot. Records are decoded
+    when they are first accessed and then the same object is returned on
+    every access.
+    '''
+
+    def __init__(self, offsets, data, strings):
+        self._offsets = offsets
+        self._data = data
+        self._strings = strings
+        self._records = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        index = operator.index(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Snapshot record index out of range.')
+        record = self._records.get(index)
+        if record is None:
+            data = self._data[self._offsets[index]:
+                              self._offsets[index + 1]].tostring()
+            record = self._records.setdefault(
+                index, _decode(data, 0, self._strings)[0])
+        return record
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+
+class RecordMapping(object):
+    '''
+    Read-only mapping of string keys to the records of a snapshot. Records
+    are decoded when they are first accessed.
+    '''
+
+    def __init__(self, keys, records):
+        '''
+        :param keys: Sorted keys of the records.
+        :type keys: np.ndarray
+        :param records: Records in the order of their keys.
+        :type records: RecordList
+        '''
+        self._keys = keys
+        self._records = records
+
+    def _index(self, key):
+        if not isinstance(key, basestring):
+            return None
+        key = _code_key(key)
+        index = np.searchsorted(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index
+        return None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def __getitem__(self, key):
+        index = self._index(key)
+        if index is None:
+            raise KeyError(key)
+        return self._records[index]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        index = self._index(key)
+        return default if index is None else self._records[index]
+
+    def keys(self):
+        return self._keys.tolist()
+
+    def items(self):
+        return zip(self.keys(), self._records)
+
+
+class Snapshot(object):
+    '''
+    Memory-mapped snapshot of the local API handler's data written by
+    write_snapshot.
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: Path of the snapshot.
+        :type path: str
+        :raises SnapshotError: If the file is not a snapshot or was written in a different format.
+        '''
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            try:
+                self._mmap = mmap.mmap(snapshot_file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                raise SnapshotError("'%s' is not an API snapshot." % path)
+        if len(self._mmap) < _HEADER.size:
+            raise SnapshotError("'%s' is not an API snapshot." % path)
+        magic, version, length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise SnapshotError("'%s' is not an API snapshot." % path)
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(
+                "Unsupported API snapshot version '%d' in '%s'. Compile the "
+                "snapshot again." % (version, path))
+        self._sections = simplejson.loads(
+            self._mmap[_HEADER.size:_HEADER.size + length])
+        self._data_start = _align(_HEADER.size + length)
+
+        strings = _Strings(self.array('strings.offsets'),
+                           self.array('strings.data'))
+        self.airports = self._records('airports', strings)
+        self.runways = self._records('runways', strings)
+        self.aircraft = RecordMapping(self.array('aircraft.keys'),
+                                      self._records('aircraft', strings))
+        self.exports = RecordMapping(self.array('exports.keys'),
+                                     self._records('exports', strings))
+
+    def _records(self, name, strings):
+        return RecordList(self.array(name + '.offsets'),
+                          self.array(name + '.data'), strings)
+
+    def array(self, name):
+        '''
+        :param name: Name of the section.
+        :type name: str
+        :returns: Read-only array of the section within the memory-mapped file.
+        :rtype: np.ndarray
+        '''
+        section = self._sections[name]
+        dtype = np.dtype(str(section['dtype']))
+        shape = tuple(section['shape'])
+        count = int(np.prod(shape))
+        if not count:
+            return np.zeros(shape, dtype=dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=count,
+                             offset=self._data_start + section['offset'])\
+            .reshape(shape)
+
+    def airport_columns(self):
+        '''
+        :returns: Columns of the airports. See airport_columns.
+        :rtype: OrderedDict of np.ndarray
+        '''
+        return OrderedDict((name, self.array('airports.' + name)) for name in
+                           ('latitude', 'longitude', 'int_codes',
+                            'int_positions', 'str_codes', 'str_positions'))
+
+    def runway_columns(self):
+        '''
+        :returns: Columns of the runways. See runway_columns.
+        :rtype: OrderedDict of np.ndarray
+        '''
+        return OrderedDict((name, self.array('runways.' + name)) for name in
+                           ('latitude', 'longitude', 'magnetic_heading',
+                            'ils_freq'))
+
+
+##############################################################################
+# Compiling
+
+
+def compile_snapshot(path, aircraft_path=None, airport_path=None,
+                     runway_path=None, exports_path=None):
+    '''
+    Compile the local API handler's data files into a snapshot. Paths
+    default to the LOCAL_API_*_PATH settings.
+
+    :param path: Path of the snapshot to write.
+    :type path: str
+    :raises SnapshotError: If the data cannot be stored within a snapshot.
+    '''
+    from analysis_engine import settings
+    from analysis_engine.api_handler_analysis_engine import (
+        AnalysisEngineAPIHandlerLocal,
+    )
+    load_data = AnalysisEngineAPIHandlerLocal._load_data
+    write_snapshot(
+        path,
+        load_data(aircraft_path or settings.LOCAL_API_AIRCRAFT_PATH),
+        load_data(airport_path or settings.LOCAL_API_AIRPORT_PATH),
+        load_data(runway_path or settings.LOCAL_API_RUNWAY_PATH),
+        load_data(exports_path or settings.LOCAL_API_EXPORTS_PATH),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the local API handler's data files into a "
+        "snapshot.")
+    parser.add_argument('output', help='Path of the snapshot to write.')
+    parser.add_argument('--aircraft', help='Aircraft YAML or JSON file. '
+                        'Defaults to LOCAL_API_AIRCRAFT_PATH.')
+    parser.add_argument('--airports', help='Airports YAML or JSON file. '
+                        'Defaults to LOCAL_API_AIRPORT_PATH.')
+    parser.add_argument('--runways', help='Runways YAML or JSON file. '
+                        'Defaults to LOCAL_API_RUNWAY_PATH.')
+    parser.add_argument('--exports', help='Data exports YAML or JSON file. '
+                        'Defaults to LOCAL_API_EXPORTS_PATH.')
+    args = parser.parse_args()
+    compile_snapshot(args.output, aircraft_path=args.aircraft,
+                     airport_path=args.airports, runway_path=args.runways,
+                     exports_path=args.exports)
+
+
+if __name__ == '__main__':
+    main()
+
+
+##############################################################################
+# vim:et:ft=python:nowrap:sts=4:sw=4:ts=4
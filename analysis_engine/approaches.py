@@ -1,6 +1,6 @@
 import numpy as np
 
-from analysis_engine.api_handler import get_api_handler, NotFoundError
+from analysis_engine.api_handler import get_api_handler
 from analysis_engine.node import A, ApproachNode, KPV, KTI, P, S
 from analysis_engine import settings
 
@@ -79,90 +79,124 @@ class ApproachInformation(ApproachNode):
         return all(n in available for n in ['Approach And Landing',
                                             'Altitude AAL', 'Fast'])
 
-    def _lookup_airport_and_runway(self, _slice, precise, lowest_lat,
-                                   lowest_lon, lowest_hdg, appr_ils_freq,
-                                   land_afr_apt=None, land_afr_rwy=None,
-                                   hint='approach'):
+    def _runway_query(self, airport, _slice, precise, lowest_lat, lowest_lon,
+                      lowest_hdg, appr_ils_freq, hint='approach', **kwargs):
         '''
+        :returns: Arguments of get_nearest_runway for the approach's runway.
+        :rtype: dict
+        '''
+        query = dict(airport=int(airport['id']), heading=lowest_hdg,
+                     latitude=lowest_lat, longitude=lowest_lon)
+        if appr_ils_freq:
+            ils_freq = appr_ils_freq.get_first(within_slice=_slice)
+            if ils_freq:
+                query['ils_freq'] = ils_freq.value
+
+            # We already have latitude and longitude from looking up the
+            # airport. If the measurments are not precise, remove them.
+            if not precise:
+                query['hint'] = hint
+                del query['latitude']
+                del query['longitude']
+        return query
+
+    def _lookup_airports_and_runways(self, approaches):
+        '''
+        Look up the airport and runway of each approach. The airports of all
+        the approaches are looked up in one API call, followed by their
+        runways in another.
+
+        :param approaches: Keyword arguments describing each approach: _slice, precise, lowest_lat, lowest_lon, lowest_hdg and appr_ils_freq, and for landings land_afr_apt, land_afr_rwy and hint.
+        :type approaches: [dict]
+        :returns: Airport and runway of each approach, either of which may be None.
+        :rtype: [(dict or None, dict or None)]
         '''
         api = get_api_handler(settings.API_HANDLER)
-        kwargs = {}
-        airport = None
-        runway = None
+        airports = [None] * len(approaches)
+        runways = [None] * len(approaches)
 
         # A1. If we have latitude and longitude, look for the nearest airport:
-        if lowest_lat and lowest_lon:
-            kwargs.update(latitude=lowest_lat, longitude=lowest_lon)
-            try:
-                airport = api.get_nearest_airport(**kwargs)
-            except NotFoundError:
+        located = [index for index, approach in enumerate(approaches)
+                   if approach['lowest_lat'] and approach['lowest_lon']]
+        if located:
+            nearest = api.get_nearest_airports(
+                [(approaches[index]['lowest_lat'],
+                  approaches[index]['lowest_lon']) for index in located])
+        else:
+            nearest = []
+        found = dict(zip(located, nearest))
+
+        queries = []
+        for index, approach in enumerate(approaches):
+            if index not in found:
+                # No suitable coordinates.
+                self.warning('No coordinates for looking up approach airport.')
+                continue
+            airport = found[index]
+            if airport:
+                self.debug('Detected approach airport: %s', airport)
+            else:
                 msg = 'No approach airport found near coordinates (%f, %f).'
-                self.warning(msg, lowest_lat, lowest_lon)
+                self.warning(msg, approach['lowest_lat'],
+                             approach['lowest_lon'])
                 # No airport was found, so fall through and try AFR.
-            else:
-                self.debug('Detected approach airport: %s', airport)
-        else:
-            # No suitable coordinates, so fall through and try AFR.
-            self.warning('No coordinates for looking up approach airport.')
-            return None, None
 
-        # A2. If and we have an airport in achieved flight record, use it:
-        # NOTE: AFR data is only provided if this approach is a landing.
-        if not airport and land_afr_apt:
-            airport = land_afr_apt.value
-            self.debug('Using approach airport from AFR: %s', airport)
+            # A2. If and we have an airport in achieved flight record, use it:
+            # NOTE: AFR data is only provided if this approach is a landing.
+            land_afr_apt = approach.get('land_afr_apt')
+            if not airport and land_afr_apt:
+                airport = land_afr_apt.value
+                self.debug('Using approach airport from AFR: %s', airport)
 
-        # A3. After all that, we still couldn't determine an airport...
-        if not airport:
-            self.error('Unable to determine airport on approach!')
-            return None, None
-
-        airport_id = int(airport['id'])
-
-        if lowest_hdg:
-        #if heading is None:
-            #self.warning('Invalid heading... Fallback to AFR.')
-            #fallback = True
+            # A3. After all that, we still couldn't determine an airport...
+            if not airport:
+                self.error('Unable to determine airport on approach!')
+                continue
+            airports[index] = airport
 
             # R1. If we have airport and heading, look for the nearest runway:
-            if appr_ils_freq:
-                ils_freq = appr_ils_freq.get_first(within_slice=_slice)
-                if ils_freq:
-                    kwargs['ils_freq'] = ils_freq.value
-
-                # We already have latitude and longitude in kwargs from looking up
-                # the airport. If the measurments are not precise, remove them.
-                if not precise:
-                    kwargs['hint'] = hint
-                    del kwargs['latitude']
-                    del kwargs['longitude']
-
-            try:
-                runway = api.get_nearest_runway(airport_id, lowest_hdg,
-                                                **kwargs)
-            except NotFoundError:
-                msg = 'No runway found for airport #%d @ %03.1f deg with %s.'
-                self.warning(msg, airport_id, lowest_hdg, kwargs)
-                # No runway was found, so fall through and try AFR.
-                if 'ils_freq' in kwargs:
-                    # This is a trap for airports where the ILS data is not
-                    # available, but the aircraft approached with the ILS
-                    # tuned. A good prompt for an omission in the database.
-                    self.warning('Fix database? No runway but ILS was tuned.')
-            else:
-                self.debug('Detected approach runway: %s', runway)
-                runway = runway
+            if approach['lowest_hdg']:
+                queries.append((index,
+                                self._runway_query(airport, **approach)))
 
-        # R2. If we have a runway provided in achieved flight record, use it:
-        if not runway and land_afr_rwy:
-            runway = land_afr_rwy.value
-            self.debug('Using approach runway from AFR: %s', runway)
-
-        # R3. After all that, we still couldn't determine a runway...
-        if not runway:
-            self.error('Unable to determine runway on approach!')
-
-        return airport, runway
+        if queries:
+            nearest = api.get_nearest_runways([query for _, query in queries])
+        else:
+            nearest = []
+        for (index, query), runway in zip(queries, nearest):
+            if runway:
+                self.debug('Detected approach runway: %s', runway)
+                runways[index] = runway
+                continue
+            query = query.copy()
+            airport_id = query.pop('airport')
+            heading = query.pop('heading')
+            msg = 'No runway found for airport #%d @ %03.1f deg with %s.'
+            self.warning(msg, airport_id, heading, query)
+            # No runway was found, so fall through and try AFR.
+            if 'ils_freq' in query:
+                # This is a trap for airports where the ILS data is not
+                # available, but the aircraft approached with the ILS
+                # tuned. A good prompt for an omission in the database.
+                self.warning('Fix database? No runway but ILS was tuned.')
+
+        for index, approach in enumerate(approaches):
+            if not airports[index]:
+                continue
+
+            # R2. If we have a runway provided in achieved flight record, use
+            # it:
+            land_afr_rwy = approach.get('land_afr_rwy')
+            if not runways[index] and land_afr_rwy:
+                runways[index] = land_afr_rwy.value
+                self.debug('Using approach runway from AFR: %s',
+                           runways[index])
+
+            # R3. After all that, we still couldn't determine a runway...
+            if not runways[index]:
+                self.error('Unable to determine runway on approach!')
+
+        return zip(airports, runways)
 
     def derive(self, app=S('Approach And Landing'),
                alt_aal=P('Altitude AAL'),
@@ -189,6 +223,7 @@ class ApproachInformation(ApproachNode):
         
         app_slices = app.get_slices()
         
+        approaches = []
         for index, _slice in enumerate(app_slices):
             # a) The last approach is assumed to be landing:
             if index == len(app_slices) - 1:
@@ -271,10 +306,17 @@ class ApproachInformation(ApproachNode):
                            if turnoffs else None)
             turnoff = turnoff_kpv.index if turnoff_kpv else None
 
-            airport, runway = self._lookup_airport_and_runway(**kwargs)
-            self.create_approach(
-                approach_type, _slice, airport=airport,
-                runway=runway, gs_est=gs_est, loc_est=loc_est,
-                ils_freq=ils_freq, turnoff=turnoff,
+            approaches.append((kwargs, dict(
+                _type=approach_type, _slice=_slice, gs_est=gs_est,
+                loc_est=loc_est, ils_freq=ils_freq, turnoff=turnoff,
                 lowest_lat=lowest_lat, lowest_lon=lowest_lon,
-                lowest_hdg=lowest_hdg)
+                lowest_hdg=lowest_hdg)))
+
+        # Look up the airports and runways of all the approaches at once
+        # rather than making API calls for each approach.
+        if not approaches:
+            return
+        found = self._lookup_airports_and_runways(
+            [kwargs for kwargs, _ in approaches])
+        for (_, approach), (airport, runway) in zip(approaches, found):
+            self.create_approach(airport=airport, runway=runway, **approach)
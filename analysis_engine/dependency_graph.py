@@ -1,9 +1,12 @@
+import cPickle
 import os
 import sys
 import logging 
+import threading
 import networkx as nx # pip install networkx or /opt/epd/bin/easy_install networkx
 
-from collections import deque
+from collections import OrderedDict, deque
+from hashlib import sha256
 
 from flightdatautilities.dict_helpers import dict_filter
 
@@ -20,6 +23,13 @@ from analysis_engine.node import (
 logger = logging.getLogger(__name__)
 not_windows = sys.platform not in ('win32', 'win64') # False for Windows :-(
 
+# In memory cache of dependency_order results keyed by dependency_cache_key,
+# ordered from the least to the most recently used.
+_dependency_order_cache = OrderedDict()
+_dependency_order_cache_lock = threading.Lock()
+# Fingerprints of node module source files keyed by (path, mtime, size).
+_module_fingerprints = {}
+
 """
 TODO:
 =====
@@ -423,8 +433,137 @@ def remove_floating_nodes(graph):
     return graph
      
      
+def _module_fingerprint(module_name):
+    '''
+    Fingerprint the source of a module so that cached dependency orders are
+    invalidated when node definitions change.
+
+    :param module_name: Name of an imported module.
+    :type module_name: str
+    :returns: Hex digest of the module's source file.
+    :rtype: str
+    '''
+    module = sys.modules.get(module_name)
+    path = getattr(module, '__file__', None)
+    if not path:
+        return module_name
+    path = os.path.splitext(path)[0] + '.py'
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return module_name
+    stat_key = (path, stat.st_mtime, stat.st_size)
+    if stat_key not in _module_fingerprints:
+        with open(path, 'rb') as file_obj:
+            _module_fingerprints[stat_key] = sha256(file_obj.read()).hexdigest()
+    return _module_fingerprints[stat_key]
+
+
+def dependency_cache_key(node_mgr, raise_inoperable_requested=False):
+    '''
+    Create a key which identifies the result of dependency_order for the
+    node manager. The key is built from the available parameters, the
+    requested and required nodes, which attributes are available, the
+    values of attributes which can_operate methods depend upon and a
+    fingerprint of the node modules.
+
+    :param node_mgr:
+    :type node_mgr: NodeManager
+    :param raise_inoperable_requested: Passed into process_order.
+    :type raise_inoperable_requested: bool
+    :returns: Hex digest key.
+    :rtype: str
+    '''
+    attributes = dict(node_mgr.aircraft_info)
+    attributes.update(node_mgr.achieved_flight_record)
+    operate_attributes = set()
+    modules = set()
+    nodes = []
+    for name, node in sorted(node_mgr.derived_nodes.items()):
+        operate_attributes.update(node.get_can_operate_attribute_names())
+        modules.add(node.__module__)
+        nodes.append((name, node.get_dependency_names()))
+
+    key = sha256()
+    for item in (sorted(node_mgr.hdf_keys),
+                 sorted(node_mgr.requested),
+                 sorted(node_mgr.required),
+                 sorted(attributes),
+                 sorted((name, attributes.get(name)) for name
+                        in operate_attributes),
+                 nodes,
+                 sorted(_module_fingerprint(m) for m in modules),
+                 raise_inoperable_requested):
+        key.update(repr(item))
+    return key.hexdigest()
+
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, 'dependency_order_%s.pkl' % key)
+
+
+def _hold_cached_order(key, cached):
+    '''
+    Store a cached order in memory as the most recently used, evicting the
+    least recently used beyond settings.DEPENDENCY_CACHE_SIZE. Must be called
+    with _dependency_order_cache_lock held.
+    '''
+    from analysis_engine.settings import DEPENDENCY_CACHE_SIZE
+    _dependency_order_cache.pop(key, None)
+    _dependency_order_cache[key] = cached
+    while len(_dependency_order_cache) > max(DEPENDENCY_CACHE_SIZE, 0):
+        _dependency_order_cache.popitem(last=False)
+
+
+def _get_cached_order(key, cache_dir=None):
+    '''
+    :returns: Cached process order and spanning tree or None if not cached.
+    :rtype: (list of strings, nx.DiGraph) or None
+    '''
+    with _dependency_order_cache_lock:
+        cached = _dependency_order_cache.get(key)
+        if cached is not None:
+            _hold_cached_order(key, cached)
+    if cached is None and cache_dir:
+        try:
+            with open(_cache_path(cache_dir, key), 'rb') as file_obj:
+                cached = cPickle.load(file_obj)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return None
+        with _dependency_order_cache_lock:
+            _hold_cached_order(key, cached)
+    if cached is None:
+        return None
+    order, gr_st = cached
+    # Return copies so the cached objects cannot be modified.
+    return list(order), gr_st.copy()
+
+
+def _set_cached_order(key, order, gr_st, cache_dir=None):
+    '''
+    Store the process order and spanning tree in memory and on disk.
+    '''
+    cached = (list(order), gr_st.copy())
+    with _dependency_order_cache_lock:
+        _hold_cached_order(key, cached)
+    if not cache_dir:
+        return
+    path = _cache_path(cache_dir, key)
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(temp_path, 'wb') as file_obj:
+            cPickle.dump(cached, file_obj, cPickle.HIGHEST_PROTOCOL)
+        # Rename is atomic so concurrent readers never see a partial file.
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        logger.exception("Unable to store dependency order cache '%s'.", path)
+
+
 def dependency_order(node_mgr, draw=not_windows,
-                     raise_inoperable_requested=False):
+                     raise_inoperable_requested=False, cache=False,
+                     cache_dir=None):
     """
     Main method for retrieving processing order of nodes.
     
@@ -432,9 +571,20 @@ def dependency_order(node_mgr, draw=not_windows,
     :type node_mgr: NodeManager
     :param draw: Will draw the graph. Green nodes are available LFL params, Blue are operational derived, Black are not requested derived, Red are active top level requested params, Grey are inactive params. Edges are labelled with processing order.
     :type draw: boolean
+    :param cache: Reuse the processing order and spanning tree of previous calls with the same parameters, nodes and attributes (see dependency_cache_key). Ignored when drawing.
+    :type cache: boolean
+    :param cache_dir: Directory to persist cached processing orders within so they can be shared between processes.
+    :type cache_dir: str
     :returns: List of Nodes determining the order for processing and the spanning tree graph.
     :rtype: (list of strings, dict)
     """
+    if cache and not draw:
+        key = dependency_cache_key(node_mgr, raise_inoperable_requested)
+        cached = _get_cached_order(key, cache_dir)
+        if cached:
+            logger.info("Using cached dependency order '%s'.", key)
+            return cached
+    
     _graph = graph_nodes(node_mgr)
     gr_all, gr_st, order = process_order(_graph, node_mgr,
                                          raise_inoperable_requested)
@@ -449,6 +599,8 @@ def dependency_order(node_mgr, draw=not_windows,
         # reduce number of nodes by removing floating ones
         gr_all = remove_floating_nodes(gr_all)
         draw_graph(gr_all, 'Dependency Tree')
+    elif cache:
+        _set_cached_order(key, order, gr_st, cache_dir)
     return order, gr_st
 
 
@@ -84,6 +84,7 @@ from settings import (AZ_WASHOUT_TC,
                       HYSTERESIS_FPIAS,
                       HYSTERESIS_FPROC,
                       GRAVITY_IMPERIAL,
+                      GROUND_TRACK_MAX_ITERATIONS,
                       KTS_TO_FPS,
                       KTS_TO_MPS,
                       METRES_TO_FEET,
@@ -4008,16 +4009,18 @@ class CoordinatesSmoothed(object):
         Compute a groundspeed and heading based taxi out track.
         '''
 
-        lat_out, lon_out, wt = ground_track_precise(lat, lon, speed, hdg,
-                                                    freq, 'takeoff')
+        lat_out, lon_out, wt = ground_track_precise(
+            lat, lon, speed, hdg, freq, 'takeoff',
+            max_iterations=GROUND_TRACK_MAX_ITERATIONS)
         return lat_out, lon_out
 
     def taxi_in_track_pp(self, lat, lon, speed, hdg, freq):
         '''
         Compute a groundspeed and heading based taxi in track.
         '''
-        lat_in, lon_in, wt = ground_track_precise(lat, lon, speed, hdg, freq,
-                                              'landing')
+        lat_in, lon_in, wt = ground_track_precise(
+            lat, lon, speed, hdg, freq, 'landing',
+            max_iterations=GROUND_TRACK_MAX_ITERATIONS)
         return lat_in, lon_in
 
     def taxi_out_track(self, toff_slice, lat_adj, lon_adj, speed, hdg, freq):
@@ -0,0 +1,233 @@
+'''
+Interval algebra for lists of slices.
+
+Flight phases and the sections of KPV/KTI searches are lists of slices. The
+Intervals type stores the starts and stops of a list of slices as arrays so
+that the logical operations on them are merges of sorted arrays rather than
+nested loops over slice objects or workspace arrays the length of the
+flight.
+'''
+import numpy as np
+
+
+INTEGER_TYPES = (int, long, np.integer)
+
+
+class Intervals(object):
+    '''
+    Intervals [start, stop) stored as arrays of starts and stops. A start of
+    None is stored as -inf and a stop of None as inf.
+
+    The intervals are kept in the order they are created in, so that they
+    can represent the slices of the sections within a SectionNode. The set
+    operations (union, intersection and complement) return
+    intervals which are ordered, i.e. sorted by start and not overlapping.
+    '''
+    __slots__ = ('starts', 'stops', 'integer')
+
+    def __init__(self, starts=(), stops=(), integer=None):
+        '''
+        :param starts: Start of each interval or None.
+        :type starts: [int or float or None] or np.ndarray
+        :param stops: Stop of each interval or None.
+        :type stops: [int or float or None] or np.ndarray
+        :param integer: Whether the starts and stops are integers. Determined from the starts and stops if not provided.
+        :type integer: bool or None
+        '''
+        if not isinstance(starts, np.ndarray) or \
+           not isinstance(stops, np.ndarray):
+            if integer is None:
+                integer = all(isinstance(s, INTEGER_TYPES) for s in starts
+                              if s is not None) and \
+                    all(isinstance(s, INTEGER_TYPES) for s in stops
+                        if s is not None)
+            starts = [-np.inf if s is None else s for s in starts]
+            stops = [np.inf if s is None else s for s in stops]
+        elif integer is None:
+            integer = starts.dtype.kind in 'iub' and stops.dtype.kind in 'iub'
+        if len(starts) != len(stops):
+            raise ValueError("Intervals require the same number of starts "
+                             "'%d' and stops '%d'." % (len(starts), len(stops)))
+        self.starts = np.asarray(starts, dtype=float)
+        self.stops = np.asarray(stops, dtype=float)
+        self.integer = integer
+
+    @classmethod
+    def from_slices(cls, slices):
+        '''
+        Reverse slices are converted to the forward interval which contains
+        the same samples. Items of None are ignored.
+
+        :param slices: Slices to create intervals from.
+        :type slices: [slice]
+        :rtype: Intervals
+        '''
+        slices = [s for s in slices if s is not None]
+        starts = [s.start for s in slices]
+        stops = [s.stop for s in slices]
+        for index, _slice in enumerate(slices):
+            if _slice.step is not None and _slice.step < 0:
+                start, stop = _slice.start, _slice.stop
+                starts[index] = None if stop is None else stop + 1
+                stops[index] = None if start is None else max(start + 1, 0)
+        return cls(starts, stops)
+
+    def to_slices(self):
+        '''
+        :returns: Slices of the intervals with None for infinite starts and stops.
+        :rtype: [slice]
+        '''
+        if self.integer:
+            # Infinite values cannot be converted to integers.
+            starts = [None if s == -np.inf else int(s)
+                      for s in self.starts.tolist()]
+            stops = [None if s == np.inf else int(s)
+                     for s in self.stops.tolist()]
+        else:
+            starts = [None if s == -np.inf else s
+                      for s in self.starts.tolist()]
+            stops = [None if s == np.inf else s for s in self.stops.tolist()]
+        return map(slice, starts, stops)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts.tolist(), self.stops.tolist()))
+
+    def __getitem__(self, key):
+        '''
+        :param key: Index, slice, index array or boolean array of the intervals to select.
+        :rtype: Intervals
+        '''
+        return Intervals(np.atleast_1d(self.starts[key]),
+                         np.atleast_1d(self.stops[key]), integer=self.integer)
+
+    def __eq__(self, other):
+        return (isinstance(other, Intervals) and
+                np.array_equal(self.starts, other.starts) and
+                np.array_equal(self.stops, other.stops))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.to_slices())
+
+    def is_ordered(self):
+        '''
+        :returns: Whether the intervals are not empty, sorted by start and do not overlap.
+        :rtype: bool
+        '''
+        return bool(np.all(self.starts < self.stops) and
+                    np.all(self.starts[1:] >= self.stops[:-1]))
+
+    def contains(self, index, inclusive=False):
+        '''
+        :param index: Index to find the intervals containing.
+        :type index: int or float
+        :param inclusive: Whether an index equal to the stop is within the interval.
+        :type inclusive: bool
+        :returns: Whether each interval contains the index.
+        :rtype: np.ndarray of bool
+        '''
+        if inclusive:
+            return (self.starts <= index) & (index <= self.stops)
+        else:
+            return (self.starts <= index) & (index < self.stops)
+
+    def union(self, *others):
+        '''
+        Touching intervals are joined.
+
+        :param others: Intervals to combine with self.
+        :type others: Intervals
+        :returns: Ordered intervals within any of the intervals.
+        :rtype: Intervals
+        '''
+        starts = np.concatenate([self.starts] + [o.starts for o in others])
+        stops = np.concatenate([self.stops] + [o.stops for o in others])
+        integer = self.integer and all(o.integer for o in others)
+        keep = starts < stops
+        starts = starts[keep]
+        stops = stops[keep]
+        order = np.argsort(starts, kind='mergesort')
+        starts = starts[order]
+        stops = np.maximum.accumulate(stops[order])
+        if not len(starts):
+            return Intervals(starts, stops, integer=integer)
+        # A new interval begins where the start is after all previous stops.
+        begins = np.flatnonzero(starts[1:] > stops[:-1]) + 1
+        ends = np.append(begins - 1, len(stops) - 1)
+        return Intervals(starts[np.append(0, begins)], stops[ends],
+                         integer=integer)
+
+    __or__ = union
+
+    def intersection(self, other):
+        '''
+        Each interval of the result is the overlap of an interval of self
+        with an interval of other, so touching intervals are not joined.
+
+        :param other: Intervals to intersect with self.
+        :type other: Intervals
+        :returns: Ordered intervals within both self and other.
+        :rtype: Intervals
+        '''
+        first = self if self.is_ordered() else self.union()
+        second = other if other.is_ordered() else other.union()
+        # The intervals of second overlapping each interval of first. Both
+        # the starts and stops of ordered intervals are sorted.
+        lower = np.searchsorted(second.stops, first.starts, side='right')
+        upper = np.searchsorted(second.starts, first.stops, side='left')
+        counts = np.maximum(upper - lower, 0)
+        first_index = np.repeat(np.arange(len(first)), counts)
+        second_index = np.arange(counts.sum()) + \
+            np.repeat(lower - np.cumsum(counts) + counts, counts)
+        return Intervals(
+            np.maximum(first.starts[first_index],
+                       second.starts[second_index]),
+            np.minimum(first.stops[first_index], second.stops[second_index]),
+            integer=first.integer and second.integer)
+
+    __and__ = intersection
+
+    def complement(self, begin=None, end=None):
+        '''
+        :param begin: Start of the range to find the gaps within or None.
+        :type begin: int or float or None
+        :param end: Stop of the range to find the gaps within or None.
+        :type end: int or float or None
+        :returns: Ordered intervals between begin and end which are not within any of the intervals.
+        :rtype: Intervals
+        '''
+        union = self.union()
+        begin = -np.inf if begin is None else begin
+        end = np.inf if end is None else end
+        starts = np.maximum(np.append(begin, union.stops), begin)
+        stops = np.minimum(np.append(union.starts, end), end)
+        keep = starts < stops
+        integer = union.integer and \
+            all(isinstance(b, INTEGER_TYPES) or np.isinf(b)
+                for b in (begin, end))
+        return Intervals(starts[keep], stops[keep], integer=integer)
+
+    __invert__ = complement
+
+    def remove_small_gaps(self, samples):
+        '''
+        Join each interval to the previous interval when the gap between
+        them is smaller than samples. The joined interval stops at the stop
+        of the later interval.
+
+        :param samples: Number of samples below which gaps are removed.
+        :type samples: int or float
+        :rtype: Intervals
+        '''
+        if len(self) < 2:
+            return self
+        begins = np.flatnonzero(
+            self.starts[1:] - self.stops[:-1] >= samples) + 1
+        ends = np.append(begins - 1, len(self) - 1)
+        return Intervals(self.starts[np.append(0, begins)], self.stops[ends],
+                         integer=self.integer)
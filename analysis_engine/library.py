@@ -1,3 +1,4 @@
+import heapq
 import logging
 import numpy as np
 
@@ -12,6 +13,7 @@ from hdfaccess.parameter import MappedArray
 
 from flightdatautilities import aircrafttables as at
 
+from intervals import Intervals
 from settings import (DESCENT_LOW_CLIMB_THRESHOLD,
                       INITIAL_APPROACH_THRESHOLD,
                       KTS_TO_MPS,
@@ -366,12 +368,6 @@ def align(slave, master, interpolate=True):
     assert is_power2(ws) or is_5_10_20(ws), \
            "slave = '%s' @ %sHz; ws=%s" % (slave.name, slave.hz, ws)
 
-    # Trap 5, 10 or 20Hz parameters that have non-zero offsets (this case is not currently covered)
-    if is_5_10_20(wm) and master.offset:
-        raise ValueError('Align: Master offset non-zero at sample rate %sHz' %master.frequency)
-    if is_5_10_20(ws) and slave.offset:
-        raise ValueError('Align: Slave offset non-zero at sample rate %sHz' %slave.frequency)
-    
     # Compute the sample rate ratio:
     r = wm / float(ws)
 
@@ -381,77 +377,148 @@ def align(slave, master, interpolate=True):
     if len_aligned != (len(slave_array) * r):
         raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
 
-    slave_aligned = np.ma.zeros(len(slave_array) * r, dtype=_dtype)
-
     # Where offsets are equal, the slave_array recorded values remain
     # unchanged and interpolation is performed between these values.
     # - and we do not interpolate mapped arrays!
     if not delta and interpolate and (is_power2(slave.frequency) and
                                       is_power2(master.frequency)):
-        slave_aligned.mask = True
         if master.frequency > slave.frequency:
             # populate values and interpolate
-            slave_aligned[0::r] = slave_array[0::1]
-            # Interpolate and do not extrapolate masked ends or gaps
-            # bigger than the duration between slave samples (i.e. where
-            # original slave data is masked).
-            # If array is fully masked, return array of masked zeros
-            dur_between_slave_samples = 1.0 / slave.frequency
-            return repair_mask(slave_aligned, frequency=master.frequency,
-                               repair_duration=dur_between_slave_samples,
-                               zero_if_masked=True)
-
+            return _align_upsample(slave_array, int(r), _dtype)
         else:
             # step through slave taking the required samples
-            return slave_array[0::1/r]
-
-    # Each sample in the master parameter may need different combination parameters
-    for i in range(int(wm)):
-        bracket = (i / r) + delta
-        # Interpolate between the hth and (h+1)th samples of the slave array
-        h = int(floor(bracket))
-        h1 = h + 1
-
-        # Compute the linear interpolation coefficients, b & a
-        b = bracket - h
-
-        # Cunningly, if we are interpolating (working with mapped arrays e.g.
-        # discrete or multi-state parameters), by reverting to 1,0 or 0,1
-        # coefficients we gather the closest value in time to the master
-        # parameter.
-        if not interpolate:
-            b = round(b)
+            return slave_array[0::int(1 / r)]
 
-        # Either way, a is the residual part.
-        a = 1 - b
+    return _align_resample(slave_array, len_aligned, int(wm), int(ws), r,
+                           delta, interpolate, _dtype)
 
-        if h < 0:
-            if h<-ws:
-                raise ValueError('Align called with excessive timing mismatch')
-            # slave_array values do not exist in aligned array
-            if ws==1:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
-            else:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
-            # We can't interpolate the inital values as we are outside the
-            # range of the slave parameters.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i] = 0
-            slave_aligned[i] = np.ma.masked
-        elif h1 >= ws:
-            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
-            # At the other end, we run out of slave parameter values so need to
-            # pad to the end of the array.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i-wm] = 0
-            slave_aligned[i-wm] = np.ma.masked
-        else:
-            # Sheer bliss. We can compute slave_aligned across the whole
-            # range of the data without having to take special care at the
-            # ends of the array.
-            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
 
-    return slave_aligned
+def _align_upsample(slave_array, r, dtype):
+    '''
+    Upsample slave_array by an integer ratio where the offsets of the slave
+    and master are equal. The slave's recorded values are kept and linear
+    interpolation is performed between them. Interpolated values are
+    masked where either neighbouring slave sample is masked and beyond the
+    last slave sample (we do not extrapolate).
+
+    :param slave_array: Array to upsample.
+    :type slave_array: np.ma.array
+    :param r: Ratio of master to slave sample rates.
+    :type r: int
+    :param dtype: dtype of the returned array.
+    :type dtype: type
+    :returns: Upsampled array.
+    :rtype: np.ma.array
+    '''
+    if not np.ma.count(slave_array):
+        # If array is fully masked, return array of masked zeros
+        return np.ma.zeros(len(slave_array) * r, dtype=dtype, mask=True)
+    data = np.ma.getdata(slave_array).astype(float)
+    mask = np.ma.getmaskarray(slave_array)
+    # Each row holds a recorded slave sample followed by the values
+    # interpolated towards the next slave sample.
+    following = np.append(data[1:], 0)
+    # Mirrors the np.interp arithmetic used to repair gaps between samples.
+    slope = (following - data) / float(r)
+    aligned_data = slope[:, np.newaxis] * np.arange(r) + \
+        data[:, np.newaxis]
+    # We do not interpolate across masked samples or extrapolate beyond the
+    # last slave sample.
+    invalid = mask | np.append(mask[1:], True)
+    aligned_data[invalid, 1:] = 0
+    aligned_data[:, 0] = data
+    aligned_mask = np.empty_like(aligned_data, dtype=bool)
+    aligned_mask[:] = invalid[:, np.newaxis]
+    aligned_mask[:, 0] = mask
+    return np.ma.array(aligned_data.ravel().astype(dtype, copy=False),
+                       mask=aligned_mask.ravel())
+
+
+def _align_resample(slave_array, len_aligned, wm, ws, r, delta, interpolate,
+                    dtype):
+    '''
+    Resample slave_array by linear interpolation (or nearest sample if not
+    interpolating) onto the master's timebase. All samples are computed in
+    a single vectorised pass, processing the data and mask together.
+
+    Master sample j lies at slave sample position j / r + delta. The
+    interpolation coefficients repeat every wm master samples (ws slave
+    samples), so they are computed once per phase within the period.
+
+    :param slave_array: Array to resample.
+    :type slave_array: np.ma.array
+    :param len_aligned: Length of the aligned array.
+    :type len_aligned: int
+    :param wm: Master samples per period.
+    :type wm: int
+    :param ws: Slave samples per period.
+    :type ws: int
+    :param r: Ratio of master to slave sample rates.
+    :type r: float
+    :param delta: Timing disparity in slave sample intervals.
+    :type delta: float
+    :param interpolate: Whether to interpolate or take the nearest sample.
+    :type interpolate: bool
+    :param dtype: dtype of the returned array.
+    :type dtype: type
+    :raises ValueError: If the timing mismatch exceeds one period.
+    :returns: Resampled array.
+    :rtype: np.ma.array
+    '''
+    # Each sample in the master parameter may need different combination
+    # parameters
+    bracket = (np.arange(wm) / r) + delta
+    # Interpolate between the hth and (h+1)th samples of the slave array
+    h = np.floor(bracket).astype(int)
+    if np.any(h < -ws):
+        raise ValueError('Align called with excessive timing mismatch')
+
+    # Compute the linear interpolation coefficients, b & a
+    b = bracket - h
+
+    # Cunningly, if we are interpolating (working with mapped arrays e.g.
+    # discrete or multi-state parameters), by reverting to 1,0 or 0,1
+    # coefficients we gather the closest value in time to the master
+    # parameter.
+    if not interpolate:
+        b = np.where(b >= 0.5, 1.0, 0.0)
+
+    # Either way, a is the residual part.
+    a = 1 - b
+
+    # Index of the hth slave sample for each master sample, arranged with
+    # one row per period and one column per phase so that the coefficients
+    # broadcast across the periods.
+    periods = -(-len_aligned // wm)
+    h = (np.arange(periods) * ws)[:, np.newaxis] + h
+
+    data = np.ma.getdata(slave_array)
+    if interpolate:
+        aligned_data = a * data.take(h, mode='clip') + \
+            b * data.take(h + 1, mode='clip')
+    else:
+        # Coefficients are 1,0 or 0,1 so gather the closest sample.
+        aligned_data = data.take(h + b.astype(int), mode='clip')
+    aligned_data = aligned_data.ravel()[:len_aligned]
+    h = h.ravel()[:len_aligned]
+    h1 = h + 1
+
+    # We can't interpolate values outside the range of the slave
+    # parameter. Treat ends as "padding"; Value of 0 and Masked.
+    length = len(slave_array)
+    padding = (h < 0) | (h1 >= length)
+    aligned_data[padding] = 0
+
+    mask = np.ma.getmask(slave_array)
+    if mask is not np.ma.nomask:
+        aligned_mask = padding | mask.take(h, mode='clip') | \
+            mask.take(h1, mode='clip')
+    elif padding.any():
+        aligned_mask = padding
+    else:
+        aligned_mask = np.ma.nomask
+    return np.ma.array(aligned_data.astype(dtype, copy=False),
+                       mask=aligned_mask)
 
 
 def align_slices(slave, master, slices):
@@ -1015,31 +1082,92 @@ def cycle_finder(array, min_step=0.0, include_ends=True):
         except:
             pass # as before.
 
-    # This section progressively removes reversals smaller than the step size of
-    # interest, hence the arrays shrink until just the desired answer is left.
-    dvals = np.ediff1d(vals)
-    while len(dvals) > 0 and np.min(abs(dvals)) < min_step:
-        sort_idx = np.argmin(abs(dvals))
-        last = len(dvals)
-        if sort_idx == 0:
-            idxs = np.delete(idxs, 0)
-            vals = np.delete(vals, 0)
-            dvals = np.delete(dvals, 0)
-        elif sort_idx == last-1:
-            idxs = np.delete(idxs, last)
-            vals = np.delete(vals, last)
-            dvals = np.delete(dvals, last-1) # One fewer dval than val.
+    # Progressively remove reversals smaller than the step size of interest
+    # until just the desired answer is left.
+    if len(vals) > 1:
+        keep = _small_cycle_mask(np.ediff1d(vals), min_step)
+        idxs = idxs[keep]
+        vals = vals[keep]
+    return idxs, vals
+
+
+def _small_cycle_mask(dvals, min_step):
+    '''
+    Find the turning points which remain after repeatedly removing the
+    smallest change between turning points while it is less than min_step.
+
+    A smallest change at either end removes the end point. Elsewhere, both
+    points of the change are removed and the changes either side are joined
+    to the previous change. Where changes are equal, the first is removed.
+
+    The changes are held in a heap and a linked list, so removing each change
+    costs O(log n) rather than the O(n) of searching and reallocating arrays.
+    Changes which have been removed or joined are left in the heap and
+    ignored when popped.
+
+    :param dvals: Changes between consecutive turning points.
+    :type dvals: np.ndarray
+    :param min_step: Minimum step, below which fluctuations will be removed.
+    :type min_step: float
+    :returns: Whether each of the len(dvals) + 1 turning points remains.
+    :rtype: np.ndarray of bool
+    '''
+    count = len(dvals)
+    keep = np.ones(count + 1, dtype=bool)
+    absolute = np.abs(dvals)
+    if not count or not np.min(absolute) < min_step:
+        # Includes changes of NaN where np.min is also NaN.
+        return keep
+    # Python floats give the same sums as float64 arrays, other dtypes are
+    # summed as numpy scalars to keep their precision.
+    changes = dvals.tolist() if dvals.dtype == np.float64 else list(dvals)
+    heap = zip(absolute.tolist() if dvals.dtype == np.float64 else
+               list(absolute), range(count))
+    heapq.heapify(heap)
+    # Turning point after each change and the neighbouring changes.
+    after = range(1, count + 1)
+    previous = range(-1, count - 1)
+    following = range(1, count + 1)
+    following[-1] = -1
+    removed = [False] * count
+    first_point = 0
+    while heap:
+        size, index = heap[0]
+        if removed[index] or size != abs(changes[index]):
+            heapq.heappop(heap)
+            continue
+        if not size < min_step:
+            break
+        heapq.heappop(heap)
+        before, next_ = previous[index], following[index]
+        removed[index] = True
+        if before == -1:
+            # Remove the first point.
+            keep[first_point] = False
+            first_point = after[index]
+            if next_ != -1:
+                previous[next_] = -1
+        elif next_ == -1:
+            # Remove the last point.
+            keep[after[index]] = False
+            following[before] = -1
         else:
-            idxs = np.delete(idxs, slice(sort_idx, sort_idx + 2))
-            vals = np.delete(vals, slice(sort_idx, sort_idx + 2))
-            dvals[sort_idx - 1] += dvals[sort_idx] + dvals[sort_idx + 1]
-            dvals = np.delete(dvals, slice(sort_idx, sort_idx + 2))
-    if len(dvals) == 0:
-        # All the changes have disappeared, so return the
-        # single array peak index and value.
-        return idxs, vals
-    else:
-        return idxs, vals
+            # Remove both points of the change and join the changes either
+            # side to the previous change.
+            keep[after[before]] = False
+            keep[after[index]] = False
+            removed[next_] = True
+            changes[before] += changes[index] + changes[next_]
+            after[before] = after[next_]
+            following[before] = following[next_]
+            if following[next_] != -1:
+                previous[following[next_]] = before
+            joined = abs(changes[before])
+            if joined != joined:
+                # A change of NaN stops the removal.
+                break
+            heapq.heappush(heap, (joined, before))
+    return keep
 
 
 def cycle_match(idx, cycle_idxs, dist=None):
@@ -1173,9 +1301,9 @@ def clip(array, period, hz=1.0, remove='peaks_and_troughs'):
     end = len(source)-half_width
     
     #...and work out these graphs.
-    for point in range(half_width,end):  # SLOW!
-        local_max[point]=np.ma.max(source[point-half_width:point+half_width+1])
-        local_min[point]=np.ma.min(source[point-half_width:point+half_width+1])
+    window_min, window_max = sliding_min_max(source, half_width)
+    local_max[half_width:end] = window_max[half_width:end]
+    local_min[half_width:end] = window_min[half_width:end]
     
     # For the maxima, find them using the cycle finder and remove the higher
     # maxima (we are interested in using the lower cycle peaks to replace
@@ -1854,6 +1982,12 @@ def masked_first_order_filter(y_term, x_term, param, initial_value):
     This is a better option than masking all subsequent values which would be
     the mathematically correct thing to do with infinite response filters.
 
+    The filter state is reset at the start of each unmasked block. For first
+    order filters all of the blocks are filtered in a single pass and the
+    response to the reset state is added to each block, as this is much
+    faster than filtering each block separately when there are many small
+    masked gaps.
+
     :param y_term: Filter denominator terms.
     :type param: list
     :param x_term: Filter numerator terms.
@@ -1869,27 +2003,73 @@ def masked_first_order_filter(y_term, x_term, param, initial_value):
     # The initial value may be set as a command line argument, mainly for testing
     # otherwise we set it to the first data value.
 
-    result = np.ma.zeros(len(param))  # There is no zeros_like method.
-    good_parts = np.ma.clump_unmasked(param)
-    for good_part in good_parts:
+    mask = np.ma.getmaskarray(param)
+    masked = mask.any()
+    data = np.asarray(np.ma.getdata(param), dtype=float)
+    if masked:
+        data = data[~mask]
+        # Positions of the start of each unmasked block, other than the
+        # first, within the unmasked data. Each is preceded by a masked
+        # block, so subtract the length of the masked blocks before it.
+        block_begins = np.flatnonzero(mask[:-1] & ~mask[1:]) + 1
+        mask_begins = np.flatnonzero(~mask[:-1] & mask[1:]) + 1
+        if mask[0]:
+            mask_begins = np.concatenate(([0], mask_begins))
+        starts = block_begins - np.cumsum(
+            block_begins - mask_begins[:len(block_begins)])
+        starts = starts[starts > 0]
+    else:
+        starts = np.array([], dtype=int)
 
+    result = np.zeros(len(param))
+    if len(data):
         if initial_value is None:
-            initial_value = param[good_part.start]
-        # Tested version here...
-        answer, z_final = lfilter(x_term, y_term, param[good_part], zi=z_initial*initial_value)
-        result[good_part] = np.ma.array(answer)
+            initial_value = data[0]
+        y_term = np.asarray(y_term, dtype=float)
+        x_term = np.asarray(x_term, dtype=float)
+        decay = -y_term[1] / y_term[0] if len(y_term) == 2 else None
+        if len(starts) and (decay is None or abs(decay) >= 1.0):
+            # Higher order or unstable filters are applied to each block.
+            answer = np.concatenate([
+                lfilter(x_term, y_term, block, zi=z_initial*initial_value)[0]
+                for block in np.split(data, starts)])
+        else:
+            answer, z_final = lfilter(x_term, y_term, data,
+                                      zi=z_initial*initial_value)
+        if len(starts) and decay is not None and abs(decay) < 1.0:
+            # The state carried into each block by the single pass is
+            # y[n] = b[0]*x[n] + z[n-1], z[n] = b[1]*x[n] - a[1]*y[n]
+            # so the difference from the reset state decays as
+            # decay**samples through the block.
+            b_1 = x_term[1] / y_term[0] if len(x_term) > 1 else 0.0
+            carried = b_1 * data[starts - 1] + decay * answer[starts - 1]
+            correction = np.zeros(len(starts) + 1)
+            correction[1:] = z_initial[0] * initial_value - carried
+            block_starts = np.concatenate(([0], starts))
+            block_lengths = np.diff(np.concatenate((block_starts,
+                                                    [len(data)])))
+            # Samples after the correction has decayed below the precision
+            # of the data are unchanged.
+            if decay:
+                decayed = int(np.ceil(np.log(np.finfo(float).eps) /
+                                      np.log(abs(decay))))
+            else:
+                decayed = 1
+            decayed = min(decayed, block_lengths.max())
+            decays = np.append(decay ** np.arange(decayed), 0.0)
+            position = np.arange(len(data)) - np.repeat(block_starts,
+                                                        block_lengths)
+            answer += np.repeat(correction, block_lengths) * \
+                decays[np.minimum(position, decayed)]
+        if masked:
+            result[~mask] = answer
+        else:
+            result = answer
 
     # The mask should last indefinitely following any single corrupt data point
     # but this is impractical for our use, so we just copy forward the original
     # mask.
-    bad_parts = np.ma.clump_masked(param)
-    for bad_part in bad_parts:
-        # The mask should last indefinitely following any single corrupt data point
-        # but this is impractical for our use, so we just copy forward the original
-        # mask.
-        result[bad_part] = np.ma.masked
-
-    return result
+    return np.ma.array(result, mask=mask if masked else np.ma.nomask)
 
 
 def first_order_washout(param, time_constant, hz, gain=1.0, initial_value=None):
@@ -2337,70 +2517,200 @@ def ground_track(lat_fix, lon_fix, gspd, hdg, frequency, mode):
     east = integrate(delta_east, frequency, scale=KTS_TO_MPS,
                      direction=direction)
 
+    return _ground_track_coordinates(lat_fix, lon_fix, north, east,
+                                     result.mask)
+
+
+def _ground_track_coordinates(lat_fix, lon_fix, north, east, mask):
+    '''
+    :param lat_fix: Fixed latitude point at one end of the data.
+    :type lat_fix: float
+    :param lon_fix: Fixed longitude point at the same time as lat_fix.
+    :type lon_fix: float
+    :param north: Distance north of the fixed point in metres.
+    :type north: np.ma.masked_array
+    :param east: Distance east of the fixed point in metres.
+    :type east: np.ma.masked_array
+    :param mask: Mask of the speed and heading.
+    :type mask: np.ndarray of bool
+    :returns: Latitude and longitude of the ground track.
+    :rtype: (np.ma.masked_array, np.ma.masked_array)
+    '''
     bearing = np.ma.array(np.rad2deg(np.arctan2(east, north)))
     distance = np.ma.array(np.ma.sqrt(north**2 + east**2))
-    distance.mask = result.mask
+    distance.mask = mask
+    return latitudes_and_longitudes(bearing, distance,
+                                    {'latitude':lat_fix,
+                                     'longitude':lon_fix})
+
+
+def gtp_weighting_basis(length, straight_ends):
+    '''
+    The speed weighting is interpolated between the weight at each straight
+    end and a weight of 1.0 at either end of the track, so is linear in the
+    weights.
+
+    :param length: Length of the speed array.
+    :type length: int
+    :param straight_ends: Indices of the ends of the straight sections.
+    :type straight_ends: [int]
+    :returns: Constant component of the speed weighting and the component of each weight, so that the speed weighting is constant + np.dot(weights, basis).
+    :rtype: (np.ndarray, np.ndarray)
+    '''
+    # The weight setting each knot of the weighting, with -1 for the ends of
+    # the track. Later weights replace earlier weights at the same index.
+    knots = {}
+    for idx, index in enumerate(straight_ends):
+        knots[length - 1 if index == length else index] = idx
+    knots[0] = knots[length - 1] = -1
+    positions = sorted(knots)
+    owners = np.array([knots[p] for p in positions])
+    samples = np.arange(length)
+    constant = np.interp(samples, positions, (owners == -1).astype(float))
+    basis = np.empty((len(straight_ends), length))
+    for idx in range(len(straight_ends)):
+        basis[idx] = np.interp(samples, positions,
+                               (owners == idx).astype(float))
+    return constant, basis
 
-    lat, lon = latitudes_and_longitudes(bearing, distance,
-                                        {'latitude':lat_fix,
-                                         'longitude':lon_fix})
-    return lat, lon
 
 def gtp_weighting_vector(speed, straight_ends, weights):
-    # Compute the speed weighted error
-    speed_weighting = np_ma_masked_zeros_like(speed)
+    '''
+    :param speed: Speed for the duration of the ground track.
+    :type speed: np.ma.masked_array
+    :param straight_ends: Indices of the ends of the straight sections.
+    :type straight_ends: [int]
+    :param weights: Weight of the speed at each straight end.
+    :type weights: [float]
+    :returns: Speed weighting interpolated between the weights.
+    :rtype: np.ma.masked_array
+    '''
+    constant, basis = gtp_weighting_basis(len(speed), straight_ends)
+    weights = np.asarray(weights, dtype=float)[:len(basis)]
+    return np.ma.array(constant + np.dot(weights, basis))
+
+
+def gtp_track_components(straights, straight_ends, speed, hdg, frequency,
+                         mode):
+    '''
+    Compute the ground track of gtp_compute_error for any weights.
+
+    ground_track repairs and integrates the weighted speed with operations
+    which are linear in the speed, and the speed weighting is linear in the
+    weights. The distances north and east are therefore a constant component
+    plus a component for each weight, so each evaluation of the error sums
+    the components rather than integrating the whole track again. Masked
+    headings are repaired in place before the track is computed.
+
+    :param straights: Straight sections of the track.
+    :type straights: [slice]
+    :param straight_ends: Indices of the ends of the straight sections.
+    :type straight_ends: [int]
+    :param speed: Groundspeed in knots.
+    :type speed: np.ma.masked_array
+    :param hdg: True heading in degrees.
+    :type hdg: np.ma.masked_array
+    :param frequency: Frequency of the speed and heading.
+    :type frequency: float
+    :param mode: Either 'takeoff' or 'landing'.
+    :type mode: str
+    :returns: Components of the distance north and east with the constant component first, the mask of the distances, the mask of the speed and heading, the samples within the straights and the cosine and sine of their heading. None if there are fewer than 5 valid samples.
+    :rtype: (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ma.masked_array, np.ma.masked_array) or None
+    '''
+    if len(speed) != len(hdg):
+        raise ValueError('Ground_track requires equi-length groundspeed and '
+                         'heading arrays')
+
+    if np.count_nonzero(~(np.ma.getmaskarray(speed) |
+                          np.ma.getmaskarray(hdg))) < 5:
+        return None
 
-    for idx, point in enumerate(straight_ends):
-        index = point
-        if index == len(speed_weighting):
-            index =- 1
-        speed_weighting[index] = weights[idx]
+    if mode == 'takeoff':
+        direction = 'backwards'
+    elif mode == 'landing':
+        direction = 'forwards'
+    else:
+        raise ValueError('Ground_track only recognises takeoff or landing '
+                         'modes')
 
-    # We ensure the endpoint scaling is unchanged, to avoid a sudden jump in speed.
-    speed_weighting[0] = 1.0
-    speed_weighting[-1] = 1.0
-    speed_weighting = interpolate(speed_weighting)
+    repair_mask(hdg, repair_duration=None)
+    # The track is masked where the heading could not be repaired.
+    track_mask = np.ma.getmaskarray(speed) | np.ma.getmaskarray(hdg)
+    hdg_rad = hdg * deg2rad
+    cos_hdg = np.ma.cos(hdg_rad)
+    sin_hdg = np.ma.sin(hdg_rad)
+    constant, basis = gtp_weighting_basis(len(speed), straight_ends)
+    north = np.empty((len(basis) + 1, len(speed)))
+    east = np.empty_like(north)
+    for row, weighting in enumerate([constant] + list(basis)):
+        gspd = speed * weighting
+        repair_mask(gspd, repair_duration=None)
+        # The mask is the same for every component.
+        north_row = integrate(gspd * cos_hdg, frequency, scale=KTS_TO_MPS,
+                              direction=direction)
+        east_row = integrate(gspd * sin_hdg, frequency, scale=KTS_TO_MPS,
+                             direction=direction)
+        north[row] = np.ma.getdata(north_row)
+        east[row] = np.ma.getdata(east_row)
+    mask = np.ma.getmaskarray(north_row) | np.ma.getmaskarray(east_row)
+
+    if straights:
+        track = np.concatenate([np.arange(len(speed))[s] for s in straights])
+    else:
+        track = np.array([], dtype=int)
+    hdg_track = np.radians(hdg[track])
+    return (north, east, mask, track_mask, track, np.ma.cos(hdg_track),
+            np.ma.sin(hdg_track))
 
-    return speed_weighting
 
 def gtp_compute_error(weights, *args):
-    straights = args[0]
-    straight_ends = args[1]
-    lat = args[2]
-    lon = args[3]
-    speed = args[4]
-    hdg = args[5]
-    frequency = args[6]
-    mode = args[7]
-    return_arg_set = args[8]
-    
+    '''
+    Cross track error of the ground track computed with the speed weighted
+    by weights from the recorded track.
+
+    The args are straights, straight_ends, lat, lon, speed, hdg, frequency,
+    mode and return_arg_set, optionally followed by the result of
+    gtp_track_components for these arguments so that it is computed once
+    rather than on every evaluation by the optimiser.
+
+    :raises ValueError: If there are too few valid samples to compute the ground track.
+    :returns: Error, or latitude, longitude and error if return_arg_set is not 'iterate'.
+    :rtype: float or (np.ma.masked_array, np.ma.masked_array, float)
+    '''
+    straights, straight_ends, lat, lon, speed, hdg, frequency, mode, \
+        return_arg_set = args[:9]
+
     if len(speed)==0:
         if return_arg_set == 'iterate':
             return 0.0
         else:
             return lat, lon, 0.0
 
-    speed_weighting  = gtp_weighting_vector(speed, straight_ends, weights)
-    if mode == 'takeoff':
-        lat_est, lon_est = ground_track(lat[-1], lon[-1],
-                                        speed * speed_weighting,
-                                        hdg, frequency, mode)
+    if len(args) > 9:
+        components = args[9]
     else:
-        lat_est, lon_est = ground_track(lat[0], lon[0],
-                                        speed * speed_weighting,
-                                        hdg, frequency, mode)
+        components = gtp_track_components(straights, straight_ends, speed,
+                                          hdg, frequency, mode)
+    if components is None:
+        raise ValueError('Too few valid samples to compute the ground track')
+    north, east, mask, track_mask, track, cos_hdg, sin_hdg = components
+
+    weights = np.asarray(weights, dtype=float)[:len(north) - 1]
+    fix = -1 if mode == 'takeoff' else 0
+    lat_est, lon_est = _ground_track_coordinates(
+        lat[fix], lon[fix],
+        np.ma.array(north[0] + np.dot(weights, north[1:]), mask=mask),
+        np.ma.array(east[0] + np.dot(weights, east[1:]), mask=mask),
+        track_mask)
 
     # Although we compute the whole track (it's easy) we only compute the
-    # error over the track_slice range to ignore the static ends of the
-    # data, which often contain spurious data.
-    errors = np.arange(len(straights), dtype=float)
-    for n, straight in enumerate(straights):
-        x_track_errors = ((lon[straight]-lon_est[straight])*np.cos(np.radians(hdg[straight])) -
-                          (lat[straight]-lat_est[straight])*np.sin(np.radians(hdg[straight])))
-        errors[n] = np.nansum(x_track_errors**2.0) \
-            * 1.0E09 # Just to make the numbers easy to read !
-
-    error = np.nansum(errors) # Treats nan as zero, in case masked values present.
+    # error over the straights to ignore the static ends of the data, which
+    # often contain spurious data.
+    x_track_errors = ((lon[track] - lon_est[track]) * cos_hdg -
+                      (lat[track] - lat_est[track]) * sin_hdg)
+    # Treats nan as zero, in case masked values present.
+    error = np.nansum(np.ma.filled(x_track_errors, 0.0) ** 2.0) \
+        * 1.0E09 # Just to make the numbers easy to read !
 
     # The optimization process expects a single error term in response, but
     # it is convenient to use this function to return the latitude and
@@ -2412,7 +2722,8 @@ def gtp_compute_error(weights, *args):
         return lat_est, lon_est, error
 
 
-def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
+def ground_track_precise(lat, lon, speed, hdg, frequency, mode,
+                         max_iterations=None):
     """
     Computation of the ground track.
     :param lat: Latitude for the duration of the ground track.
@@ -2429,6 +2740,8 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
     :type frequency: Float (units = Hz)
     :param mode: type of calculation to be completed.
     :type mode: String, either 'takeoff' or 'landing' accepted.
+    :param max_iterations: Optional limit on the iterations of the optimiser, in addition to its limit of 10 evaluations of the error and gradient.
+    :type max_iterations: int or None
 
     :returns
     :param lat_track: Latitude of computed ground track
@@ -2437,7 +2750,7 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
     :type lon_track: Numpy masked array.
 
     :error conditions
-    :Fewer than 5 valid data points, returns None, None
+    :Fewer than 5 valid data points fails with ValueError
     :Invalid mode fails with ValueError
     :Mismatched array lengths fails with ValueError
     """
@@ -2479,16 +2792,24 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
         straight_ends.append(straight.stop)
 
     # unable to optimize track if we have too few curves
-    if len(straight_ends) <= 4:
+    optimise = len(straight_ends) > 4
+    if optimise:
+        # We aren't interested in the first and last
+        del straight_ends[0]
+        del straight_ends[-1]
+
+    args = (straights, straight_ends, lat[track_slice], lon[track_slice],
+            speed[track_slice], hdg[track_slice], frequency, mode)
+    # The ground track is linear in the weights, so compute its components
+    # once rather than integrating the track for every evaluation.
+    components = gtp_track_components(straights, straight_ends, *args[4:])
+
+    if not optimise:
         logger.warning('Ground_track_precise needs at least two curved sections to operate.')
         # Substitute a unity weight vector.
         weights_opt = [np.array([1.0]*len(speed))]
 
     else:
-        # We aren't interested in the first and last
-        del straight_ends[0]
-        del straight_ends[-1]
-
         # Initialize the weights for no change.
         weight_length = len(straight_ends)
         weights = np.ma.ones(weight_length)
@@ -2497,21 +2818,20 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
         speed_bound = (0.5,1.5) # Restict the variation in speeds to 50%.
         boundaries = [speed_bound]*weight_length
 
+        options = {}
+        if max_iterations is not None:
+            options['maxiter'] = max_iterations
+
         # Then iterate until optimised solution has been found. We use a dull
         # algorithm for reliability, rather than the more exciting forms which
         # can go astray and give less predictable results.
         weights_opt = optimize.fmin_l_bfgs_b(gtp_compute_error, weights,
                                              fprime=None,
-                                             args = (straights,
-                                                     straight_ends,
-                                                     lat[track_slice],
-                                                     lon[track_slice],
-                                                     speed[track_slice],
-                                                     hdg[track_slice],
-                                                     frequency,
-                                                     mode, 'iterate'),
+                                             args=args + ('iterate',
+                                                          components),
                                              approx_grad=True, epsilon=1.0E-4,
-                                             bounds=boundaries, maxfun=10)
+                                             bounds=boundaries, maxfun=10,
+                                             **options)
         """
         fmin_l_bfgs_b license: This software is freely available, but we expect that all publications describing work using this software, or all commercial products using it, quote at least one of the references given below. This software is released under the BSD License.
         R. H. Byrd, P. Lu and J. Nocedal. A Limited Memory Algorithm for Bound Constrained Optimization, (1995), SIAM Journal on Scientific and Statistical Computing, 16, 5, pp. 1190-1208.
@@ -2519,9 +2839,8 @@ def ground_track_precise(lat, lon, speed, hdg, frequency, mode):
         J.L. Morales and J. Nocedal. L-BFGS-B: Remark on Algorithm 778: L-BFGS-B, FORTRAN routines for large scale bound constrained optimization (2011), ACM Transactions on Mathematical Software, 38, 1.
         """
 
-    args = (straights, straight_ends, lat[track_slice], lon[track_slice],
-            speed[track_slice], hdg[track_slice], frequency, mode, 'final_answer')
-    lat_est, lon_est, wt = gtp_compute_error(weights_opt[0], *args)
+    lat_est, lon_est, wt = gtp_compute_error(
+        weights_opt[0], *(args + ('final_answer', components)))
 
 
     """
@@ -2563,12 +2882,163 @@ def hash_array(array, sections, min_samples):
     return checksum.hexdigest()
 
 
+def _limit_scan(lower, upper, start):
+    '''
+    Limit a value to between lower and upper at each step, starting from
+    start, without looping over every step, i.e.
+
+        result[i] = min(max(result[i - 1], lower[i]), upper[i])
+
+    Limits compose into a single limit. The steps are split into chunks of
+    about sqrt(n) steps. The combined limits of every chunk are computed
+    together one position within the chunks at a time, the starting value of
+    each chunk is found from the combined limits of the preceding chunks and
+    then the results of every chunk are computed together in the same way.
+    Only comparisons are made, so the results are exact.
+
+    :param lower: Lower limit of each step.
+    :type lower: np.ndarray
+    :param upper: Upper limit of each step, not less than lower.
+    :type upper: np.ndarray
+    :param start: Value before the first step.
+    :type start: float
+    :returns: Value after each step.
+    :rtype: np.ndarray of float64
+    '''
+    length = len(lower)
+    chunk_size = max(int(sqrt(length)), 1)
+    chunks = -(-length // chunk_size)
+    # Limits with shape (chunk_size, chunks). Padding has no limits.
+    lower_rows = np.empty(chunks * chunk_size)
+    upper_rows = np.empty(chunks * chunk_size)
+    lower_rows[:length] = lower
+    upper_rows[:length] = upper
+    lower_rows[length:] = -np.inf
+    upper_rows[length:] = np.inf
+    lower_rows = lower_rows.reshape(chunks, chunk_size).T.copy()
+    upper_rows = upper_rows.reshape(chunks, chunk_size).T.copy()
+
+    # Combined limits of each chunk.
+    chunk_lower = np.empty(chunks)
+    chunk_upper = np.empty(chunks)
+    chunk_lower.fill(-np.inf)
+    chunk_upper.fill(np.inf)
+    for lower_row, upper_row in izip(lower_rows, upper_rows):
+        chunk_lower = np.minimum(np.maximum(chunk_lower, lower_row), upper_row)
+        chunk_upper = np.minimum(np.maximum(chunk_upper, lower_row), upper_row)
+
+    starts = np.empty(chunks)
+    for chunk, (chunk_min, chunk_max) in enumerate(izip(chunk_lower,
+                                                        chunk_upper)):
+        starts[chunk] = start
+        start = min(max(start, chunk_min), chunk_max)
+
+    result = np.empty((chunk_size, chunks))
+    current = starts
+    for position, (lower_row, upper_row) in enumerate(izip(lower_rows,
+                                                           upper_rows)):
+        current = np.minimum(np.maximum(current, lower_row), upper_row)
+        result[position] = current
+    return result.T.ravel()[:length]
+
+
+def _hysteresis_pass_loop(values, quarter_range, old):
+    '''
+    Apply hysteresis to values in a single direction.
+
+    :param values: Values to apply hysteresis to.
+    :type values: list or np.ndarray
+    :param quarter_range: A quarter of the level of hysteresis.
+    :type quarter_range: float
+    :param old: Starting value.
+    :type old: float
+    :returns: Result for each value.
+    :rtype: list
+    '''
+    result = []
+    append = result.append
+    for new in values:
+        if new - old > quarter_range:
+            old = new  - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        append(old)
+    return result
+
+
+def _hysteresis_pass_compiled(values, quarter_range, old):
+    '''
+    Version of _hysteresis_pass_loop which is compiled with numba if it is
+    installed.
+
+    :type values: np.ndarray of float64
+    :rtype: np.ndarray
+    '''
+    result = np.empty(len(values))
+    for index in range(len(values)):
+        new = values[index]
+        if new - old > quarter_range:
+            old = new  - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        result[index] = old
+    return result
+
+
+def _hysteresis_pass_chunked(values, quarter_range, old):
+    '''
+    Vectorised version of _hysteresis_pass_loop.
+
+    Each step of the loop limits the previous result to within quarter_range
+    of the value, which is computed by _limit_scan. The loop's comparisons
+    are then repeated on the results so that they are identical to the loop
+    where rounding would make them differ. From the first difference, if
+    any, the loop is used.
+
+    :type values: np.ndarray of float64
+    :rtype: np.ndarray
+    '''
+    length = len(values)
+    result = _limit_scan(values - quarter_range, values + quarter_range, old)
+
+    # Verify each result from the previous result as the loop would.
+    previous = np.empty(length)
+    previous[0] = old
+    previous[1:] = result[:-1]
+    difference = values - previous
+    with np.errstate(invalid='ignore'):
+        expected = np.where(difference > quarter_range,
+                            values - quarter_range,
+                            np.where(difference < -quarter_range,
+                                     values + quarter_range, previous))
+    differences = np.flatnonzero(expected != result)
+    if len(differences):
+        index = differences[0]
+        result[index:] = _hysteresis_pass_loop(values[index:].tolist(),
+                                               quarter_range,
+                                               previous[index])
+    return result
+
+
+# Choose the fastest implementation of a hysteresis pass. numba is an
+# optional dependency.
+try:
+    from numba import njit
+except ImportError:
+    _hysteresis_pass = _hysteresis_pass_chunked
+else:
+    _hysteresis_pass = njit(_hysteresis_pass_compiled)
+
+
 def hysteresis(array, hysteresis):
     """
     Applies hysteresis to an array of data. The function applies half the
     required level of hysteresis forwards and then backwards to provide a
     phase neutral result.
 
+    The passes are vectorised, or compiled if numba is installed, and give
+    identical results to looping over the samples.
+
     :param array: Input data for processing
     :type array: Numpy masked array
     :param hysteresis: Level of hysteresis to apply.
@@ -2578,36 +3048,30 @@ def hysteresis(array, hysteresis):
         return array
 
     quarter_range = hysteresis / 4.0
-    # Length is going to be used often, so prepare here:
-    length = len(array)
-    half_done = np.zeros(length)
-    result = np.zeros(length)
-    length = length-1 #  To be used for array indexing next
+    result = np.zeros(len(array))
 
     # get a list of the unmasked data - allow for array.mask = False (not an array)
     if array.mask is np.False_:
-        notmasked = np.arange(length+1)
+        notmasked = np.arange(len(array))
     else:
         notmasked = np.ma.where(array.mask == False)[0]
-    # The starting point for the computation is the first notmasked sample.
-    old = array[notmasked[0]]
-    for index in notmasked:
-        new = array[index]
+    values = array.data[notmasked]
 
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        half_done[index] = old
+    # The starting point for the computation is the first notmasked sample.
+    if values.dtype.kind == 'f' and values.dtype != np.float64:
+        # Loop over the values so that the arithmetic is within the array's
+        # precision.
+        half_done = np.array(_hysteresis_pass_loop(values, quarter_range,
+                                                   values[0]),
+                             dtype=np.float64)
+    else:
+        values = values.astype(np.float64)
+        half_done = _hysteresis_pass(values, quarter_range, values[0])
 
     # Repeat the process in the "backwards" sense to remove phase effects.
-    for index in notmasked[::-1]:
-        new = half_done[index]
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        result[index] = old
+    result[notmasked] = _hysteresis_pass(half_done[::-1].copy(),
+                                         quarter_range,
+                                         half_done[-1])[::-1]
 
     # At the end of the process we reinstate the mask, although the data
     # values may have affected the result.
@@ -3141,6 +3605,13 @@ def slices_and(first_list, second_list):
 
     :returns: List of slices where first and second lists overlap.
     '''
+    first = Intervals.from_slices(first_list)
+    second = Intervals.from_slices(second_list)
+    if first.is_ordered() and second.is_ordered():
+        return (first & second).to_slices()
+
+    # Unsorted or overlapping lists return the overlap of every pair of
+    # slices in the order of the lists.
     def fwd(_slice):
         if (_slice.step is not None and _slice.step < 0):
             return slice(_slice.stop+1, max(_slice.start+1,0), -_slice.step)
@@ -3218,11 +3689,14 @@ def slices_not(slice_list, begin_at=None, end_at=None):
     if end_at is not None and end_at > endpoint:
         endpoint = end_at
 
-    workspace = np.ma.zeros(endpoint)
-    for each_slice in slice_list:
-        workspace[each_slice] = 1
-    workspace=np.ma.masked_equal(workspace, 1)
-    return shift_slices(np.ma.clump_unmasked(workspace[startpoint:endpoint]), startpoint)
+    if startpoint == endpoint == 0:
+        # An empty range at the start of the data is returned as an empty
+        # slice, as it was when the gaps were found within a workspace
+        # array.
+        return [slice(0, 0)]
+
+    return Intervals.from_slices(slice_list).complement(
+        startpoint, endpoint).to_slices()
 
 
 def slices_or(*slice_lists, **kwargs):
@@ -3272,12 +3746,11 @@ def slices_or(*slice_lists, **kwargs):
         endpoint = b
 
     if startpoint>=0 and endpoint>0:
-        workspace = np.ma.zeros(b)
-        for slice_list in slice_lists:
-            for each_slice in slice_list:
-                workspace[each_slice] = 1
-        workspace=np.ma.masked_equal(workspace, 1)
-        return shift_slices(np.ma.clump_masked(workspace[startpoint:endpoint]), startpoint)
+        # Slices without a stop extend to the end of the last slice.
+        union = Intervals.from_slices(
+            [s for slice_list in slice_lists for s in slice_list]).union()
+        return union.intersection(
+            Intervals([startpoint], [min(endpoint, b)])).to_slices()
 
 
 def slices_remove_small_gaps(slice_list, time_limit=10, hz=1):
@@ -3299,13 +3772,8 @@ def slices_remove_small_gaps(slice_list, time_limit=10, hz=1):
     sample_limit = time_limit * hz
     if slice_list is None or len(slice_list) < 2:
         return slice_list
-    new_list = [slice_list[0]]
-    for each_slice in slice_list[1:]:
-        if each_slice.start - new_list[-1].stop < sample_limit:
-            new_list[-1] = slice(new_list[-1].start, each_slice.stop)
-        else:
-            new_list.append(each_slice)
-    return new_list
+    return Intervals.from_slices(slice_list).remove_small_gaps(
+        sample_limit).to_slices()
             
 
 def slices_remove_small_slices(slice_list, time_limit=10, hz=1, count=None):
@@ -4692,6 +5160,35 @@ def peak_index(a):
                 return loc+peak
 
 
+def _dilate_mask(mask, samples):
+    '''
+    Extends each masked sample to the samples either side of it. The window
+    is built up by doubling its length so that the number of passes over the
+    array grows with the logarithm of the number of samples.
+
+    :param mask: Boolean mask.
+    :type mask: np.ndarray
+    :param samples: Number of samples to extend the mask by on either side.
+    :type samples: int
+    :returns: Mask which is True within samples of a True value of mask.
+    :rtype: np.ndarray
+    '''
+    if not mask.any():
+        return mask.copy()
+    dilated = np.concatenate((np.zeros(samples, dtype=bool), mask,
+                              np.zeros(samples, dtype=bool)))
+    # Each pass extends dilated[i] to the logical or of the padded mask over
+    # a longer window starting at i. The full window of samples*2+1 is
+    # centred on mask[i].
+    length = 1
+    window = samples * 2 + 1
+    while length < window:
+        step = min(length, window - length)
+        dilated[:-step] |= dilated[step:]
+        length += step
+    return dilated[:len(mask)]
+
+
 def rate_of_change_array(to_diff, hz, width=None, method='two_points'):
     '''
     Lower level access to rate of change algorithm. See rate_of_change for
@@ -4733,11 +5230,9 @@ def rate_of_change_array(to_diff, hz, width=None, method='two_points'):
         slope[hw:-hw] = (to_diff[2*hw:] - to_diff[:-2*hw])/width
         slope[:hw] = (to_diff[1:hw+1] - to_diff[0:hw]) * hz
         slope[-hw:] = (to_diff[-hw:] - to_diff[-hw-1:-1])* hz
-        slope.mask = np.logical_or(input_mask, np.ma.getmaskarray(slope))
-        for i in range(-hw,0):
-            slope.mask[:i] = np.logical_or(input_mask[-i:], slope.mask[:i])
-        for i in range(1,hw+1):
-            slope.mask[i:] = np.logical_or(input_mask[:-i], slope.mask[i:])
+        # Mask the slope within hw samples of masked input data.
+        slope.mask = np.logical_or(_dilate_mask(input_mask, hw),
+                                   np.ma.getmaskarray(slope))
         return slope    
 
     elif method == 'regression':
@@ -4750,11 +5245,16 @@ def rate_of_change_array(to_diff, hz, width=None, method='two_points'):
         x = np.arange(-hw,hw+1) 
         # Scaling is given by:
         sx2_hz = np.sum(x*x)/hz 
-        # We extended data array to allow for convolution overruns.
-        z = np.array([to_diff[0]]*hw+list(to_diff)+[to_diff[-1]]*hw) 
+        # We extended data array to allow for convolution overruns. Masked
+        # samples are not a number, so the fit is not a number within hw
+        # samples of masked data.
+        z = np.ma.getdata(to_diff)
+        if np.ma.is_masked(to_diff):
+            z = np.ma.filled(to_diff.astype(float), np.nan)
+        z = np.concatenate((np.repeat(z[:1], hw), z, np.repeat(z[-1:], hw)))
         # The compute the least squares fit for each point over the required
         # range and re-scale to allow for width and sample rate.
-        return np.convolve(z,-x,'same')[hw:-hw]/sx2_hz 
+        return np.convolve(z,-x,'valid')/sx2_hz 
         
     else:
         raise ValueError('Rate of change called with unrecognised method')
@@ -4818,45 +5318,55 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     else:
         repair_samples = None
 
-    masked_sections = np.ma.clump_masked(array)
-    for section in masked_sections:
-        length = section.stop - section.start
-        if repair_samples and length > repair_samples:
-            if raise_duration_exceedance:
-                raise ValueError("Length of masked section '%s' exceeds "
-                                 "repair duration '%s'." % (length * frequency,
-                                                            repair_duration))
-            else:
-                continue # Too long to repair
-        elif section.start == 0:
-            if extrapolate:
-                # TODO: Does it make sense to subtract 1 from the section stop??
-                #array.data[section] = array.data[section.stop - 1]
-                if zero_if_masked:
-                    array.data[section]=0.0
-                else:
-                    array.data[section] = array.data[section.stop]
-                array.mask[section] = False
-            else:
-                continue # Can't interpolate if we don't know the first sample
+    mask = np.ma.getmask(array)
+    if mask is np.ma.nomask or not mask.any():
+        return array
 
-        elif section.stop == len(array):
-            if extrapolate:
-                if zero_if_masked:
-                    array.data[section]=0.0
-                else:
-                    array.data[section] = array.data[section.start - 1]
-                array.mask[section] = False
-            else:
-                continue # Can't interpolate if we don't know the last sample
-        else:
-            start_value = array.data[section.start - 1]
-            end_value = array.data[section.stop]
-            if repair_above is None or (start_value > repair_above and end_value > repair_above):
-                array.data[section] = np.interp(np.arange(length) + 1,
-                                                [0, length + 1],
-                                                [start_value, end_value])
-                array.mask[section] = False
+    # Classify all of the masked sections at once.
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False]))))
+    starts = edges[::2]
+    stops = edges[1::2]
+    lengths = stops - starts
+    if repair_samples:
+        too_long = lengths > repair_samples
+        if raise_duration_exceedance and too_long.any():
+            length = lengths[too_long][0]
+            raise ValueError("Length of masked section '%s' exceeds "
+                             "repair duration '%s'." % (length * frequency,
+                                                        repair_duration))
+    else:
+        too_long = np.zeros(len(starts), dtype=bool)
+    leading = ~too_long & (starts == 0)
+    trailing = ~too_long & ~leading & (stops == len(array))
+    interior = ~too_long & ~leading & ~trailing
+
+    data = array.data
+    if extrapolate:
+        if leading.any():
+            stop = stops[0]
+            data[:stop] = 0.0 if zero_if_masked else data[stop]
+            mask[:stop] = False
+        if trailing.any():
+            start = starts[-1]
+            data[start:] = 0.0 if zero_if_masked else data[start - 1]
+            mask[start:] = False
+
+    # Interpolate across every repairable section with a single call using
+    # the unmasked samples either side of the sections.
+    starts = starts[interior]
+    stops = stops[interior]
+    if repair_above is not None:
+        repairable = (data[starts - 1] > repair_above) & \
+            (data[stops] > repair_above)
+        starts = starts[repairable]
+        stops = stops[repairable]
+    if len(starts):
+        lengths = stops - starts
+        indices = np.arange(lengths.sum()) + \
+            np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        known = np.unique(np.concatenate((starts - 1, stops)))
+        data[indices] = np.interp(indices, known, data[known])
+        mask[indices] = False
 
     return array
 
@@ -5702,6 +6212,8 @@ def touchdown_inertial(land, roc, alt):
     :param rod: rate of descent at touchdown
     :type rod: float, units fpm
     """
+    # import locally to speed up imports of library.py
+    from scipy.signal import lfilter
     # Time constant of 6 seconds.
     tau = 1/6.0
     # Make space for the integrand
@@ -5714,9 +6226,22 @@ def touchdown_inertial(land, roc, alt):
 
     # Start at the beginning...
     sm_ht[0] = alt.array[startpoint]
-    #...and calculate each with a weighted correction factor.
-    for i in range(1, len(sm_ht)):  # FIXME: Slow - esp. when landing covers a large period - perhaps second check that altitude is sensible?
-        sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + my_roc[i]/60.0/roc.hz
+    #...and calculate each with a weighted correction factor:
+    #   sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + my_roc[i]/60.0/roc.hz
+    # This is a first order recurrence, so it is applied as an infinite
+    # impulse response filter to the correction terms.
+    correction = tau*my_alt[:-1] + my_roc[1:]/60.0/roc.hz
+    # Masked data propagates to all later heights.
+    valid = len(correction)
+    if sm_ht[0] is np.ma.masked:
+        valid = 0
+    elif np.ma.is_masked(correction):
+        valid = np.flatnonzero(np.ma.getmaskarray(correction))[0]
+    if valid:
+        sm_ht[1:valid+1], _ = lfilter([1.0], [1.0, tau-1.0],
+                                      correction[:valid].data,
+                                      zi=[(1.0-tau)*sm_ht[0]])
+    sm_ht[valid+1:] = np.ma.masked
 
     
     '''
@@ -5733,7 +6258,7 @@ def touchdown_inertial(land, roc, alt):
     # using wheel switches.
     index = index_at_value(sm_ht, 0.0)
     if index:
-        roc_tdn = my_roc[index]
+        roc_tdn = my_roc[int(index)]
         return Value(index + startpoint, roc_tdn)
     else:
         return Value(None, None)
@@ -6324,6 +6849,80 @@ def vstack_params_where_state(*param_states):
     return np.ma.vstack(param_arrays)
 
 
+def _sliding_extreme(data, half_width, function, fill):
+    '''
+    Extreme of each window of data using the van Herk/Gil-Werman algorithm.
+    The data is padded by half_width at either end and split into blocks of
+    the window's width. The extreme of each window is the extreme of the
+    suffix of the block it starts within and the prefix of the block it
+    ends within.
+
+    :param data: Data to find the extremes of.
+    :type data: np.ndarray
+    :param half_width: Number of samples either side of each sample within its window.
+    :type half_width: int
+    :param function: np.maximum or np.minimum.
+    :type function: np.ufunc
+    :param fill: Value which does not affect the extreme, used for padding.
+    :type fill: float or int
+    :rtype: np.ndarray
+    '''
+    width = 2 * half_width + 1
+    length = len(data)
+    blocks = -(-(length + 2 * half_width) // width)
+    padded = np.empty(blocks * width, dtype=data.dtype)
+    padded.fill(fill)
+    padded[half_width:half_width + length] = data
+    padded = padded.reshape(blocks, width)
+    prefix = function.accumulate(padded, axis=1).ravel()
+    suffix = function.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return function(suffix[:length], prefix[width - 1:width - 1 + length])
+
+
+def sliding_min_max(array, half_width):
+    '''
+    Minimum and maximum of the window of samples centred on each sample in
+    O(n) time. Windows are truncated at the start and end of the array and
+    masked samples are ignored.
+
+    e.g. sliding_min_max([3, 1, 4, 1, 5], 1) -> [1, 1, 1, 1, 1], [3, 4, 4, 5, 5]
+
+    :param array: Array to find the minimums and maximums of.
+    :type array: np.ma.masked_array
+    :param half_width: Number of samples either side of each sample within its window.
+    :type half_width: int
+    :returns: Minimum and maximum of each window, masked where all samples within the window are masked.
+    :rtype: (np.ma.masked_array, np.ma.masked_array)
+    '''
+    array = np.ma.asarray(array)
+    half_width = int(half_width)
+    if array.dtype.kind == 'f':
+        lowest, highest = -np.inf, np.inf
+    elif array.dtype.kind in 'iu':
+        info = np.iinfo(array.dtype)
+        lowest, highest = info.min, info.max
+    else:
+        array = array.astype(float)
+        lowest, highest = -np.inf, np.inf
+    mask = np.ma.getmaskarray(array)
+    data = array.data
+    minimum = _sliding_extreme(np.where(mask, highest, data), half_width,
+                               np.minimum, highest)
+    maximum = _sliding_extreme(np.where(mask, lowest, data), half_width,
+                               np.maximum, lowest)
+    if mask.any():
+        # Mask windows without any valid samples.
+        valid = np.concatenate(([0], np.cumsum(~mask)))
+        indices = np.arange(len(array))
+        counts = valid[np.minimum(indices + half_width + 1, len(array))] - \
+            valid[np.maximum(indices - half_width, 0)]
+        empty = counts == 0
+    else:
+        empty = False
+    return (np.ma.array(minimum, mask=empty),
+            np.ma.array(maximum, mask=empty))
+
+
 def second_window(array, frequency, seconds):
     '''
     Only include values which are maintained for a number of seconds, shorter
@@ -6342,68 +6941,26 @@ def second_window(array, frequency, seconds):
         raise ValueError('Invalid seconds for frequency')
     
     frequency = int(frequency)  # only integer frequencies supported
-    samples = (seconds * frequency) + 1
-    # TODO: Fix for frequency..
-    arrays = [array]
-    for roll_value in range(int((samples / 2) + 1)):  # 0 roll?
-        positive_roll = np.roll(array, roll_value)
-        positive_roll[:roll_value] = np.ma.masked
-        negative_roll = np.roll(array, -roll_value)
-        negative_roll[-roll_value:] = np.ma.masked  # [-0:] will mask everything!
-        arrays.append(positive_roll)
-        arrays.append(negative_roll)
-    combined_array = np.ma.array(arrays)
-    min_array = np.ma.min(combined_array, axis=0)
-    max_array = np.ma.max(combined_array, axis=0)
+    samples = int(seconds * frequency) + 1
+    half_width = samples / 2
+    min_array, max_array = sliding_min_max(array, half_width)
+    # Windows containing NaN do not change the value.
+    lower = min_array.astype(float).filled(-np.inf)
+    upper = max_array.astype(float).filled(np.inf)
+    lower[np.isnan(lower)] = -np.inf
+    upper[np.isnan(upper)] = np.inf
     window_array = np_ma_masked_zeros_like(array)
-    unmasked_slices = np.ma.clump_unmasked(array)
-    for unmasked_slice in unmasked_slices:
-        last_value = array[unmasked_slice.start]
-        algo_slice = slice(unmasked_slice.start + (samples / 2),
+    for unmasked_slice in np.ma.clump_unmasked(np.ma.asarray(array)):
+        # Each value is the previous value limited to the range of the
+        # window ahead of it.
+        algo_slice = slice(unmasked_slice.start + half_width,
                            unmasked_slice.stop)
-        zipped_arrays = zip(array[algo_slice],
-                            min_array[algo_slice],
-                            max_array[algo_slice])
-        for index, (array_value,
-                    min_window,
-                    max_window) in enumerate(zipped_arrays,
-                                             start=unmasked_slice.start):
-            if array_value is np.ma.masked:
-                continue
-            if min_window < last_value < max_window:
-                # Mixed
-                window_array[index] = last_value
-            elif max_window > last_value:
-                # All greater than.
-                window_array[index] = last_value = min_window
-            elif min_window < last_value:
-                # All less than
-                window_array[index] = last_value = max_window
-            else:
-                window_array[index] = last_value
-        #try:
-            #first_index = np.ma.clump_unmasked(array)[0].start
-        #except IndexError:
-            ## array is entirely masked?
-            #return window_array
-        ##np.ma.array([array, max_array, min_array])
-        
-        #window_array[first_index] = last_value = array[first_index]
-        
-        #for index, (array_value,
-                    #min_window,
-                    #max_window) in enumerate(zip(array[first_index + 1:],
-                                                 #min_array[first_index + 1:],
-                                                 #max_array[first_index + 1:]),
-                                             #start=first_index):
-        ##stacked_array = np.ma.array([array, max_array, min_array])
-        ###for index, values in enumerate(tacked_array[], start=first_index):
-        ##for index in xrange(first_index, stacked_array.shape[1]):
-        ##values = stacked_array[...,index]
-        ##array_value, max_window, min_window = values.tolist()
-    ##from analysis_engine.plot_flight import plot_parameter
-    ##plot_parameter(window_array)
-    ##plot_parameter(array)
+        count = len(lower[algo_slice])
+        if not count:
+            continue
+        window_array[unmasked_slice.start:unmasked_slice.start + count] = \
+            _limit_scan(lower[algo_slice], upper[algo_slice],
+                        array[unmasked_slice.start])
     return np.ma.array(window_array)
 
 
@@ -6550,6 +7107,83 @@ def _press2alt_gradient(Pmb):
 def _press2alt_isothermal(Pmb):
     return 36089 - np.ma.log((Pmb/P0)/0.223361)*20806
 
+# Solar elevation limit in degrees below which it is night for each twilight
+# setting. Solar diameter gives an adjustment of 0.833 deg, as the rim of the
+# sun appears before the centre of the disk.
+TWILIGHT_LIMITS = {
+    None: -0.8333,
+    'civil': -6.0,
+    'nautical': -12.0,
+    'astronomical': -18.0,
+}
+
+
+def _twilight_limit(twilight):
+    '''
+    :raises ValueError: If twilight is not recognised.
+    :returns: Solar elevation limit in degrees.
+    :rtype: float
+    '''
+    try:
+        return TWILIGHT_LIMITS[twilight]
+    except KeyError:
+        raise ValueError('is_day called with unrecognised twilight zone')
+
+
+def _solar_elevation(jday, latitude, longitude):
+    '''
+    Elevation of the sun following Jean Meeus' Astronomical Algorithms. See
+    is_day.
+
+    :param jday: Julian Day.
+    :type jday: float or np.ndarray
+    :param latitude: Latitude in decimal degrees, north is positive.
+    :type latitude: float or np.ndarray
+    :param longitude: Longitude in decimal degrees, east is positive.
+    :type longitude: float or np.ndarray
+    :returns: Elevation of the sun in degrees.
+    :rtype: float or np.ndarray
+    '''
+    # Julian Century
+    Jcent    = (jday-2451545.0)/36525  # (24.1)
+    # Siderial time at Greenwich (11.4)
+    Gstime   = (280.46061837 + 360.98564736629*(jday-2451545.0) + (0.0003879331-Jcent/38710000) * Jcent * Jcent)%360.0
+    # Geom Mean Long Sun (deg)
+    Mlong    = (280.46645+Jcent*(36000.76983+Jcent*0.0003032))%360 # 24.2
+    # Geom Mean Anom Sun (deg)
+    Manom    = 357.52910+Jcent*(35999.05030-Jcent*(0.0001559+0.00000048*Jcent)) # 24.3
+    # Sun Eq of Ctr
+    Seqcent  = np.sin(np.radians(Manom))*(1.914600-Jcent*(0.004817+0.000014*Jcent))+np.sin(np.radians(2*Manom))*(0.019993-0.000101*Jcent)+np.sin(np.radians(3*Manom))*0.000290 # p152
+    # Sun True Long (deg)
+    Struelong= Mlong+Seqcent # Theta on p152
+    # Mean Obliq Ecliptic (deg)
+    Mobliq   = 23+(26+((21.448-Jcent*(46.815+Jcent*(0.00059-Jcent*0.001813))))/60)/60  # 21.2
+    # Obliq Corr (deg)
+    obliq    = Mobliq + 0.00256*np.cos(np.radians(125.04-1934.136*Jcent))  # 24.8
+    # Sun App Long (deg)
+    Sapplong = Struelong-0.00569-0.00478*np.sin(np.radians(125.04-1934.136*Jcent)) # Omega, Lambda p 152.
+    # Sun Declin (deg)
+    declination = np.degrees(np.arcsin(np.sin(np.radians(obliq))*np.sin(np.radians(Sapplong)))) # 24.7
+    # Sun Rt Ascen (deg)
+    rightasc = np.degrees(np.arctan2(np.cos(np.radians(Mobliq))*np.sin(np.radians(Sapplong)),np.cos(np.radians(Sapplong))))
+
+    return np.degrees(np.arcsin(np.sin(np.radians(latitude))*np.sin(np.radians(declination)) +
+                      np.cos(np.radians(latitude))*np.cos(np.radians(declination))*np.cos(np.radians(Gstime+longitude-rightasc))))
+
+
+def _julian_day(when):
+    '''
+    :param when: Date and time.
+    :type when: datetime
+    :returns: Julian Day to the nearest second.
+    :rtype: float
+    '''
+    day = when.toordinal() - (734124-40529)
+    t = when.time()
+    time = (t.hour + t.minute/60.0 + t.second/3600.0)/24.0
+    return day+2415019.5 + time
+
+
 def is_day(when, latitude, longitude, twilight='civil'):
     """
     This simple function takes the date, time and location of any point on
@@ -6591,57 +7225,37 @@ def is_day(when, latitude, longitude, twilight='civil'):
     """
     if latitude is np.ma.masked or longitude is np.ma.masked:
         return np.ma.masked
-    day = when.toordinal() - (734124-40529)
-    t = when.time()
-    time = (t.hour + t.minute/60.0 + t.second/3600.0)/24.0
-    # Julian Day
-    Jday     = day+2415019.5 + time
-    # Julian Century
-    Jcent    = (Jday-2451545.0)/36525  # (24.1)
-    # Siderial time at Greenwich (11.4)
-    Gstime   = (280.46061837 + 360.98564736629*(Jday-2451545.0) + (0.0003879331-Jcent/38710000) * Jcent * Jcent)%360.0
-    # Geom Mean Long Sun (deg)
-    Mlong    = (280.46645+Jcent*(36000.76983+Jcent*0.0003032))%360 # 24.2
-    # Geom Mean Anom Sun (deg)
-    Manom    = 357.52910+Jcent*(35999.05030-Jcent*(0.0001559+0.00000048*Jcent)) # 24.3
-    # Eccent Earth Orbit
-    ##### XXX: The following line is unused. Remove?
-    ####Eccent   = 0.016708617-Jcent*(0.000042037+0.0000001236*Jcent) # 24.4 (significantly changed from web version)
-    # Sun Eq of Ctr
-    Seqcent  = sin(radians(Manom))*(1.914600-Jcent*(0.004817+0.000014*Jcent))+sin(radians(2*Manom))*(0.019993-0.000101*Jcent)+sin(radians(3*Manom))*0.000290 # p152
-    # Sun True Long (deg)
-    Struelong= Mlong+Seqcent # Theta on p152
-    # Mean Obliq Ecliptic (deg)
-    Mobliq   = 23+(26+((21.448-Jcent*(46.815+Jcent*(0.00059-Jcent*0.001813))))/60)/60  # 21.2
-    # Obliq Corr (deg)
-    obliq    = Mobliq + 0.00256*cos(radians(125.04-1934.136*Jcent))  # 24.8
-    # Sun App Long (deg)
-    Sapplong = Struelong-0.00569-0.00478*sin(radians(125.04-1934.136*Jcent)) # Omega, Lambda p 152.
-    # Sun Declin (deg)
-    declination = degrees(asin(sin(radians(obliq))*sin(radians(Sapplong)))) # 24.7
-    # Sun Rt Ascen (deg)
-    rightasc = degrees(atan2(cos(radians(Mobliq))*sin(radians(Sapplong)),cos(radians(Sapplong))))
-
-    elevation = degrees(asin(sin(radians(latitude))*sin(radians(declination)) +
-                    cos(radians(latitude))*cos(radians(declination))*cos(radians(Gstime+longitude-rightasc))))
-
-    # Solar diamteter gives an adjustment of 0.833 deg, as the rim of the sun
-    # appears before the centre of the disk.
-    if twilight == None:
-        limit = -0.8333 # Allows for diameter of sun's disk
-    # For civil twilight, allow 6 deg
-    elif twilight == 'civil':
-        limit = -6.0
-    # For nautical twilight, allow 12 deg
-    elif twilight == 'nautical':
-            limit = -12.0
-    # For astronomical twilight, allow 18 deg
-    elif twilight == 'astronomical':
-            limit = -18.0
-    else:
-        raise ValueError('is_day called with unrecognised twilight zone')
+    limit = _twilight_limit(twilight)
+    elevation = _solar_elevation(_julian_day(when), latitude, longitude)
+    return bool(elevation > limit)
 
-    if elevation > limit:
-        return True # It is Day
-    else:
-        return False # It is Night
+
+def is_day_array(start_datetime, times, latitude, longitude,
+                 twilight='civil'):
+    '''
+    Array version of is_day which computes the position of the sun for all
+    samples at once.
+
+    :param start_datetime: Date and time of the start of the data.
+    :type start_datetime: datetime
+    :param times: Seconds since start_datetime of each sample.
+    :type times: np.ndarray
+    :param latitude: Latitude in decimal degrees of each sample, north is positive.
+    :type latitude: np.ma.masked_array
+    :param longitude: Longitude in decimal degrees of each sample, east is positive.
+    :type longitude: np.ma.masked_array
+    :param twilight: Twilight setting. See is_day.
+    :type twilight: None or str
+    :raises ValueError: If twilight is not recognised.
+    :returns: True for day and False for night, masked where latitude or longitude are masked.
+    :rtype: np.ma.masked_array of bool
+    '''
+    limit = _twilight_limit(twilight)
+    latitude = np.ma.asarray(latitude, dtype=float)
+    longitude = np.ma.asarray(longitude, dtype=float)
+    jday = (_julian_day(start_datetime) +
+            np.asarray(times, dtype=float) / 86400.0)
+    elevation = _solar_elevation(jday, latitude.data, longitude.data)
+    return np.ma.array(elevation > limit,
+                       mask=np.ma.getmaskarray(latitude) |
+                       np.ma.getmaskarray(longitude))
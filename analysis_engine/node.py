@@ -7,13 +7,17 @@ import numpy as np
 import cPickle
 import re
 import pprint
+import threading
+import time
 
 from abc import ABCMeta
-from collections import namedtuple, Iterable
+from collections import namedtuple, Iterable, OrderedDict
 from functools import total_ordering
 from itertools import product
 from operator import attrgetter
 
+from analysis_engine import settings
+from analysis_engine.intervals import Intervals
 from analysis_engine.library import (
     align,
     align_slices,
@@ -135,6 +139,29 @@ def get_param_kwarg_names(method):
     return defaults
 
 
+def get_can_operate_attribute_names(method):
+    """
+    Inspects a can_operate method's arguments and returns the names of the
+    Attributes defined as keyword argument defaults.
+
+    Raises TypeError if any keyword argument default is not an Attribute.
+
+    :param method: can_operate method to be inspected
+    :type method: method
+    :returns: Ordered list of Attribute names
+    :rtype: list of str
+    """
+    names = []
+    argspec = inspect.getargspec(method)
+    if argspec.defaults:
+        for default in argspec.defaults:
+            if not isinstance(default, Attribute):
+                raise TypeError('Only Attributes may be keyword '
+                                'arguments in can_operate methods.')
+            names.append(default.name)
+    return names
+
+
 #------------------------------------------------------------------------------
 # Abstract Node Classes
 # =====================
@@ -146,6 +173,61 @@ def _calculate_offset(frequency, offset):
     '''
     return offset % (1.0 / frequency)
 
+class NodeMeta(ABCMeta):
+    '''
+    Computes a Node class' dependency names and can_operate Attribute names
+    once when the class is defined rather than inspecting the derive and
+    can_operate methods every time they are required. The metadata of the
+    class and its subclasses is computed again if derive or can_operate are
+    reassigned or deleted, e.g. when mocked.
+
+    Where the metadata cannot be computed (e.g. abstract Nodes or invalid
+    derive methods) None is stored and the appropriate exception is raised
+    when the metadata is requested.
+    '''
+    def __init__(cls, name, bases, namespace):
+        super(NodeMeta, cls).__init__(name, bases, namespace)
+        cls._compute_metadata()
+
+    def __setattr__(cls, name, value):
+        super(NodeMeta, cls).__setattr__(name, value)
+        if name in ('derive', 'can_operate'):
+            cls._recompute_metadata()
+
+    def __delattr__(cls, name):
+        super(NodeMeta, cls).__delattr__(name)
+        if name in ('derive', 'can_operate'):
+            cls._recompute_metadata()
+
+    def _compute_metadata(cls):
+        try:
+            cls._dependency_names = tuple(
+                d.name or d.get_name()
+                for d in get_param_kwarg_names(cls.derive))
+        except (AttributeError, NotImplementedError, TypeError, ValueError):
+            cls._dependency_names = None
+        try:
+            cls._can_operate_attribute_names = tuple(
+                get_can_operate_attribute_names(cls.can_operate))
+        except TypeError:
+            cls._can_operate_attribute_names = None
+
+    def _recompute_metadata(cls):
+        '''
+        Subclasses may inherit the reassigned method, so their metadata is
+        computed again too.
+        '''
+        classes = [cls]
+        seen = set()
+        while classes:
+            node_cls = classes.pop()
+            if node_cls in seen:
+                continue
+            seen.add(node_cls)
+            node_cls._compute_metadata()
+            classes.extend(type.__subclasses__(node_cls))
+
+
 class Node(object):
     '''
     Note about aligning options
@@ -160,7 +242,7 @@ class Node(object):
     * The Node will inherit the first dependency's frequency/offset but
       self.frequency and self.offset can be overidden within the derive method.
     '''
-    __metaclass__ = ABCMeta
+    __metaclass__ = NodeMeta
     node_type_abbr = 'Node'
 
     name = ''  # Optional, default taken from ClassName
@@ -168,6 +250,12 @@ class Node(object):
     align_frequency = None  # Force frequency of Node by overriding
     align_offset = None  # Force offset of Node by overriding
     data_type = None  # Q: What should the default be? Q: Should this dictate the numpy dtype saved to the HDF file or should it be inferred from the array?
+    # AlignmentCache used to align dependencies within get_derived. Set
+    # while processing a flight.
+    _alignment_cache = None
+    # NodeProfile which time spent aligning dependencies is added to. Set
+    # while profiling.
+    _profile = None
 
     def __init__(self, name='', frequency=1, offset=0, **kwargs):
         """
@@ -241,6 +329,9 @@ class Node(object):
         :returns: A list of dependency names.
         :rtype: [str]
         """
+        if cls._dependency_names is not None:
+            # Computed by NodeMeta when the class was defined.
+            return list(cls._dependency_names)
         # TypeError:'ABCMeta' object is not iterable?
         # this probably means dependencies for this class isn't a list!
         params = get_param_kwarg_names(cls.derive)
@@ -248,6 +339,18 @@ class Node(object):
         # e.g. derive(a='String') instead of derive(a=P('String'))
         return [d.name or d.get_name() for d in params]
 
+    @classmethod
+    def get_can_operate_attribute_names(cls):
+        """
+        :returns: Names of the Attributes passed into can_operate.
+        :rtype: [str]
+        :raises TypeError: If can_operate has keyword arguments which are not Attributes.
+        """
+        if cls._can_operate_attribute_names is not None:
+            # Computed by NodeMeta when the class was defined.
+            return list(cls._can_operate_attribute_names)
+        return get_can_operate_attribute_names(cls.can_operate)
+
     @classmethod
     def can_operate(cls, available):
         """
@@ -295,6 +398,22 @@ def can_operate(cls, available):
         """
         raise NotImplementedError("Abstract Method")
 
+    def _align_dependency(self, dependency):
+        """
+        :param dependency: Dependency to align to self.
+        :type dependency: Node
+        :returns: dependency aligned to self, using the alignment cache if one is set.
+        :rtype: Node
+        """
+        start = time.time()
+        if self._alignment_cache is None:
+            aligned = dependency.get_aligned(self)
+        else:
+            aligned = self._alignment_cache.get_aligned(dependency, self)
+        if self._profile is not None:
+            self._profile.align_time += time.time() - start
+        return aligned
+
     def get_derived(self, args):
         """
         Accessor for derive method which first aligns all parameters to the
@@ -335,11 +454,11 @@ def can_operate(cls, available):
             for arg in args:
                 if arg in dependencies_to_align:
                     try:
-                        aligned_arg = arg.get_aligned(self)
+                        aligned_arg = self._align_dependency(arg)
                     except AttributeError:
                         # If parameter came from an HDF its missing get_aligned
                         arg = derived_param_from_hdf(arg)
-                        aligned_arg = arg.get_aligned(self)
+                        aligned_arg = self._align_dependency(arg)
                     aligned_args.append(aligned_arg)
                 else:
                     aligned_args.append(arg)
@@ -556,16 +675,25 @@ class DerivedParameterNode(Node):
         :returns: A copy of self aligned to the input parameter.
         :rtype: DerivedParameterNode
         '''
+        # Align the array for the temporary parameter:
+        return self.get_aligned_from_array(param, align(self, param))
+
+    def get_aligned_from_array(self, param, array):
+        '''
+        :param param: Node the array has been aligned to.
+        :type param: Node subclass
+        :param array: Array of self already aligned to param.
+        :type array: np.ma.masked_array
+        :returns: A copy of self with the aligned array.
+        :rtype: DerivedParameterNode
+        '''
         # Create temporary new aligned parameter of correct type:
         aligned_param = self.__class__(
             name=self.name,
             frequency=param.frequency,
             offset=param.offset,
         )
-
-        # Align the array for the temporary parameter:
-        a = align(self, param)
-        aligned_param.array = a
+        aligned_param.array = array
 
         # Ensure that we copy attributes required for multi-states:
         if hasattr(self, 'values_mapping'):
@@ -859,6 +987,123 @@ def derived_param_from_hdf(hdf_parameter):
         )
 
 
+class AlignmentCache(object):
+    '''
+    Memory bounded cache of parameter arrays aligned to other frequencies and
+    offsets. Used while processing a flight so that a parameter which many
+    nodes depend upon is only aligned once to each frequency and offset.
+
+    The least recently used arrays are evicted once the cache exceeds
+    max_bytes. Copies of cached arrays are returned as derive methods may
+    modify the arrays of their dependencies.
+
+    Parameters must be invalidated when they are rewritten.
+    '''
+    def __init__(self, max_bytes=None):
+        '''
+        :param max_bytes: Maximum size of cached arrays in bytes. Defaults to settings.ALIGNMENT_CACHE_SIZE.
+        :type max_bytes: int
+        '''
+        if max_bytes is None:
+            max_bytes = settings.ALIGNMENT_CACHE_SIZE
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._arrays = OrderedDict()
+        # Nodes may be derived in parallel threads.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    @staticmethod
+    def _array_nbytes(array):
+        return array.nbytes + np.ma.getmask(array).nbytes
+
+    def get_aligned(self, param, node):
+        '''
+        Align param to node, reusing a previously aligned array if available.
+
+        :param param: Parameter to align.
+        :type param: Node
+        :param node: Node to align param to.
+        :type node: Node
+        :returns: A copy of param aligned to node.
+        :rtype: Node
+        '''
+        if not isinstance(param, DerivedParameterNode) or \
+           (param.frequency == node.frequency and
+            param.offset == node.offset):
+            # Only parameter arrays which require alignment are cached.
+            return param.get_aligned(node)
+
+        key = (param.name, param.frequency, param.offset, node.frequency,
+               node.offset)
+        with self._lock:
+            array = self._arrays.pop(key, None)
+            if array is not None:
+                # Move to the end as the most recently used.
+                self._arrays[key] = array
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if array is not None:
+            return param.get_aligned_from_array(node, array.copy())
+
+        aligned = param.get_aligned(node)
+        array = aligned.array
+        nbytes = self._array_nbytes(array)
+        if nbytes > self.max_bytes:
+            return aligned
+
+        with self._lock:
+            if key not in self._arrays:
+                self._arrays[key] = array.copy()
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    evicted = self._arrays.popitem(last=False)[1]
+                    self.nbytes -= self._array_nbytes(evicted)
+                    self.evictions += 1
+        return aligned
+
+    def invalidate(self, name):
+        '''
+        Remove all aligned arrays of a parameter, e.g. after it has been
+        rewritten.
+
+        :param name: Name of the parameter.
+        :type name: str
+        '''
+        with self._lock:
+            for key in [k for k in self._arrays if k[0] == name]:
+                self.nbytes -= self._array_nbytes(self._arrays.pop(key))
+
+    def clear(self):
+        '''
+        Remove all aligned arrays.
+        '''
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        '''
+        :returns: Number of hits, misses and evictions along with the number of entries and bytes currently cached.
+        :rtype: dict
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._arrays),
+                'bytes': self.nbytes,
+            }
+
+
 class SectionNode(Node, list):
     '''
     Derives from list to implement iteration and list methods.
@@ -955,8 +1200,8 @@ class SectionNode(Node, list):
     slice_attrgetters = {'start': attrgetter('slice.start'),
                          'stop': attrgetter('slice.stop')}
 
-    def _get_condition(self, name=None, containing_index=None,
-                       within_slice=None, within_use='slice', param=None):
+    def _get_condition(self, name=None, within_slice=None,
+                       within_use='slice', param=None):
         '''
         Returns a condition function which checks if the element is within
         a slice or has a specified name if they are provided.
@@ -965,24 +1210,18 @@ class SectionNode(Node, list):
         :type within_slice: slice
         :param name: Only return elements with this name.
         :type name: str
-        :param containing_index: Get sections which contain index.
-        :type containing_index: int or float
         :param within_use: Which part of the slice to use when testing if it is within_slice. Either entire 'slice', the slice's 'start' or 'stop', or both combined - 'any'.
         :type within_use: str
-        :param param: Param which index and within_slice are sourced from. Used when parameters are not aligned.
+        :param param: Param which within_slice is sourced from. Used when parameters are not aligned.
         :type param: Node
         :returns: Either a condition function or None.
         :rtype: func or None
         '''
         # Function for testing if Section is within a slice depending on
         # within_use.
-        if param is not None:
-            if within_slice:
-                # FIXME: This does not account for different offsets.
-                within_slice = slice_multiply(within_slice, param.hz)
-            if containing_index is not None:
-                containing_index = \
-                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+        if param is not None and within_slice:
+            # FIXME: This does not account for different offsets.
+            within_slice = slice_multiply(within_slice, param.hz)
         if within_slice:
             within_func = lambda s, within: is_slice_within_slice(
                 s.slice, within, within_use=within_use)
@@ -991,25 +1230,38 @@ class SectionNode(Node, list):
 
         name_func = lambda e: (e.name == name) if name else True
 
-        index_func = \
-            lambda e: (is_index_within_slice(containing_index, e.slice)
-                       if containing_index is not None else True)
+        return lambda e: within_func(e, within_slice) and name_func(e)
 
-        return lambda e: (within_func(e, within_slice) and name_func(e) and
-                          index_func(e))
+    def get_intervals(self):
+        '''
+        :returns: Intervals of the section slices in the order of the sections.
+        :rtype: Intervals
+        '''
+        return Intervals([s.slice.start for s in self],
+                         [s.slice.stop for s in self])
 
-    def get(self, **kwargs):
+    def get(self, containing_index=None, **kwargs):
         '''
         Gets elements either within_slice or with name. Duplicated from
         FormattedNameNode. TODO: Share implementation with NameFormattedNode,
         slight differences between types make it difficult.
 
+        :param containing_index: Get sections which contain index.
+        :type containing_index: int or float
         :param kwargs: Passed into _get_condition (see docstring).
         :returns: An object of the same type as self containing matching elements.
         :rtype: Section
         '''
         condition = self._get_condition(**kwargs)
-        matching = [s for s in self if condition(s)]
+        sections = self
+        if containing_index is not None:
+            param = kwargs.get('param')
+            if param is not None:
+                containing_index = \
+                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+            contains = self.get_intervals().contains(containing_index)
+            sections = [s for s, c in zip(self, contains) if c]
+        matching = [s for s in sections if condition(s)]
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=matching)
 
@@ -1137,12 +1389,8 @@ class SectionNode(Node, list):
         :returns: List of surrounding sections
         :rtype: List of sections
         '''
-        surrounded = []
-        for section in self:
-            if section.slice.start <= index <= section.slice.stop or\
-               section.slice.start <= index and section.slice.stop is None or\
-               section.slice.start is None and index <= section.slice.stop:
-                surrounded.append(section)
+        surrounds = self.get_intervals().contains(index, inclusive=True)
+        surrounded = [s for s, c in zip(self, surrounds) if c]
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=surrounded)
 
@@ -2284,14 +2532,15 @@ class NodeManager(object):
             derived_node = self.derived_nodes[name]
             # NOTE: Raises "Unbound method" here due to can_operate being
             # overridden without wrapping with @classmethod decorator
-            attributes = []
-            argspec = inspect.getargspec(derived_node.can_operate)
-            if argspec.defaults:
-                for default in argspec.defaults:
-                    if not isinstance(default, Attribute):
-                        raise TypeError('Only Attributes may be keyword '
-                                        'arguments in can_operate methods.')
-                    attributes.append(self.get_attribute(default.name))
+            if isinstance(derived_node, NodeMeta):
+                # Computed by NodeMeta unless the node is not a Node class.
+                attribute_names = \
+                    derived_node.get_can_operate_attribute_names()
+            else:
+                attribute_names = get_can_operate_attribute_names(
+                    derived_node.can_operate)
+            attributes = [self.get_attribute(attribute_name) for
+                          attribute_name in attribute_names]
             # can_operate expects attributes.
             res = derived_node.can_operate(available, *attributes)
             if not res:
@@ -0,0 +1,194 @@
+import logging
+import numpy as np
+
+from collections import OrderedDict
+
+from analysis_engine import settings
+from analysis_engine.node import derived_param_from_hdf
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceCounter(object):
+    '''
+    Counts the nodes yet to be derived which depend upon each node so that
+    the results of a node can be released after its last consumer has been
+    derived.
+    '''
+    def __init__(self, dependencies):
+        '''
+        :param dependencies: Dependency names of each node which will be derived.
+        :type dependencies: {str: [str]}
+        '''
+        self._dependencies = dependencies
+        # Number of nodes yet to be derived which depend on each node.
+        self._counts = {}
+        for dependency_names in dependencies.itervalues():
+            for name in set(dependency_names):
+                self._counts[name] = self._counts.get(name, 0) + 1
+
+    def required(self, name):
+        '''
+        :param name: Name of a node.
+        :type name: str
+        :returns: Whether nodes yet to be derived depend upon the node.
+        :rtype: bool
+        '''
+        return name in self._counts
+
+    def derived(self, name):
+        '''
+        Record that a node has been derived.
+
+        :param name: Name of the derived node.
+        :type name: str
+        :returns: Names of nodes which are no longer required, including the derived node if nothing depends upon it.
+        :rtype: [str]
+        '''
+        released = [] if self.required(name) else [name]
+        for dependency_name in set(self._dependencies.get(name, [])):
+            if dependency_name not in self._counts:
+                continue
+            self._counts[dependency_name] -= 1
+            if not self._counts[dependency_name]:
+                del self._counts[dependency_name]
+                released.append(dependency_name)
+        return released
+
+
+class ParameterStore(object):
+    '''
+    Write-back store of derived parameters in front of an hdf_file.
+
+    Derived parameters are kept in memory while nodes which are yet to be
+    derived depend upon them, so that they are not written to and re-read
+    from the HDF file by each consumer. Writes are deferred and made in bulk
+    when the store is flushed, either at the end of processing or when the
+    arrays held in memory exceed max_bytes. Arrays are freed once they have
+    been written and the last consumer has been derived.
+
+    Other attributes and methods are delegated to the HDF file, e.g.
+    duration.
+    '''
+    def __init__(self, hdf, references, max_bytes=None):
+        '''
+        :param hdf: HDF file to read parameters from and write parameters to.
+        :type hdf: hdf_file
+        :param references: Counts the remaining consumers of each parameter.
+        :type references: ReferenceCounter
+        :param max_bytes: Maximum size of the arrays held in memory. Defaults to settings.PARAMETER_STORE_SIZE.
+        :type max_bytes: int
+        '''
+        if max_bytes is None:
+            max_bytes = settings.PARAMETER_STORE_SIZE
+        self.hdf = hdf
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.peak_bytes = 0
+        self.reads = 0
+        self.writes = 0
+        self._references = references
+        # Parameters held in memory in the order they were set.
+        self._params = OrderedDict()
+        # Names of parameters held in memory which are yet to be written.
+        self._unwritten = set()
+
+    def __getattr__(self, name):
+        return getattr(self.hdf, name)
+
+    def __getitem__(self, name):
+        return self.get_param(name)
+
+    def __contains__(self, name):
+        return name in self._params or name in self.hdf
+
+    @staticmethod
+    def _array_nbytes(param):
+        array = param.array
+        return array.nbytes + np.ma.getmask(array).nbytes
+
+    def get_param(self, name, valid_only=False):
+        '''
+        Get a parameter from memory or otherwise from the HDF file. A copy of
+        the array is returned as derive methods may modify the arrays of
+        their dependencies.
+
+        :param name: Name of the parameter.
+        :type name: str
+        :param valid_only: Raise KeyError if the parameter is invalid.
+        :type valid_only: bool
+        :raises KeyError: If the parameter is not available.
+        :returns: The parameter.
+        :rtype: DerivedParameterNode or Parameter
+        '''
+        param = self._params.get(name)
+        if param is None:
+            return self.hdf.get_param(name, valid_only=valid_only)
+        if valid_only and getattr(param, 'invalid', False):
+            raise KeyError(name)
+        self.reads += 1
+        param = derived_param_from_hdf(param)
+        param.array = param.array.copy()
+        return param
+
+    def set_param(self, param):
+        '''
+        Store a parameter in memory. It will be written to the HDF file when
+        the store is flushed.
+
+        :param param: Parameter to store.
+        :type param: DerivedParameterNode
+        '''
+        self._discard(param.name)
+        self._params[param.name] = param
+        self._unwritten.add(param.name)
+        self.nbytes += self._array_nbytes(param)
+        self.peak_bytes = max(self.peak_bytes, self.nbytes)
+        if self.nbytes > self.max_bytes:
+            logger.debug("Parameter store exceeded %d bytes; flushing.",
+                         self.max_bytes)
+            self.flush(keep_required=True)
+            if self.nbytes > self.max_bytes:
+                # Required parameters will be read from the HDF file.
+                self.flush()
+
+    def valid_param_names(self):
+        '''
+        :returns: Names of valid parameters within the HDF file and memory.
+        :rtype: [str]
+        '''
+        names = self.hdf.valid_param_names()
+        return names + [n for n in self._unwritten if n not in names]
+
+    def release(self, name):
+        '''
+        Release a parameter which is no longer required. Its array is freed
+        once it has been written.
+
+        :param name: Name of the parameter.
+        :type name: str
+        '''
+        if name not in self._unwritten:
+            self._discard(name)
+
+    def _discard(self, name):
+        param = self._params.pop(name, None)
+        if param is not None:
+            self.nbytes -= self._array_nbytes(param)
+            self._unwritten.discard(name)
+
+    def flush(self, keep_required=False):
+        '''
+        Write all unwritten parameters to the HDF file and free their arrays.
+
+        :param keep_required: Keep the arrays of parameters which nodes yet to be derived depend upon in memory.
+        :type keep_required: bool
+        '''
+        for name, param in self._params.items():
+            if name in self._unwritten:
+                self.hdf.set_param(param)
+                self.writes += 1
+            if not keep_required or not self._references.required(name):
+                self._discard(name)
+        self._unwritten.clear()
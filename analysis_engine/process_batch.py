@@ -0,0 +1,212 @@
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import simplejson as json
+import sys
+import traceback
+
+from analysis_engine import settings
+from analysis_engine.api_handler import get_api_handler
+from analysis_engine.process_flight import process_flight
+from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+
+
+logger = logging.getLogger(__name__)
+
+# State preloaded once within each worker process by _init_worker.
+_derived_nodes = None
+_api_handler = None
+
+
+def expand_hdf_paths(hdf_paths):
+    '''
+    Expand glob patterns and directories into a sorted list of HDF file
+    paths. Duplicate paths are removed.
+
+    :param hdf_paths: File paths, directories or glob patterns.
+    :type hdf_paths: [str]
+    :returns: Expanded file paths.
+    :rtype: [str]
+    '''
+    expanded = set()
+    for hdf_path in hdf_paths:
+        if os.path.isdir(hdf_path):
+            expanded.update(glob.glob(os.path.join(hdf_path, '*.hdf5')))
+        else:
+            matches = glob.glob(hdf_path)
+            if not matches:
+                logger.warning("No HDF files found matching '%s'.", hdf_path)
+            expanded.update(matches)
+    return sorted(expanded)
+
+
+def _init_worker(additional_modules):
+    '''
+    Preload node classes and the API handler within a worker process so
+    that they are reused for every flight processed by the worker.
+
+    :param additional_modules: List of module paths to import.
+    :type additional_modules: [str]
+    '''
+    global _derived_nodes, _api_handler
+    _derived_nodes = get_derived_nodes(additional_modules +
+                                       settings.NODE_MODULES)
+    _api_handler = get_api_handler(settings.API_HANDLER)
+
+
+def _process_segment(args):
+    '''
+    Process a single HDF file within a worker process.
+
+    Exceptions are caught and returned as a formatted traceback as not all
+    exceptions raised while processing can be pickled.
+
+    :param args: hdf_path, tail_number and kwargs for process_flight.
+    :type args: tuple
+    :returns: hdf_path, process_flight results (None if processing failed) and formatted traceback (None if processing succeeded).
+    :rtype: (str, dict or None, str or None)
+    '''
+    hdf_path, tail_number, kwargs = args
+    try:
+        aircraft_info = kwargs.pop('aircraft_info', None) or \
+            get_aircraft_info(tail_number, api_handler=_api_handler)
+        res = process_flight(hdf_path, tail_number,
+                             aircraft_info=aircraft_info,
+                             derived_nodes=_derived_nodes, **kwargs)
+    except Exception:
+        logger.exception("Failed to process '%s'.", hdf_path)
+        return hdf_path, None, traceback.format_exc()
+    return hdf_path, res, None
+
+
+def _tail_number_tasks(hdf_paths, tail_numbers, kwargs):
+    '''
+    :param hdf_paths: Expanded HDF file paths.
+    :type hdf_paths: [str]
+    :param tail_numbers: Aircraft tail number of all flights, or a mapping of HDF file paths to the tail number of each flight.
+    :type tail_numbers: str or dict
+    :param kwargs: Keyword arguments passed into process_flight.
+    :type kwargs: dict
+    :returns: hdf_path, tail_number and kwargs for _process_segment for each HDF file.
+    :rtype: [(str, str, dict)]
+    :raises ValueError: If the tail number of an HDF file is not within the mapping.
+    '''
+    if not isinstance(tail_numbers, dict):
+        return [(hdf_path, tail_numbers, dict(kwargs))
+                for hdf_path in hdf_paths]
+    # Paths are compared as absolute paths as the mapping may have been
+    # written relative to a different form of the path.
+    tail_numbers = dict((os.path.abspath(hdf_path), tail_number)
+                        for hdf_path, tail_number in tail_numbers.items())
+    missing = [hdf_path for hdf_path in hdf_paths
+               if os.path.abspath(hdf_path) not in tail_numbers]
+    if missing:
+        raise ValueError("No tail number for HDF files: %s" %
+                         ', '.join(missing))
+    return [(hdf_path, tail_numbers[os.path.abspath(hdf_path)],
+             dict(kwargs)) for hdf_path in hdf_paths]
+
+
+def process_flights(hdf_paths, tail_numbers, processes=None,
+                    additional_modules=None, **kwargs):
+    '''
+    Process many HDF files across a pool of worker processes, yielding the
+    results of each flight as it finishes.
+
+    Each worker process imports the node modules and loads the API handler
+    once when it starts rather than once per flight. Where worker processes
+    are forked, the API handler loaded by this process is shared with them.
+
+    :param hdf_paths: File paths, directories or glob patterns of HDF files.
+    :type hdf_paths: [str]
+    :param tail_numbers: Aircraft tail number of all flights, or a mapping of HDF file paths to the tail number of each flight for a mixed fleet.
+    :type tail_numbers: str or dict
+    :param processes: Number of worker processes. Defaults to the number of CPUs.
+    :type processes: int
+    :param additional_modules: List of module paths to import.
+    :type additional_modules: [str] or None
+    :param kwargs: Keyword arguments passed into process_flight, e.g. aircraft_info, requested or required.
+    :type kwargs: dict
+    :returns: Generator of hdf_path, process_flight results (None if processing failed) and formatted traceback (None if processing succeeded) in the order the flights finish processing.
+    :rtype: generator
+    :raises ValueError: If tail_numbers is a mapping without the tail number of an HDF file.
+    '''
+    hdf_paths = expand_hdf_paths(hdf_paths)
+    additional_modules = additional_modules or []
+    kwargs['additional_modules'] = additional_modules
+    tasks = _tail_number_tasks(hdf_paths, tail_numbers, kwargs)
+    # Load the API handler before the worker processes are forked so that
+    # they share the loaded data, e.g. the local handler's memory-mapped
+    # snapshot, rather than each loading it again.
+    get_api_handler(settings.API_HANDLER)
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=(additional_modules,))
+    try:
+        for hdf_path, res, error in pool.imap_unordered(_process_segment,
+                                                        tasks):
+            yield hdf_path, res, error
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def main():
+    print 'FlightDataBatchAnalyzer (c) Copyright 2013 Flight Data Services, Ltd.'
+    print '  - Powered by POLARIS'
+    print '  - http://www.flightdatacommunity.com'
+    print ''
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(stream=sys.stdout))
+    parser = argparse.ArgumentParser(
+        description="Process many flights across a pool of processes.")
+    parser.add_argument('files', type=str, nargs='+',
+                        help='Paths, directories or glob patterns of HDF '
+                        'files to process.')
+    parser.add_argument('-tail', dest='tail_number',
+                        default='G-FDSL', # as per flightdatacommunity file
+                        help='Aircraft tail number of all flights.')
+    parser.add_argument('--tail-numbers', type=str, dest='tail_numbers',
+                        default=None, help='Path of a JSON file mapping '
+                        'each HDF file path to its aircraft tail number, for '
+                        'processing a mixed fleet. Overrides -tail.')
+    parser.add_argument('-p', '--processes', type=int, dest='processes',
+                        default=None, help='Number of worker processes. '
+                        'Defaults to the number of CPUs.')
+    parser.add_argument('-r', '--requested', type=str, nargs='+',
+                        dest='requested', default=[],
+                        help='Requested nodes.')
+    parser.add_argument('--required', type=str, nargs='+', dest='required',
+                        default=[], help='Required nodes.')
+    args = parser.parse_args()
+
+    if args.tail_numbers:
+        with open(args.tail_numbers) as tail_numbers_file:
+            tail_numbers = json.load(tail_numbers_file)
+    else:
+        tail_numbers = args.tail_number
+
+    failed = []
+    processed = 0
+    for hdf_path, res, error in process_flights(
+            args.files, tail_numbers, processes=args.processes,
+            requested=args.requested, required=args.required):
+        if error:
+            failed.append(hdf_path)
+            logger.error("Failed '%s':\n%s", hdf_path, error)
+            continue
+        processed += 1
+        logger.info("Processed '%s': %d KPVs, %d KTIs, %d phases.", hdf_path,
+                    len(res['kpv']), len(res['kti']), len(res['phases']))
+    logger.info("Processed %d flights, %d failed.", processed, len(failed))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,15 @@
 import argparse
+import heapq
 import logging
 import numpy as np
 import os
 import sys
+import time
 
+from collections import defaultdict
 from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
 from networkx.readwrite import json_graph
 
 from flightdatautilities.filesystem_tools import copy_file
@@ -14,14 +19,17 @@ from hdfaccess.file import hdf_file
 from analysis_engine import hooks, settings, __version__
 from analysis_engine.dependency_graph import dependency_order
 from analysis_engine.library import np_ma_masked_zeros_like, repair_mask
-from analysis_engine.node import (ApproachNode, Attribute,
+from analysis_engine.node import (AlignmentCache, ApproachNode, Attribute,
                                   derived_param_from_hdf,
                                   DerivedParameterNode,
                                   FlightAttributeNode,
                                   KeyPointValueNode,
                                   KeyTimeInstanceNode,
                                   NodeManager, P, Section, SectionNode)
-from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+from analysis_engine.parameter_store import ParameterStore, ReferenceCounter
+from analysis_engine.profiler import NodeProfiler
+from analysis_engine.utils import (get_aircraft_info, get_derived_nodes,
+                                   PeakMemory)
 
 
 logger = logging.getLogger(__name__)
@@ -61,26 +69,415 @@ def _timestamp(start_datetime, item_list):
     return item_list
 
 
-def derive_parameters(hdf, node_mgr, process_order):
+class DerivedResults(object):
+    '''
+    Collections of results accumulated while deriving the nodes of a flight.
+    '''
+    def __init__(self):
+        self.approach_list = ApproachNode(restrict_names=False)
+        # duplicate storage, but maintaining types
+        self.kpv_list = KeyPointValueNode(restrict_names=False)
+        self.kti_list = KeyTimeInstanceNode(restrict_names=False)
+        # 'Node Name' : node()  pass in node.get_accessor()
+        self.section_list = SectionNode()
+        self.flight_attrs = []
+
+    def extend(self, other):
+        '''
+        Append the results of other onto the end of these results.
+
+        :type other: DerivedResults
+        '''
+        self.approach_list.extend(other.approach_list)
+        self.kpv_list.extend(other.kpv_list)
+        self.kti_list.extend(other.kti_list)
+        self.section_list.extend(other.section_list)
+        self.flight_attrs.extend(other.flight_attrs)
+
+    def as_tuple(self):
+        '''
+        :returns: Results in the order returned by derive_parameters.
+        :rtype: tuple
+        '''
+        return (self.kti_list, self.kpv_list, self.section_list,
+                self.approach_list, self.flight_attrs)
+
+
+def get_dependencies(node_class, hdf, node_mgr, params, profiler=None):
+    '''
+    Build the ordered list of dependencies to pass into the node's derive
+    method. Unavailable dependencies are None.
+
+    :param node_class: Node class to source dependencies for.
+    :type node_class: class
+    :param hdf: Data file accessor used to get parameter data.
+    :type hdf: hdf_file
+    :param node_mgr: Used to look up attributes and available parameters.
+    :type node_mgr: NodeManager
+    :param params: Already derived params that aren't masked arrays.
+    :type params: dict
+    :param profiler: Records the time taken to read the dependencies.
+    :type profiler: NodeProfiler or None
+    :raises RuntimeError: If no dependencies are available.
+    :returns: Dependencies in the order of the derive method's arguments.
+    :rtype: list
+    '''
+    start = time.time()
+    deps = []
+    node_deps = node_class.get_dependency_names()
+    for dep_name in node_deps:
+        if dep_name in params:  # already calculated KPV/KTI/Phase
+            deps.append(params[dep_name])
+        elif node_mgr.get_attribute(dep_name) is not None:
+            deps.append(node_mgr.get_attribute(dep_name))
+        elif dep_name in node_mgr.hdf_keys:
+            # LFL/Derived parameter
+            # all parameters (LFL or other) need get_aligned which is
+            # available on DerivedParameterNode
+            try:
+                dp = derived_param_from_hdf(hdf.get_param(dep_name,
+                                                          valid_only=True))
+            except KeyError:
+                # Parameter is invalid.
+                dp = None
+            deps.append(dp)
+        else:  # dependency not available
+            deps.append(None)
+    if all([d is None for d in deps]):
+        raise RuntimeError("No dependencies available - Nodes cannot "
+                           "operate without ANY dependencies available! "
+                           "Node: %s" % node_class.__name__)
+    if profiler is not None:
+        profiler.record_read(node_class.get_name(), node_class.node_type_abbr,
+                             deps, time.time() - start)
+    return deps
+
+
+def derive_node(node_class, deps, hdf, node_mgr, params,
+                alignment_cache=None, profiler=None):
+    '''
+    Initialise a node and derive it from its dependencies.
+
+    :param node_class: Node class to derive.
+    :type node_class: class
+    :param deps: Dependencies as returned by get_dependencies.
+    :type deps: list
+    :param alignment_cache: Cache used to align the dependencies.
+    :type alignment_cache: AlignmentCache or None
+    :param profiler: Records the time and memory used to derive the node.
+    :type profiler: NodeProfiler or None
+    :returns: The derived node.
+    :rtype: Node
+    '''
+    # initialise node
+    node = node_class()
+    # shhh, secret accessors for developing nodes in debug mode
+    node._p = params
+    node._h = hdf
+    node._n = node_mgr
+    node._alignment_cache = alignment_cache
+    logger.info("Processing parameter %s", node.get_name())
+    # Derive the resulting value
+
+    if profiler is None:
+        result = node.get_derived(deps)
+    else:
+        name = node.get_name()
+        node._profile = profiler.get(name, node.node_type_abbr)
+        result = profiler.derive(name, node.node_type_abbr, node.get_derived,
+                                 deps)
+        del node._profile
+    del node._p
+    del node._h
+    del node._n
+    del node._alignment_cache
+    return result
+
+
+def store_result(param_name, result, hdf, node_mgr, params, results,
+                 alignment_cache=None, profiler=None):
+    '''
+    Validate a derived node, store it for use by later nodes and collect its
+    items into results.
+
+    :param param_name: Name of the derived node.
+    :type param_name: str
+    :param result: The derived node.
+    :type result: Node
+    :param hdf: Data file accessor used to save parameter data.
+    :type hdf: hdf_file
+    :param node_mgr: Node manager whose hdf_keys are kept up to date.
+    :type node_mgr: NodeManager
+    :param params: Derived params that aren't masked arrays.
+    :type params: dict
+    :param results: Collections to append KPVs, KTIs, etc. to.
+    :type results: DerivedResults
+    :param alignment_cache: Cache of aligned arrays to invalidate when a parameter is saved.
+    :type alignment_cache: AlignmentCache or None
+    :param profiler: Records the time taken to store the result.
+    :type profiler: NodeProfiler or None
+    '''
+    write_start = time.time()
+    duration = hdf.duration
+
+    if result.node_type is KeyPointValueNode:
+        #Q: track node instead of result here??
+        params[param_name] = result
+        for one_hz in result.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KPV '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            results.kpv_list.append(one_hz)
+    elif result.node_type is KeyTimeInstanceNode:
+        params[param_name] = result
+        for one_hz in result.get_aligned(P(frequency=1, offset=0)):
+            if not (0 <= one_hz.index <= duration+4):
+                raise IndexError(
+                    "KTI '%s' index %.2f is not between 0 and %d" %
+                    (one_hz.name, one_hz.index, duration))
+            results.kti_list.append(one_hz)
+    elif result.node_type is FlightAttributeNode:
+        params[param_name] = result
+        try:
+            # only has one Attribute result
+            results.flight_attrs.append(Attribute(result.name, result.value))
+        except:
+            logger.warning("Flight Attribute Node '%s' returned empty "
+                           "handed.", param_name)
+    elif issubclass(result.node_type, SectionNode):
+        aligned_section = result.get_aligned(P(frequency=1, offset=0))
+        for index, one_hz in enumerate(aligned_section):
+            # SectionNodes allow slice starts and stops being None which
+            # signifies the beginning and end of the data. To avoid TypeErrors
+            # in subsequent derive methods which perform arithmetic on section
+            # slice start and stops, replace with 0 or hdf.duration.
+            fallback = lambda x, y: x if x is not None else y
+
+            duration = fallback(duration, 0)
+
+            start = fallback(one_hz.slice.start, 0)
+            stop = fallback(one_hz.slice.stop, duration)
+            start_edge = fallback(one_hz.start_edge, 0)
+            stop_edge = fallback(one_hz.stop_edge, duration)
+
+            slice_ = slice(start, stop)
+            one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
+            aligned_section[index] = one_hz
+
+            if not (0 <= start <= duration and 0 <= stop <= duration + 4):
+                msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, start, stop, duration))
+            if not 0 <= start_edge <= duration:
+                msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, start_edge, duration))
+            if not 0 <= stop_edge <= duration + 4:
+                msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, stop_edge, duration))
+            results.section_list.append(one_hz)
+        params[param_name] = aligned_section
+    elif issubclass(result.node_type, DerivedParameterNode):
+        if duration:
+            # check that the right number of results were returned
+            # Allow a small tolerance. For example if duration in seconds
+            # is 2822, then there will be an array length of  1411 at 0.5Hz and 706
+            # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
+            # parameters then we will have an array length of 1412.
+            expected_length = duration * result.frequency
+            if result.array is None:
+                logger.warning("No array set; creating a fully masked "
+                               "array for %s", param_name)
+                array_length = expected_length
+                # Where a parameter is wholly masked, we fill the HDF
+                # file with masked zeros to maintain structure.
+                result.array = \
+                    np_ma_masked_zeros_like(np.ma.arange(expected_length))
+            else:
+                array_length = len(result.array)
+            length_diff = array_length - expected_length
+            if length_diff == 0:
+                pass
+            elif 0 < length_diff < 5:
+                logger.warning("Cutting excess data for parameter '%s'. "
+                               "Expected length was '%s' while resulting "
+                               "array length was '%s'.", param_name,
+                               expected_length, len(result.array))
+                result.array = result.array[:expected_length]
+            else:
+                raise ValueError("Array length mismatch for parameter "
+                                 "'%s'. Expected '%s', resulting array "
+                                 "length '%s'." % (param_name,
+                                                   expected_length,
+                                                   array_length))
+
+        hdf.set_param(result)
+        if alignment_cache is not None:
+            # Previously aligned arrays of the parameter are out of date.
+            alignment_cache.invalidate(param_name)
+        # Keep hdf_keys up to date.
+        node_mgr.hdf_keys.append(param_name)
+    elif issubclass(result.node_type, ApproachNode):
+        aligned_approach = result.get_aligned(P(frequency=1, offset=0))
+        for approach in aligned_approach:
+            # Does not allow slice start or stops to be None.
+            valid_turnoff = (not approach.turnoff or
+                             (0 <= approach.turnoff <= duration))
+            valid_slice = ((0 <= approach.slice.start <= duration) and
+                           (0 <= approach.slice.stop <= duration))
+            valid_gs_est = (not approach.gs_est or
+                            ((0 <= approach.gs_est.start <= duration) and
+                             (0 <= approach.gs_est.stop <= duration)))
+            valid_loc_est = (not approach.loc_est or
+                             ((0 <= approach.loc_est.start <= duration) and
+                              (0 <= approach.loc_est.stop <= duration)))
+            if not all([valid_turnoff, valid_slice, valid_gs_est,
+                        valid_loc_est]):
+                raise ValueError('ApproachItem contains index outside of '
+                                 'flight data: %s' % approach)
+            results.approach_list.append(approach)
+        params[param_name] = aligned_approach
+    else:
+        raise NotImplementedError("Unknown Type %s" % result.__class__)
+
+    if profiler is not None:
+        profiler.record_write(param_name, time.time() - write_start)
+
+
+def _derive_task(node_class, deps, hdf, node_mgr, params, alignment_cache,
+                 profiler):
+    '''
+    Worker wrapper around derive_node which captures exceptions so that they
+    can be re-raised within the scheduling thread.
+
+    :returns: The derived node and exc_info (if an exception was raised).
+    :rtype: (Node or None, tuple or None)
+    '''
+    try:
+        return derive_node(node_class, deps, hdf, node_mgr, params,
+                           alignment_cache, profiler), None
+    except Exception:
+        return None, sys.exc_info()
+
+
+def _derive_parameters_parallel(hdf, node_mgr, derive_order, gr_st, workers,
+                                params, results, alignment_cache, profiler,
+                                node_stored):
+    '''
+    Derives nodes using a pool of worker threads. A node is submitted to the
+    pool as soon as all of its dependencies within the spanning tree have
+    been derived.
+
+    Dependencies are gathered and results are stored (written to the HDF
+    file) within the calling thread; only the node's derive method runs in
+    the worker threads. Results are collected in derive_order so that the
+    output is identical to processing the nodes one at a time.
+
+    :param derive_order: Names of the nodes to derive in process order.
+    :type derive_order: [str]
+    :param gr_st: Spanning tree graph of active nodes with edges from each node to its dependencies.
+    :type gr_st: nx.DiGraph
+    :param workers: Number of worker threads.
+    :type workers: int
+    :param node_stored: Called with the name of each node after its result has been stored.
+    :type node_stored: callable
+    '''
+    order_index = dict((name, index) for index, name
+                       in enumerate(derive_order))
+    # Dependencies of each node which are yet to be derived.
+    waiting = {}
+    # Nodes which depend on each node.
+    dependents = defaultdict(list)
+    ready = []
+    for name in derive_order:
+        deps = set(gr_st.successors(name)).intersection(order_index)
+        waiting[name] = deps
+        for dep in deps:
+            dependents[dep].append(name)
+        if not deps:
+            heapq.heappush(ready, order_index[name])
+
+    node_results = {}
+    next_index = 0
+    running = 0
+    finished = Queue()
+    pool = ThreadPool(workers)
+    try:
+        while ready or running:
+            # Submit ready nodes in process order.
+            while ready and running < workers:
+                name = derive_order[heapq.heappop(ready)]
+                node_class = node_mgr.derived_nodes[name]
+                deps = get_dependencies(node_class, hdf, node_mgr, params,
+                                        profiler)
+                pool.apply_async(
+                    _derive_task,
+                    (node_class, deps, hdf, node_mgr, params, alignment_cache,
+                     profiler),
+                    callback=lambda res, name=name: finished.put((name, res)))
+                running += 1
+
+            name, (result, exc_info) = finished.get()
+            running -= 1
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+            node_results[name] = DerivedResults()
+            store_result(name, result, hdf, node_mgr, params,
+                         node_results[name], alignment_cache, profiler)
+            del result
+            node_stored(name)
+
+            for dependent in dependents.pop(name, []):
+                waiting[dependent].discard(name)
+                if not waiting[dependent]:
+                    heapq.heappush(ready, order_index[dependent])
+
+            # Collect results in process order to maintain output ordering.
+            while (next_index < len(derive_order) and
+                   derive_order[next_index] in node_results):
+                results.extend(node_results.pop(derive_order[next_index]))
+                next_index += 1
+    finally:
+        pool.close()
+        pool.join()
+
+
+def derive_parameters(hdf, node_mgr, process_order, gr_st=None, workers=1,
+                      alignment_cache=None, profiler=None):
     '''
     Derives parameters in process_order. Dependencies are sourced via the
     node_mgr.
 
+    If more than one worker is requested, independent nodes are derived in
+    parallel using the spanning tree graph (gr_st) to determine when each
+    node's dependencies are available. The results are the same as
+    processing the nodes in process_order.
+
+    Unless settings.PARAMETER_STORE_SIZE is 0, derived parameters are held in
+    memory by a ParameterStore while nodes depend upon them and are written
+    to the HDF file in bulk before returning.
+
     :param hdf: Data file accessor used to get and save parameter data and attributes
     :type hdf: hdf_file
     :param node_mgr: Used to determine the type of node in the process_order
     :type node_mgr: NodeManager
     :param process_order: Parameter / Node class names in the required order to be processed
     :type process_order: list of strings
+    :param gr_st: Spanning tree graph as returned by dependency_order. Required when workers is greater than 1.
+    :type gr_st: nx.DiGraph
+    :param workers: Number of worker threads used to derive nodes.
+    :type workers: int
+    :param alignment_cache: Cache of aligned dependency arrays. Defaults to a new cache limited to settings.ALIGNMENT_CACHE_SIZE bytes; pass a cache to inspect its statistics afterwards.
+    :type alignment_cache: AlignmentCache or None
+    :param profiler: Records the time and memory used by each node when profiling.
+    :type profiler: NodeProfiler or None
     '''
+    if alignment_cache is None and settings.ALIGNMENT_CACHE_SIZE:
+        alignment_cache = AlignmentCache(settings.ALIGNMENT_CACHE_SIZE)
     params = {} # store all derived params that aren't masked arrays
-    approach_list = ApproachNode(restrict_names=False)
-    kpv_list = KeyPointValueNode(restrict_names=False) # duplicate storage, but maintaining types
-    kti_list = KeyTimeInstanceNode(restrict_names=False)
-    section_list = SectionNode()  # 'Node Name' : node()  pass in node.get_accessor()
-    flight_attrs = []
-    duration = hdf.duration
+    results = DerivedResults()
 
+    derive_order = []
     for param_name in process_order:
         if param_name in node_mgr.hdf_keys:
             continue
@@ -90,164 +487,68 @@ def derive_parameters(hdf, node_mgr, process_order):
             ###params[param_name] = node_mgr.get_attribute(param_name) #TODO: optimise with only one call to get_attribute
             continue
 
-        node_class = node_mgr.derived_nodes[param_name]  #NB raises KeyError if Node is "unknown"
-
-        # build ordered dependencies
-        deps = []
-        node_deps = node_class.get_dependency_names()
-        for dep_name in node_deps:
-            if dep_name in params:  # already calculated KPV/KTI/Phase
-                deps.append(params[dep_name])
-            elif node_mgr.get_attribute(dep_name) is not None:
-                deps.append(node_mgr.get_attribute(dep_name))
-            elif dep_name in node_mgr.hdf_keys:
-                # LFL/Derived parameter
-                # all parameters (LFL or other) need get_aligned which is
-                # available on DerivedParameterNode
-                try:
-                    dp = derived_param_from_hdf(hdf.get_param(dep_name,
-                                                              valid_only=True))
-                except KeyError:
-                    # Parameter is invalid.
-                    dp = None
-                deps.append(dp)
-            else:  # dependency not available
-                deps.append(None)
-        if all([d is None for d in deps]):
-            raise RuntimeError("No dependencies available - Nodes cannot "
-                               "operate without ANY dependencies available! "
-                               "Node: %s" % node_class.__name__)
-
-        # initialise node
-        node = node_class()
-        # shhh, secret accessors for developing nodes in debug mode
-        node._p = params
-        node._h = hdf
-        node._n = node_mgr
-        logger.info("Processing parameter %s", param_name)
-        # Derive the resulting value
-
-        result = node.get_derived(deps)
-        del node._p
-        del node._h
-        del node._n
-
-        if node.node_type is KeyPointValueNode:
-            #Q: track node instead of result here??
-            params[param_name] = result
-            for one_hz in result.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KPV '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                kpv_list.append(one_hz)
-        elif node.node_type is KeyTimeInstanceNode:
-            params[param_name] = result
-            for one_hz in result.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KTI '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                kti_list.append(one_hz)
-        elif node.node_type is FlightAttributeNode:
-            params[param_name] = result
-            try:
-                flight_attrs.append(Attribute(result.name, result.value)) # only has one Attribute result
-            except:
-                logger.warning("Flight Attribute Node '%s' returned empty "
-                               "handed.", param_name)
-        elif issubclass(node.node_type, SectionNode):
-            aligned_section = result.get_aligned(P(frequency=1, offset=0))
-            for index, one_hz in enumerate(aligned_section):
-                # SectionNodes allow slice starts and stops being None which
-                # signifies the beginning and end of the data. To avoid TypeErrors
-                # in subsequent derive methods which perform arithmetic on section
-                # slice start and stops, replace with 0 or hdf.duration.
-                fallback = lambda x, y: x if x is not None else y
-
-                duration = fallback(duration, 0)
-
-                start = fallback(one_hz.slice.start, 0)
-                stop = fallback(one_hz.slice.stop, duration)
-                start_edge = fallback(one_hz.start_edge, 0)
-                stop_edge = fallback(one_hz.stop_edge, duration)
-
-                slice_ = slice(start, stop)
-                one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
-                aligned_section[index] = one_hz
-
-                if not (0 <= start <= duration and 0 <= stop <= duration + 4):
-                    msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start, stop, duration))
-                if not 0 <= start_edge <= duration:
-                    msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start_edge, duration))
-                if not 0 <= stop_edge <= duration + 4:
-                    msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, stop_edge, duration))
-                section_list.append(one_hz)
-            params[param_name] = aligned_section
-        elif issubclass(node.node_type, DerivedParameterNode):
-            if duration:
-                # check that the right number of results were returned
-                # Allow a small tolerance. For example if duration in seconds
-                # is 2822, then there will be an array length of  1411 at 0.5Hz and 706
-                # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
-                # parameters then we will have an array length of 1412.
-                expected_length = duration * result.frequency
-                if result.array is None:
-                    logger.warning("No array set; creating a fully masked "
-                                   "array for %s", param_name)
-                    array_length = expected_length
-                    # Where a parameter is wholly masked, we fill the HDF
-                    # file with masked zeros to maintain structure.
-                    result.array = \
-                        np_ma_masked_zeros_like(np.ma.arange(expected_length))
-                else:
-                    array_length = len(result.array)
-                length_diff = array_length - expected_length
-                if length_diff == 0:
-                    pass
-                elif 0 < length_diff < 5:
-                    logger.warning("Cutting excess data for parameter '%s'. "
-                                   "Expected length was '%s' while resulting "
-                                   "array length was '%s'.", param_name,
-                                   expected_length, len(result.array))
-                    result.array = result.array[:expected_length]
-                else:
-                    raise ValueError("Array length mismatch for parameter "
-                                     "'%s'. Expected '%s', resulting array "
-                                     "length '%s'." % (param_name,
-                                                       expected_length,
-                                                       array_length))
-
-            hdf.set_param(result)
-            # Keep hdf_keys up to date.
-            node_mgr.hdf_keys.append(param_name)
-        elif issubclass(node.node_type, ApproachNode):
-            aligned_approach = result.get_aligned(P(frequency=1, offset=0))
-            for approach in aligned_approach:
-                # Does not allow slice start or stops to be None.
-                valid_turnoff = (not approach.turnoff or
-                                 (0 <= approach.turnoff <= duration))
-                valid_slice = ((0 <= approach.slice.start <= duration) and
-                               (0 <= approach.slice.stop <= duration))
-                valid_gs_est = (not approach.gs_est or
-                                ((0 <= approach.gs_est.start <= duration) and
-                                 (0 <= approach.gs_est.stop <= duration)))
-                valid_loc_est = (not approach.loc_est or
-                                 ((0 <= approach.loc_est.start <= duration) and
-                                  (0 <= approach.loc_est.stop <= duration)))
-                if not all([valid_turnoff, valid_slice, valid_gs_est,
-                            valid_loc_est]):
-                    raise ValueError('ApproachItem contains index outside of '
-                                     'flight data: %s' % approach)
-                approach_list.append(approach)
-            params[param_name] = aligned_approach
-        else:
-            raise NotImplementedError("Unknown Type %s" % node.__class__)
-        continue
-    return kti_list, kpv_list, section_list, approach_list, flight_attrs
+        derive_order.append(param_name)
+
+    # Count the consumers of each node so that results can be released once
+    # nothing downstream requires them.
+    references = ReferenceCounter(dict(
+        (name, node_mgr.derived_nodes[name].get_dependency_names())
+        for name in derive_order))
+
+    param_store = None
+    if settings.PARAMETER_STORE_SIZE:
+        # Keep derived parameters in memory while they are required and
+        # write them to the HDF file in bulk.
+        hdf = param_store = ParameterStore(hdf, references,
+                                           settings.PARAMETER_STORE_SIZE)
+
+    peak_memory = PeakMemory()
+
+    def node_stored(param_name):
+        peak_memory.sample()
+        for name in references.derived(param_name):
+            # Free the node objects and arrays of results which are no
+            # longer required.
+            params.pop(name, None)
+            if param_store is not None:
+                param_store.release(name)
+            if alignment_cache is not None:
+                alignment_cache.invalidate(name)
+
+    if workers > 1 and gr_st is not None:
+        _derive_parameters_parallel(hdf, node_mgr, derive_order, gr_st,
+                                    workers, params, results, alignment_cache,
+                                    profiler, node_stored)
+    else:
+        for param_name in derive_order:
+            node_class = node_mgr.derived_nodes[param_name]  #NB raises KeyError if Node is "unknown"
+
+            # build ordered dependencies
+            deps = get_dependencies(node_class, hdf, node_mgr, params,
+                                    profiler)
+
+            result = derive_node(node_class, deps, hdf, node_mgr, params,
+                                 alignment_cache, profiler)
+
+            store_result(param_name, result, hdf, node_mgr, params, results,
+                         alignment_cache, profiler)
+            del deps, result
+            node_stored(param_name)
+
+    if param_store is not None:
+        param_store.flush()
+        logger.info("Parameter store: %d reads from memory, %d writes, "
+                    "%d peak bytes.", param_store.reads, param_store.writes,
+                    param_store.peak_bytes)
+    if peak_memory.peak is not None:
+        logger.info("Peak memory usage while deriving nodes: %.1f MB.",
+                    peak_memory.peak / 1024.0 ** 2)
+    if alignment_cache is not None:
+        logger.info("Alignment cache: %(hits)d hits, %(misses)d misses, "
+                    "%(evictions)d evictions.", alignment_cache.stats())
+        # Free the aligned arrays once the flight has been processed.
+        alignment_cache.clear()
+    return results.as_tuple()
 
 
 def parse_analyser_profiles(analyser_profiles):
@@ -276,7 +577,8 @@ def parse_analyser_profiles(analyser_profiles):
 def process_flight(hdf_path, tail_number, aircraft_info={},
                    start_datetime=datetime.now(), achieved_flight_record={},
                    requested=[], required=[], include_flight_attributes=True,
-                   additional_modules=[]):
+                   additional_modules=[], workers=None, derived_nodes=None,
+                   profiler=None):
     '''
     Processes the HDF file (hdf_path) to derive the required_params (Nodes)
     within python modules (settings.NODE_MODULES).
@@ -300,6 +602,12 @@ def process_flight(hdf_path, tail_number, aircraft_info={},
     :type include_flight_attributes: Boolean
     :param additional_modules: List of module paths to import.
     :type additional_modules: List of Strings
+    :param workers: Number of worker threads used to derive independent nodes in parallel. Defaults to settings.DERIVE_WORKERS.
+    :type workers: int
+    :param derived_nodes: Node name to Node class mapping of all derived nodes. Imported from settings.NODE_MODULES and additional_modules if not provided.
+    :type derived_nodes: dict
+    :param profiler: Records the time and memory used by each node. The profile is stored within the HDF file if settings.STORE_NODE_PROFILE is True.
+    :type profiler: NodeProfiler
 
     :returns: See below:
     :rtype: Dict
@@ -451,8 +759,9 @@ def process_flight(hdf_path, tail_number, aircraft_info={},
     aircraft_info['Tail Number'] = tail_number
 
     # go through modules to get derived nodes
-    node_modules = additional_modules + settings.NODE_MODULES
-    derived_nodes = get_derived_nodes(node_modules)
+    if derived_nodes is None:
+        node_modules = additional_modules + settings.NODE_MODULES
+        derived_nodes = get_derived_nodes(node_modules)
 
     if requested:
         requested = \
@@ -482,7 +791,9 @@ def process_flight(hdf_path, tail_number, aircraft_info={},
             requested, required, derived_nodes, aircraft_info,
             achieved_flight_record)
         # calculate dependency tree
-        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        process_order, gr_st = dependency_order(
+            node_mgr, draw=False, cache=settings.CACHE_DEPENDENCY_ORDER,
+            cache_dir=settings.DEPENDENCY_CACHE_DIR)
         if settings.CACHE_PARAMETER_MIN_USAGE:
             # find params used more than
             for node in gr_st.nodes():
@@ -495,8 +806,11 @@ def process_flight(hdf_path, tail_number, aircraft_info={},
                          hdf.cache_param_list)
 
         # derive parameters
+        if workers is None:
+            workers = settings.DERIVE_WORKERS
         kti_list, kpv_list, section_list, approach_list, flight_attrs = \
-            derive_parameters(hdf, node_mgr, process_order)
+            derive_parameters(hdf, node_mgr, process_order, gr_st=gr_st,
+                              workers=workers, profiler=profiler)
 
         # geo locate KTIs
         kti_list = geo_locate(hdf, kti_list)
@@ -510,6 +824,9 @@ def process_flight(hdf_path, tail_number, aircraft_info={},
         hdf.analysis_version = __version__
         # Store dependency tree
         hdf.dependency_tree = json_graph.dumps(gr_st)
+        if profiler is not None and settings.STORE_NODE_PROFILE:
+            # Store the profile of each node alongside the dependency tree
+            profiler.store(hdf)
         # Store aircraft info
         hdf.set_attr('aircraft_info', aircraft_info)
         hdf.set_attr('achieved_flight_record', achieved_flight_record)
@@ -550,6 +867,13 @@ def main():
                         help='Aircraft tail number.')
     parser.add_argument('--strip', default=False, action='store_true',
                         help='Strip the HDF5 file to only the LFL parameters')
+    parser.add_argument('--workers', type=int, dest='workers', default=None,
+                        help='Number of threads used to derive independent '
+                        'nodes in parallel.')
+    parser.add_argument('--profile', type=str, dest='profile', default=None,
+                        help='Write the time and memory used by each node to '
+                        'a JSON file, or a CSV file if the path ends in '
+                        '".csv".')
 
     # Aircraft info
     parser.add_argument('-aircraft-family', dest='aircraft_family', type=str,
@@ -637,10 +961,15 @@ def main():
     if args.strip:
         with hdf_file(hdf_copy) as hdf:
             hdf.delete_params(hdf.derived_keys())
+    profiler = NodeProfiler() if args.profile else None
     res = process_flight(
         hdf_copy, args.tail_number, aircraft_info=aircraft_info,
-        requested=args.requested, required=args.required)
+        requested=args.requested, required=args.required,
+        workers=args.workers, profiler=profiler)
     logger.info("Derived parameters stored in hdf: %s", hdf_copy)
+    if profiler is not None:
+        profiler.write(args.profile)
+        logger.info("Node profile written to: %s", args.profile)
     # Write CSV file
     if args.write_csv.lower() == 'true':
         csv_dest = os.path.splitext(hdf_copy)[0] + '.csv'
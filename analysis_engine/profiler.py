@@ -0,0 +1,183 @@
+import base64
+import csv
+import simplejson as json
+import time
+import zlib
+
+from collections import OrderedDict
+
+from analysis_engine.recordtype import recordtype
+from analysis_engine.utils import get_memory_usage
+
+
+# Name of the HDF file attribute the profile is stored within.
+HDF_ATTRIBUTE = 'node_profile'
+
+# Measurements recorded for each node. Times are in seconds and sizes are in
+# bytes.
+NodeProfile = recordtype(
+    'NodeProfile',
+    'name node_type wall_time cpu_time align_time read_time write_time '
+    'memory_delta input_arrays input_bytes output_bytes',
+    default=0)
+
+
+def _array_nbytes(node):
+    '''
+    :returns: Size of the node's array and mask in bytes, or 0 if the node does not have an array.
+    :rtype: int
+    '''
+    array = getattr(node, 'array', None)
+    if array is None:
+        return 0
+    mask = getattr(array, 'mask', None)
+    return array.nbytes + getattr(mask, 'nbytes', 0)
+
+
+class NodeProfiler(object):
+    '''
+    Records the time and memory used to derive each node of a flight.
+
+    Pass to derive_parameters to profile the nodes. For each node the
+    following are recorded:
+
+    * wall_time: Elapsed time deriving the node, excluding reading
+      dependencies and storing the result.
+    * cpu_time: Processor time of the process while deriving the node. When
+      nodes are derived in parallel this includes other threads.
+    * align_time: Time spent aligning the dependencies within wall_time.
+    * read_time: Time reading the dependencies from the HDF file or the
+      parameter store.
+    * write_time: Time validating and storing the result.
+    * memory_delta: Change in resident memory of the process while deriving
+      the node.
+    * input_arrays / input_bytes: Number and size of dependency arrays.
+    * output_bytes: Size of the derived array.
+    '''
+    def __init__(self):
+        self.profiles = OrderedDict()
+
+    def get(self, name, node_type=''):
+        '''
+        :param name: Name of the node.
+        :type name: str
+        :param node_type: Abbreviated type of the node, e.g. 'KPV'.
+        :type node_type: str
+        :returns: The profile of the node, created if it does not exist.
+        :rtype: NodeProfile
+        '''
+        try:
+            return self.profiles[name]
+        except KeyError:
+            profile = NodeProfile(name=name, node_type=node_type)
+            self.profiles[name] = profile
+            return profile
+
+    def record_read(self, name, node_type, deps, duration):
+        '''
+        Record reading the dependencies of a node.
+
+        :param deps: Dependencies as returned by get_dependencies.
+        :type deps: list
+        :param duration: Time taken in seconds.
+        :type duration: float
+        '''
+        profile = self.get(name, node_type)
+        profile.read_time += duration
+        for dep in deps:
+            nbytes = _array_nbytes(dep)
+            if nbytes:
+                profile.input_arrays += 1
+                profile.input_bytes += nbytes
+
+    def derive(self, name, node_type, func, *args, **kwargs):
+        '''
+        Call func to derive a node, recording the wall time, CPU time and
+        change in memory.
+
+        :param func: Function which derives the node.
+        :type func: callable
+        :returns: The result of func.
+        '''
+        profile = self.get(name, node_type)
+        memory = get_memory_usage()
+        start_cpu = time.clock()
+        start = time.time()
+        result = func(*args, **kwargs)
+        profile.wall_time += time.time() - start
+        profile.cpu_time += time.clock() - start_cpu
+        if memory is not None:
+            profile.memory_delta += get_memory_usage() - memory
+        profile.output_bytes = _array_nbytes(result)
+        return result
+
+    def record_write(self, name, duration):
+        '''
+        Record storing the result of a node.
+
+        :param duration: Time taken in seconds.
+        :type duration: float
+        '''
+        self.get(name).write_time += duration
+
+    def as_dicts(self):
+        '''
+        :returns: Profile of each node in the order they were derived.
+        :rtype: [OrderedDict]
+        '''
+        return [OrderedDict((field, getattr(profile, field))
+                            for field in NodeProfile.__slots__)
+                for profile in self.profiles.itervalues()]
+
+    def to_json(self):
+        '''
+        :rtype: str
+        '''
+        return json.dumps(self.as_dicts())
+
+    def write_csv(self, csv_file):
+        '''
+        :param csv_file: File object to write rows to.
+        :type csv_file: file
+        '''
+        writer = csv.DictWriter(csv_file, NodeProfile.__slots__)
+        writer.writeheader()
+        writer.writerows(self.as_dicts())
+
+    def write(self, path):
+        '''
+        Write the profile to a CSV file if path ends in '.csv', otherwise
+        JSON.
+
+        :param path: File path.
+        :type path: str
+        '''
+        with open(path, 'wb') as report:
+            if path.lower().endswith('.csv'):
+                self.write_csv(report)
+            else:
+                report.write(self.to_json())
+
+    def store(self, hdf):
+        '''
+        Store the profile within the HDF file. The JSON is compressed as
+        HDF attributes are limited in size.
+
+        :param hdf: HDF file to store the profile within.
+        :type hdf: hdf_file
+        '''
+        hdf.set_attr(HDF_ATTRIBUTE,
+                     base64.b64encode(zlib.compress(self.to_json())))
+
+    @classmethod
+    def load(cls, hdf):
+        '''
+        :param hdf: HDF file the profile was stored within.
+        :type hdf: hdf_file
+        :returns: Profile of each node or None if the HDF file does not contain a profile.
+        :rtype: [dict] or None
+        '''
+        value = hdf.get_attr(HDF_ATTRIBUTE)
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(base64.b64decode(value)))
@@ -40,6 +40,30 @@ BASE_URL = ''  # Must be configured to use HTTP API handler.
 #API_PROXY_INFO = httplib2.ProxyInfo(httplib2.socks.PROXY_TYPE_HTTP, 'host', 80)
 API_PROXY_INFO = None
 
+# Responses of the HTTP API handlers are cached by URL for the time in seconds
+# given for their endpoint. Responses of endpoints which are not listed are
+# not cached.
+API_CACHE_TTLS = {
+    'aircraft': 60 * 60,
+    'analyser_profiles': 60 * 60,
+    'data_exports': 60 * 60,
+    'airport': 24 * 60 * 60,
+    'nearest_airport': 24 * 60 * 60,
+    'nearest_runway': 24 * 60 * 60,
+}
+
+# Time in seconds for which the HTTP API handlers cache that a request was not
+# found.
+API_CACHE_NOT_FOUND_TTL = 10 * 60
+
+# Maximum number of responses cached in memory by each HTTP API handler.
+API_CACHE_SIZE = 1000
+
+# Directory in which the HTTP API handlers also store cached responses so that
+# they are reused by later processes. Responses are only cached in memory if
+# None.
+API_CACHE_DIR = None
+
 ANALYZER_PATH = os.path.dirname(os.path.realpath(
     sys.executable if getattr(sys, 'frozen', False) else __file__))
 
@@ -50,6 +74,21 @@ LOCAL_API_AIRPORT_PATH = os.path.join(CONFIG_PATH, 'airports.yaml')
 LOCAL_API_RUNWAY_PATH = os.path.join(CONFIG_PATH, 'runways.yaml')
 LOCAL_API_EXPORTS_PATH = os.path.join(CONFIG_PATH, 'exports.yaml')
 
+# Path of a snapshot compiled from the files above with
+# `python -m analysis_engine.api_snapshot`, which the local API handler loads
+# instead of the files when set.
+LOCAL_API_SNAPSHOT_PATH = None
+
+# Maximum difference between the heading passed to the local API handler's
+# nearest runway lookup and the magnetic heading of a runway for the runway to
+# be preferred over the other runways of the airport.
+LOCAL_API_RUNWAY_HEADING_TOLERANCE = 30  # deg
+
+# Runways do not record their airport, so the runways of an airport passed to
+# the local API handler's nearest runway lookup are those within this distance
+# of the airport.
+LOCAL_API_RUNWAY_AIRPORT_RADIUS = 10000  # metres
+
 # User's home directory, override in analyser_custom_settings.py
 WORKING_DIR = os.path.expanduser('~')
 
@@ -60,6 +99,38 @@ CA_CERTIFICATE_FILE = '/etc/ssl/certs/ca-certificates.crt'
 # Cache parameters which are used more than n times in HDF
 CACHE_PARAMETER_MIN_USAGE = 0
 
+# Reuse the dependency tree and processing order between flights with the
+# same recorded parameters, requested nodes and aircraft attributes.
+CACHE_DEPENDENCY_ORDER = True
+
+# Directory to store cached dependency orders within so that they persist
+# between processes. None keeps the cache in memory only.
+DEPENDENCY_CACHE_DIR = None
+
+# Maximum number of dependency orders kept in memory. The least recently used
+# are evicted, but remain within DEPENDENCY_CACHE_DIR if it is set.
+DEPENDENCY_CACHE_SIZE = 16
+
+# Number of worker threads used to derive independent nodes in parallel. A
+# value of 1 derives nodes one at a time in the processing order.
+DERIVE_WORKERS = 1
+
+# Maximum size in bytes of aligned parameter arrays cached while processing a
+# flight so that dependencies aligned to the same frequency and offset by
+# many nodes are only aligned once. A value of 0 disables the cache.
+ALIGNMENT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Maximum size in bytes of derived parameter arrays held in memory while
+# processing a flight before they are written to the HDF file. Parameters are
+# held in memory while nodes which depend upon them are yet to be derived and
+# are written in bulk. A value of 0 writes each parameter to the HDF file as
+# soon as it is derived.
+PARAMETER_STORE_SIZE = 512 * 1024 * 1024
+
+# Store the profile of each node within the HDF file when process_flight is
+# called with a NodeProfiler.
+STORE_NODE_PROFILE = True
+
 
 ##############################################################################
 # Segment Splitting
@@ -173,6 +244,10 @@ GRAVITY_IMPERIAL = 32.2  # ft/sec^2 - used for combining acceleration and height
 # Acceleration due to gravity
 GRAVITY_METRIC = 9.81  # m/sec^2 - used for comibining acceleration and groundspeed terms
 
+# Limit on the iterations of the optimiser which fits precise positioning
+# ground tracks to the recorded groundspeed and heading.
+GROUND_TRACK_MAX_ITERATIONS = 10
+
 # Groundspeed complementary filter time constant.
 GROUNDSPEED_LAG_TC = 6.0  # seconds
 
@@ -1,5 +1,6 @@
 import argparse
 import logging
+import mmap
 import os
 
 from datetime import datetime
@@ -17,18 +18,21 @@ from analysis_engine import settings
 logger = logging.getLogger(__name__)
 
 
-def get_aircraft_info(tail_number):
+def get_aircraft_info(tail_number, api_handler=None):
     '''
     Fetch aircraft info from settings.API_HANDLER or from LOCAL_API_HANDLER
     if there is an API_ERROR raised.
     
     :param tail_number: Aircraft tail registration
     :type tail_number: string
+    :param api_handler: Already initialised settings.API_HANDLER to reuse.
+    :type api_handler: object
     :returns: Aircraft information key:value pairs
     :rtype: dict
     '''
     # Fetch aircraft info through the API.
-    api_handler = get_api_handler(settings.API_HANDLER)
+    if api_handler is None:
+        api_handler = get_api_handler(settings.API_HANDLER)
     
     try:
         aircraft_info = api_handler.get_aircraft(tail_number)
@@ -120,6 +124,37 @@ def derived_trimmer(hdf_path, node_names, dest):
     return strip_hdf(hdf_path, params, dest) 
 
 
+def get_memory_usage():
+    '''
+    :returns: Resident memory used by the current process in bytes or None if it cannot be determined on this platform.
+    :rtype: int or None
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * mmap.PAGESIZE
+    except (IOError, IndexError, ValueError):
+        return None
+
+
+class PeakMemory(object):
+    '''
+    Tracks the peak resident memory of the current process from the memory
+    usage sampled when sample is called.
+    '''
+    def __init__(self):
+        self.peak = get_memory_usage()
+
+    def sample(self):
+        '''
+        :returns: Current resident memory in bytes or None if it cannot be determined.
+        :rtype: int or None
+        '''
+        usage = get_memory_usage()
+        if usage is not None and usage > self.peak:
+            self.peak = usage
+        return usage
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     subparser = parser.add_subparsers(dest='command',
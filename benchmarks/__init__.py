@@ -0,0 +1,215 @@
+'''
+Benchmarks of performance critical parts of the analysis engine.
+
+Each benchmark module can be run as a script, e.g.
+
+    python -m benchmarks.align_benchmark
+
+Benchmarks of optimised functions compare them with the implementation they
+replaced, see compare_legacy.
+
+The suite runs all of the benchmarks and records the results as JSON so
+that they can be compared between releases:
+
+    python -m benchmarks.suite --output results.json --baseline previous.json
+'''
+import operator
+import platform
+import sys
+import time
+import timeit
+
+from collections import OrderedDict
+
+import numpy as np
+import simplejson as json
+
+import analysis_engine
+
+
+# Format of the results file. Increment if the format changes.
+RESULTS_VERSION = 1
+
+
+def benchmark_result(group, name, times, **params):
+    '''
+    :param group: Group of the benchmark, e.g. 'library'.
+    :type group: str
+    :param name: Name of the benchmark which is unique within the group.
+    :type name: str
+    :param times: Time of each repetition in seconds.
+    :type times: [float]
+    :param params: Parameters of the benchmark, e.g. array length.
+    :returns: Result of a benchmark.
+    :rtype: OrderedDict
+    '''
+    return OrderedDict([
+        ('group', group),
+        ('name', name),
+        ('best', min(times)),
+        ('mean', sum(times) / len(times)),
+        ('repeat', len(times)),
+        ('params', params),
+    ])
+
+
+def time_function(group, name, func, repeat=3, number=1, **params):
+    '''
+    Time a function call.
+
+    :param func: Function to time which is called without arguments.
+    :type func: callable
+    :param number: Number of calls per repetition.
+    :type number: int
+    :returns: Result of the benchmark. See benchmark_result.
+    :rtype: OrderedDict
+    '''
+    times = [t / number for t in
+             timeit.repeat(func, repeat=repeat, number=number)]
+    return benchmark_result(group, name, times, **params)
+
+
+def compare_legacy(group, cases, repeat=3, legacy_repeat=1):
+    '''
+    Time the current implementation of each case and the previous
+    implementation which it replaced, checking that they give the same
+    result.
+
+    Cases may be generated as they are timed, so a generator may set up
+    each case with variables which the following case rebinds.
+
+    :param group: Group of the benchmarks.
+    :type group: str
+    :param cases: Name, previous implementation, current implementation and comparison of each case. Implementations are called without arguments. The previous implementation is None if it does not support the case. The comparison is called with the current and previous results, or is None to compare them with ==.
+    :type cases: iterable of (str, callable or None, callable, callable or None)
+    :param repeat: Number of repetitions of the current implementation.
+    :type repeat: int
+    :param legacy_repeat: Number of repetitions of the previous implementation, which is often much slower.
+    :type legacy_repeat: int
+    :returns: Result of each case for the current implementation. The params include the best time of the previous implementation ('legacy') and whether the results were the same ('same'), both None if the previous implementation does not support the case. See benchmark_result.
+    :rtype: [OrderedDict]
+    '''
+    results = []
+    for name, legacy, current, same in cases:
+        legacy_time = is_same = None
+        if legacy is not None:
+            is_same = bool((same or operator.eq)(current(), legacy()))
+            legacy_time = min(timeit.repeat(legacy, repeat=legacy_repeat,
+                                            number=1))
+        times = timeit.repeat(current, repeat=repeat, number=1)
+        results.append(benchmark_result(group, name, times,
+                                        legacy=legacy_time, same=is_same))
+    return results
+
+
+def same_masked_array(result, expected, rtol=1e-05, atol=1e-08):
+    '''
+    :param result: Array returned by the current implementation.
+    :type result: np.ma.masked_array
+    :param expected: Array returned by the previous implementation.
+    :type expected: np.ma.masked_array
+    :param rtol: Relative tolerance of unmasked values. Values are compared exactly if both tolerances are 0.
+    :type rtol: float
+    :param atol: Absolute tolerance of unmasked values.
+    :type atol: float
+    :returns: Whether the arrays have the same mask and unmasked values.
+    :rtype: bool
+    '''
+    mask = np.ma.getmaskarray(result)
+    if not np.array_equal(mask, np.ma.getmaskarray(expected)):
+        return False
+    return np.allclose(np.ma.getdata(result)[~mask],
+                       np.ma.getdata(expected)[~mask], rtol=rtol, atol=atol,
+                       equal_nan=True)
+
+
+def print_comparison(results):
+    '''
+    :param results: Results returned by compare_legacy.
+    :type results: [OrderedDict]
+    '''
+    width = max([len('Case')] + [len(r['name']) for r in results])
+    print '%-*s %10s %10s %8s %6s' % (width, 'Case', 'Legacy', 'Current',
+                                      'Speedup', 'Same')
+    for result in results:
+        legacy = result['params']['legacy']
+        if legacy is None:
+            print '%-*s %10s %8.2fms %8s %6s' % (
+                width, result['name'], '-', result['best'] * 1000, '-', '-')
+        else:
+            print '%-*s %8.2fms %8.2fms %7.1fx %6s' % (
+                width, result['name'], legacy * 1000, result['best'] * 1000,
+                legacy / result['best'], result['params']['same'])
+
+
+def environment():
+    '''
+    :returns: Description of the software and machine the benchmarks were run on.
+    :rtype: OrderedDict
+    '''
+    return OrderedDict([
+        ('analysis_engine', analysis_engine.__version__),
+        ('python', sys.version.split()[0]),
+        ('numpy', np.__version__),
+        ('platform', platform.platform()),
+        ('processor', platform.processor() or platform.machine()),
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+    ])
+
+
+def write_results(path, results):
+    '''
+    :param path: Path of the JSON file to write.
+    :type path: str
+    :param results: Benchmark results.
+    :type results: [OrderedDict]
+    '''
+    with open(path, 'w') as results_file:
+        json.dump(OrderedDict([
+            ('version', RESULTS_VERSION),
+            ('environment', environment()),
+            ('results', results),
+        ]), results_file, indent=2)
+
+
+def load_results(path):
+    '''
+    :param path: Path of a JSON file written by write_results.
+    :type path: str
+    :raises ValueError: If the file was written in a different format.
+    :returns: Benchmark results.
+    :rtype: [dict]
+    '''
+    with open(path) as results_file:
+        data = json.load(results_file)
+    if data.get('version') != RESULTS_VERSION:
+        raise ValueError("Unsupported benchmark results version '%s' in '%s'."
+                         % (data.get('version'), path))
+    return data['results']
+
+
+def compare_results(baseline, results, tolerance=0.2):
+    '''
+    Compare the best times of benchmarks with a baseline.
+
+    :param baseline: Previous benchmark results.
+    :type baseline: [dict]
+    :param results: Current benchmark results.
+    :type results: [dict]
+    :param tolerance: Fraction by which a benchmark may be slower than the baseline before it is considered a regression.
+    :type tolerance: float
+    :returns: Group, name, baseline time, current time, ratio of the current to the baseline time and whether it regressed for each benchmark within both results.
+    :rtype: [(str, str, float, float, float, bool)]
+    '''
+    baseline_times = dict(((r['group'], r['name']), r['best'])
+                          for r in baseline)
+    comparison = []
+    for result in results:
+        key = (result['group'], result['name'])
+        if key not in baseline_times:
+            continue
+        previous = baseline_times[key]
+        ratio = result['best'] / previous if previous else float('inf')
+        comparison.append(key + (previous, result['best'], ratio,
+                                 ratio > 1 + tolerance))
+    return comparison
@@ -0,0 +1,164 @@
+'''
+Compare the performance of align against the previous implementation which
+looped over each sample within the master's period.
+
+Arrays are the length of a three hour flight and 10% of the slave's samples
+are masked.
+'''
+import numpy as np
+
+from math import floor
+
+from hdfaccess.parameter import MappedArray
+
+from analysis_engine.library import align, repair_mask
+from analysis_engine.node import M, P
+
+from benchmarks import compare_legacy, print_comparison, same_masked_array
+
+
+GROUP = 'align'
+
+DURATION = 3 * 60 * 60
+
+# (slave frequency, slave offset, master frequency, master offset)
+CASES = [
+    (1, 0.0, 8, 0.0),
+    (1, 0.5, 8, 0.0),
+    (8, 0.0, 1, 0.5),
+    (4, 0.1, 2, 0.3),
+    (0.25, 1.0, 16, 0.05),
+    (16, 0.01, 0.5, 1.0),
+    (5, 0.1, 1, 0.0),
+    (1, 0.0, 10, 0.05),
+    (20, 0.02, 8, 0.1),
+]
+
+
+def legacy_align(slave, master, interpolate=True):
+    '''
+    Previous implementation of align which did not support non-zero offsets
+    at 5, 10 or 20Hz. Only used to benchmark and verify align.
+    '''
+    slave_array = slave.array
+    if isinstance(slave_array, MappedArray):
+        slave_array = slave_array.raw
+        interpolate = False
+        _dtype = int
+    else:
+        _dtype = float
+
+    if slave.frequency == master.frequency and slave.offset == master.offset:
+        return slave_array
+    for param in (slave, master):
+        if param.frequency in (5, 10, 20) and param.offset:
+            raise ValueError('Align: Offset non-zero at sample rate %sHz' %
+                             param.frequency)
+
+    wm = master.frequency
+    ws = slave.frequency
+    slowest = min(wm, ws)
+    delta = (master.offset - slave.offset) * slave.frequency
+    if slowest < 1:
+        wm /= slowest
+        ws /= slowest
+    wm = int(wm)
+    ws = int(ws)
+    r = wm / float(ws)
+
+    slave_aligned = np.ma.zeros(int(len(slave_array) * r), dtype=_dtype)
+
+    power2 = (0.25, 0.5, 1, 2, 4, 8, 16)
+    if not delta and interpolate and (master.frequency in power2 and
+                                      slave.frequency in power2):
+        slave_aligned.mask = True
+        if master.frequency > slave.frequency:
+            slave_aligned[0::int(r)] = slave_array[0::1]
+            return repair_mask(slave_aligned, frequency=master.frequency,
+                               repair_duration=1.0 / slave.frequency,
+                               zero_if_masked=True)
+        else:
+            return slave_array[0::int(1 / r)]
+
+    for i in range(wm):
+        bracket = (i / r) + delta
+        h = int(floor(bracket))
+        h1 = h + 1
+        b = bracket - h
+        if not interpolate:
+            b = round(b)
+        a = 1 - b
+        if h < 0:
+            if h < -ws:
+                raise ValueError('Align called with excessive timing mismatch')
+            if ws == 1:
+                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
+            else:
+                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
+            slave_aligned[i] = 0
+            slave_aligned[i] = np.ma.masked
+        elif h1 >= ws:
+            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
+            slave_aligned[i-wm] = 0
+            slave_aligned[i-wm] = np.ma.masked
+        else:
+            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
+
+    return slave_aligned
+
+
+def _parameters(slave_hz, slave_offset, master_hz, master_offset,
+                multistate=False):
+    length = int(DURATION * slave_hz)
+    mask = np.random.rand(length) < 0.1
+    if multistate:
+        slave = M('Slave', np.ma.array(np.random.randint(0, 3, length),
+                                       mask=mask),
+                  values_mapping={0: 'A', 1: 'B', 2: 'C'},
+                  frequency=slave_hz, offset=slave_offset)
+    else:
+        slave = P('Slave', np.ma.array(np.random.randn(length), mask=mask),
+                  frequency=slave_hz, offset=slave_offset)
+    master = P('Master', np.ma.zeros(int(DURATION * master_hz)),
+               frequency=master_hz, offset=master_offset)
+    return slave, master
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable or None, callable, callable)
+    '''
+    for case in CASES:
+        for multistate in (False, True):
+            slave, master = _parameters(*case, multistate=multistate)
+            name = '%sHz+%ss -> %sHz+%ss%s' % (
+                case + (' (multistate)' if multistate else '',))
+            try:
+                legacy_align(slave, master)
+            except ValueError:
+                # Offsets were not supported by the legacy implementation.
+                legacy = None
+            else:
+                legacy = lambda: legacy_align(slave, master)
+            yield (name, legacy, lambda: align(slave, master),
+                   lambda result, expected: same_masked_array(
+                       result, expected, rtol=0, atol=0))
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+Compare the performance of cycle_finder against the previous implementation
+which removed the smallest reversal with np.argmin and np.delete until all
+reversals were at least min_step.
+
+The previous implementation took O(n^2) time in the number of turning
+points, which is large for long, noisy engine parameters. Arrays are the
+length of a three hour flight of an engine parameter with noise of a range
+of amplitudes relative to the minimum step.
+'''
+import numpy as np
+
+from analysis_engine.library import cycle_finder
+
+from benchmarks import compare_legacy, print_comparison
+from benchmarks.synthetic import PROFILE, profile_array
+
+
+GROUP = 'cycle'
+
+DURATION = 3 * 60 * 60
+
+CASES = (
+    # parameter, frequency, noise, min_step
+    ('Eng (1) N1', 1, 0.2, 1.0),
+    ('Eng (1) N1', 4, 0.2, 1.0),
+    ('Eng (1) N1', 4, 1.0, 2.0),
+    ('Altitude STD', 2, 5.0, 500.0),
+)
+
+
+def legacy_cycle_finder(array, min_step=0.0, include_ends=True):
+    '''
+    Previous implementation of cycle_finder. Only used to benchmark and
+    verify cycle_finder.
+    '''
+    if len(array) == 0:
+        return None, None
+    x = np.ma.ediff1d(array, to_begin=0.0)
+    y = np.ma.nonzero(x)[0]
+    z = x[y]
+    peak = -z[:-1] * z[1:]
+    idxs = y[np.nonzero(np.ma.maximum(peak, 0.0))]
+    vals = array.data[idxs]
+    if include_ends and np.ma.count(array):
+        first, last = np.ma.flatnotmasked_edges(array)
+        idxs = np.insert(idxs, 0, first)
+        vals = np.insert(vals, 0, array.data[first])
+        try:
+            if (vals[2] - vals[1]) * (vals[1] - vals[0]) >= 0.0:
+                idxs = np.delete(idxs, 1)
+                vals = np.delete(vals, 1)
+        except:
+            pass
+        idxs = np.append(idxs, last)
+        vals = np.append(vals, array.data[last])
+        try:
+            if (vals[-3] - vals[-2]) * (vals[-2] - vals[-1]) >= 0.0:
+                idxs = np.delete(idxs, -2)
+                vals = np.delete(vals, -2)
+        except:
+            pass
+    dvals = np.ediff1d(vals)
+    while len(dvals) > 0 and np.min(abs(dvals)) < min_step:
+        sort_idx = np.argmin(abs(dvals))
+        last = len(dvals)
+        if sort_idx == 0:
+            idxs = np.delete(idxs, 0)
+            vals = np.delete(vals, 0)
+            dvals = np.delete(dvals, 0)
+        elif sort_idx == last-1:
+            idxs = np.delete(idxs, last)
+            vals = np.delete(vals, last)
+            dvals = np.delete(dvals, last-1)
+        else:
+            idxs = np.delete(idxs, slice(sort_idx, sort_idx + 2))
+            vals = np.delete(vals, slice(sort_idx, sort_idx + 2))
+            dvals[sort_idx - 1] += dvals[sort_idx] + dvals[sort_idx + 1]
+            dvals = np.delete(dvals, slice(sort_idx, sort_idx + 2))
+    return idxs, vals
+
+
+def _same_cycles(result, expected):
+    return (np.array_equal(result[0], expected[0]) and
+            np.array_equal(result[1], expected[1]))
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    np.random.seed(0)
+    for name, frequency, noise, min_step in CASES:
+        array = np.ma.array(profile_array(PROFILE[name][0], DURATION,
+                                          frequency, noise=noise))
+        yield ('%s %sHz noise %s step %s' % (name, frequency, noise, min_step),
+               lambda: legacy_cycle_finder(array, min_step),
+               lambda: cycle_finder(array, min_step),
+               _same_cycles)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
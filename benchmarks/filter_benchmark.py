@@ -0,0 +1,93 @@
+'''
+Compare the performance of first_order_lag and first_order_washout against
+the previous implementation of masked_first_order_filter which filtered each
+unmasked block of data separately.
+
+Arrays are the length of a three hour flight at 16Hz with an increasing
+number of small masked gaps, as found in noisy recorded parameters.
+'''
+import numpy as np
+
+from analysis_engine.library import first_order_lag, first_order_washout
+from analysis_engine import library
+
+from benchmarks import compare_legacy, print_comparison, same_masked_array
+
+
+GROUP = 'filter'
+
+DURATION = 3 * 60 * 60
+
+FREQUENCY = 16
+
+MASK_DENSITIES = (0.0, 0.001, 0.01, 0.1)
+
+
+def legacy_masked_first_order_filter(y_term, x_term, param, initial_value):
+    '''
+    Previous implementation of masked_first_order_filter. Only used to
+    benchmark and verify masked_first_order_filter.
+    '''
+    from scipy.signal import lfilter, lfilter_zi
+    z_initial = lfilter_zi(x_term, y_term)
+    result = np.ma.zeros(len(param))
+    good_parts = np.ma.clump_unmasked(param)
+    for good_part in good_parts:
+        if initial_value is None:
+            initial_value = param[good_part.start]
+        answer, z_final = lfilter(x_term, y_term, param[good_part],
+                                  zi=z_initial*initial_value)
+        result[good_part] = np.ma.array(answer)
+    bad_parts = np.ma.clump_masked(param)
+    for bad_part in bad_parts:
+        result[bad_part] = np.ma.masked
+    return result
+
+
+def _legacy(func):
+    '''
+    :returns: Function calling func with the legacy masked_first_order_filter.
+    :rtype: callable
+    '''
+    def call():
+        current_filter = library.masked_first_order_filter
+        library.masked_first_order_filter = legacy_masked_first_order_filter
+        try:
+            return func()
+        finally:
+            library.masked_first_order_filter = current_filter
+    return call
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    np.random.seed(0)
+    length = DURATION * FREQUENCY
+    for mask_density in MASK_DENSITIES:
+        array = np.ma.array(np.cumsum(np.random.randn(length)),
+                            mask=np.random.rand(length) < mask_density)
+        for function in (first_order_lag, first_order_washout):
+            call = lambda: function(array, 10.0, FREQUENCY)
+            yield ('%s %g%% masked' % (function.__name__, mask_density * 100),
+                   _legacy(call), call, same_masked_array)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
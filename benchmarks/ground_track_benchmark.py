@@ -0,0 +1,154 @@
+'''
+Compare the performance of ground_track_precise against the previous
+implementation which interpolated the speed weighting and integrated the
+whole ground track for every evaluation of the error by the optimiser.
+
+The tracks are synthetic taxi tracks with turns between straight sections,
+recorded positions with noise and a few masked groundspeed and heading
+samples.
+'''
+import numpy as np
+
+from analysis_engine.library import (
+    ground_track,
+    ground_track_precise,
+    interpolate,
+    np_ma_masked_zeros_like,
+    rate_of_change_array,
+)
+from scipy import optimize
+
+from benchmarks import compare_legacy, print_comparison, same_masked_array
+from benchmarks.synthetic import taxi_track
+
+
+GROUP = 'ground_track'
+
+FREQUENCY = 1.0
+
+# Durations of the taxi in seconds and the number of turns.
+CASES = ((600, 4), (1200, 8), (2400, 16))
+
+
+def legacy_gtp_weighting_vector(speed, straight_ends, weights):
+    '''
+    Previous implementation of gtp_weighting_vector. Only used to benchmark
+    and verify ground_track_precise.
+    '''
+    speed_weighting = np_ma_masked_zeros_like(speed)
+    for idx, point in enumerate(straight_ends):
+        index = point
+        if index == len(speed_weighting):
+            index =- 1
+        speed_weighting[index] = weights[idx]
+    speed_weighting[0] = 1.0
+    speed_weighting[-1] = 1.0
+    return interpolate(speed_weighting)
+
+
+def legacy_gtp_compute_error(weights, *args):
+    '''
+    Previous implementation of gtp_compute_error. Only used to benchmark and
+    verify ground_track_precise.
+    '''
+    straights, straight_ends, lat, lon, speed, hdg, frequency, mode, \
+        return_arg_set = args
+    speed_weighting = legacy_gtp_weighting_vector(speed, straight_ends,
+                                                  weights)
+    fix = -1 if mode == 'takeoff' else 0
+    lat_est, lon_est = ground_track(lat[fix], lon[fix],
+                                    speed * speed_weighting, hdg, frequency,
+                                    mode)
+    errors = np.arange(len(straights), dtype=float)
+    for n, straight in enumerate(straights):
+        x_track_errors = (
+            (lon[straight]-lon_est[straight])*np.cos(np.radians(hdg[straight])) -
+            (lat[straight]-lat_est[straight])*np.sin(np.radians(hdg[straight])))
+        errors[n] = np.nansum(x_track_errors**2.0) * 1.0E09
+    error = np.nansum(errors)
+    if return_arg_set == 'iterate':
+        return error
+    else:
+        return lat_est, lon_est, error
+
+
+def legacy_ground_track_precise(lat, lon, speed, hdg, frequency, mode):
+    '''
+    Previous implementation of ground_track_precise. Only used to benchmark
+    and verify ground_track_precise.
+    '''
+    track_edges = np.ma.flatnotmasked_edges(np.ma.masked_less(speed, 1.0))
+    track_edges[1] = min(track_edges[1]+1, len(speed))
+    if mode == 'landing':
+        track_slice = slice(0, track_edges[1])
+    else:
+        track_slice = slice(track_edges[0], len(speed))
+    rot = np.ma.abs(rate_of_change_array(hdg[track_slice], frequency,
+                                         width=8.0))
+    straights = np.ma.clump_unmasked(np.ma.masked_greater(rot, 2.0))
+    straight_ends = []
+    for straight in straights:
+        straight_ends.append(straight.start)
+        straight_ends.append(straight.stop)
+    args = (straights, straight_ends, lat[track_slice], lon[track_slice],
+            speed[track_slice], hdg[track_slice], frequency, mode)
+    if len(straight_ends) <= 4:
+        weights_opt = [np.array([1.0]*len(speed))]
+    else:
+        del straight_ends[0]
+        del straight_ends[-1]
+        weights = np.ma.ones(len(straight_ends))
+        weights_opt = optimize.fmin_l_bfgs_b(
+            legacy_gtp_compute_error, weights, fprime=None,
+            args=args + ('iterate',), approx_grad=True, epsilon=1.0E-4,
+            bounds=[(0.5, 1.5)]*len(straight_ends), maxfun=10)
+    lat_est, lon_est, wt = legacy_gtp_compute_error(
+        weights_opt[0], *(args + ('final_answer',)))
+    lat_return = np_ma_masked_zeros_like(lat)
+    lon_return = np_ma_masked_zeros_like(lat)
+    lat_return[track_slice] = lat_est
+    lon_return[track_slice] = lon_est
+    return lat_return, lon_return, wt
+
+
+def _same_track(result, expected):
+    return (same_masked_array(result[0], expected[0], rtol=0, atol=1e-9) and
+            same_masked_array(result[1], expected[1], rtol=0, atol=1e-9) and
+            np.isclose(result[2], expected[2]))
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    np.random.seed(0)
+    for duration, turns in CASES:
+        lat, lon, gspd, hdg = taxi_track(duration, FREQUENCY, turns)
+        for mode in ('takeoff', 'landing'):
+            # Masked headings are repaired in place, so each call is given
+            # a copy.
+            yield ('%s %ds %d turns' % (mode, duration, turns),
+                   lambda: legacy_ground_track_precise(
+                       lat, lon, gspd, hdg.copy(), FREQUENCY, mode),
+                   lambda: ground_track_precise(lat, lon, gspd, hdg.copy(),
+                                                FREQUENCY, mode),
+                   _same_track)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
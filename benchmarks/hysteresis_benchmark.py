@@ -0,0 +1,126 @@
+'''
+Compare the performance of hysteresis against the previous implementation
+which looped over each sample of the masked array.
+
+Arrays are the length of a three hour flight at each sample rate and 1% of
+the samples are masked, plus a ramp of 100000 samples with masked edges.
+'''
+import numpy as np
+
+from analysis_engine import library
+from analysis_engine.library import hysteresis
+
+from benchmarks import compare_legacy, print_comparison, same_masked_array
+
+
+GROUP = 'hysteresis'
+
+DURATION = 3 * 60 * 60
+
+FREQUENCIES = (1, 4, 16)
+
+
+def legacy_hysteresis(array, hysteresis):
+    '''
+    Previous implementation of hysteresis. Only used to benchmark and verify
+    hysteresis.
+    '''
+    if np.ma.count(array) == 0: # No unmasked elements.
+        return array
+
+    quarter_range = hysteresis / 4.0
+    # Length is going to be used often, so prepare here:
+    length = len(array)
+    half_done = np.zeros(length)
+    result = np.zeros(length)
+    length = length-1 #  To be used for array indexing next
+
+    # get a list of the unmasked data - allow for array.mask = False (not an array)
+    if array.mask is np.False_:
+        notmasked = np.arange(length+1)
+    else:
+        notmasked = np.ma.where(array.mask == False)[0]
+    # The starting point for the computation is the first notmasked sample.
+    old = array[notmasked[0]]
+    for index in notmasked:
+        new = array[index]
+
+        if new - old > quarter_range:
+            old = new  - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        half_done[index] = old
+
+    # Repeat the process in the "backwards" sense to remove phase effects.
+    for index in notmasked[::-1]:
+        new = half_done[index]
+        if new - old > quarter_range:
+            old = new  - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        result[index] = old
+
+    # At the end of the process we reinstate the mask, although the data
+    # values may have affected the result.
+    return np.ma.array(result, mask=array.mask)
+
+
+def _with_pass(implementation, func):
+    '''
+    :returns: Function calling func with library._hysteresis_pass replaced by implementation.
+    :rtype: callable
+    '''
+    def call():
+        library._hysteresis_pass, previous = \
+            implementation, library._hysteresis_pass
+        try:
+            return func()
+        finally:
+            library._hysteresis_pass = previous
+    return call
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    arrays = []
+    for frequency in FREQUENCIES:
+        length = DURATION * frequency
+        arrays.append(('%sHz' % frequency,
+                       np.ma.array(np.cumsum(np.random.randn(length)),
+                                   mask=np.random.rand(length) < 0.01)))
+    # A ramp with masked edges, formerly timed by a unit test.
+    array = np.ma.arange(100000)
+    array[0] = np.ma.masked
+    array[-1000:] = np.ma.masked
+    arrays.append(('ramp', array))
+    implementations = [('chunked', library._hysteresis_pass_chunked)]
+    if library._hysteresis_pass is not library._hysteresis_pass_chunked:
+        implementations.append(('compiled', library._hysteresis_pass))
+    for label, array in arrays:
+        for name, implementation in implementations:
+            yield ('%s (%s)' % (label, name),
+                   lambda: legacy_hysteresis(array, 10),
+                   _with_pass(implementation, lambda: hysteresis(array, 10)),
+                   lambda result, expected: same_masked_array(
+                       result, expected, rtol=0, atol=0))
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
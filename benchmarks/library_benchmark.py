@@ -0,0 +1,206 @@
+'''
+Time library functions which are called by many nodes while processing a
+flight.
+
+Arrays are the length of a flight of the given duration and are generated
+with the synthetic flight profile.
+'''
+import numpy as np
+
+from datetime import datetime
+
+from analysis_engine.library import (
+    align,
+    cycle_counter,
+    first_order_lag,
+    first_order_washout,
+    ground_track_precise,
+    hysteresis,
+    integrate,
+    is_day_array,
+    rate_of_change_array,
+    repair_mask,
+    runs_of_ones,
+    second_window,
+    sliding_min_max,
+    slices_and,
+    slices_not,
+    slices_or,
+    slices_remove_small_gaps,
+    touchdown_inertial,
+)
+from analysis_engine.node import M, P, Section
+
+from benchmarks import time_function
+from benchmarks.synthetic import (
+    PROFILE,
+    mask_array,
+    profile_array,
+    random_walk,
+    taxi_track,
+)
+
+
+GROUP = 'library'
+
+DURATION = 3 * 60 * 60
+
+
+def _slices(length, count):
+    '''
+    :returns: count sorted, non-overlapping slices within length.
+    :rtype: [slice]
+    '''
+    edges = np.sort(np.random.choice(length, count * 2, replace=False))
+    return [slice(start, stop) for start, stop in edges.reshape(-1, 2)]
+
+
+def run(duration=DURATION, mask_density=0.01, repeat=3):
+    '''
+    :param duration: Duration of the flight in seconds which determines the length of the arrays.
+    :type duration: int
+    :param mask_density: Fraction of samples to mask at random.
+    :type mask_density: float
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each benchmark. See benchmarks.benchmark_result.
+    :rtype: [OrderedDict]
+    '''
+    np.random.seed(0)
+    results = []
+
+    def bench(name, func, number=1, **params):
+        # Include the duration so that names are unique across durations.
+        results.append(time_function(GROUP, '%s %ds' % (name, duration),
+                                     func, repeat=repeat, number=number,
+                                     duration=duration,
+                                     mask_density=mask_density, **params))
+
+    altitude = PROFILE['Altitude STD'][0]
+    for slave_hz, master_hz, offset in ((1, 8, 0.0), (1, 8, 0.5),
+                                        (8, 1, 0.1), (4, 16, 0.3)):
+        slave = P('Slave', mask_array(
+            profile_array(altitude, duration, slave_hz, noise=5),
+            mask_density), frequency=slave_hz, offset=offset)
+        master = P('Master', np.ma.zeros(duration * master_hz),
+                   frequency=master_hz)
+        bench('align %sHz+%ss -> %sHz' % (slave_hz, offset, master_hz),
+              lambda: align(slave, master), length=len(slave.array))
+    multistate = M('Slave', mask_array(np.random.randint(0, 3, duration),
+                                       mask_density),
+                   values_mapping={0: 'A', 1: 'B', 2: 'C'}, offset=0.5)
+    master = P('Master', np.ma.zeros(duration * 4), frequency=4)
+    bench('align multistate 1Hz+0.5s -> 4Hz',
+          lambda: align(multistate, master), length=duration)
+
+    for frequency in (1, 8):
+        array = mask_array(profile_array(altitude, duration, frequency,
+                                         noise=5), mask_density)
+        length = len(array)
+        bench('repair_mask %sHz' % frequency,
+              lambda: repair_mask(array, frequency=frequency, copy=True),
+              length=length)
+        bench('repair_mask %sHz unlimited' % frequency,
+              lambda: repair_mask(array, frequency=frequency,
+                                  repair_duration=None, copy=True),
+              length=length)
+        bench('hysteresis %sHz' % frequency,
+              lambda: hysteresis(array, 100), length=length)
+        bench('integrate %sHz' % frequency,
+              lambda: integrate(array, frequency), length=length)
+        bench('first_order_lag %sHz' % frequency,
+              lambda: first_order_lag(array, 10.0, frequency),
+              length=length)
+        bench('first_order_washout %sHz' % frequency,
+              lambda: first_order_washout(array, 10.0, frequency),
+              length=length)
+        bench('rate_of_change_array %sHz' % frequency,
+              lambda: rate_of_change_array(array, frequency, 4),
+              length=length)
+        bench('rate_of_change_array %sHz regression' % frequency,
+              lambda: rate_of_change_array(array, frequency, 4,
+                                           method='regression'),
+              length=length)
+
+    for frequency, seconds in ((1, 10), (4, 3)):
+        array = mask_array(random_walk(duration * frequency), mask_density)
+        bench('second_window %sHz %ss' % (frequency, seconds),
+              lambda: second_window(array, frequency, seconds),
+              length=len(array))
+        bench('sliding_min_max %sHz %ss' % (frequency, seconds),
+              lambda: sliding_min_max(array, seconds * frequency / 2),
+              length=len(array))
+
+    # Engine cycles within a noisy engine parameter.
+    for frequency in (1, 4):
+        array = mask_array(profile_array(PROFILE['Eng (1) N1'][0], duration,
+                                         frequency, noise=0.2), mask_density)
+        bench('cycle_counter %sHz' % frequency,
+              lambda: cycle_counter(array, 1.0, 10.0, frequency),
+              length=len(array))
+
+    latitude = mask_array(profile_array(PROFILE['Latitude'][0], duration, 1),
+                          mask_density)
+    longitude = mask_array(profile_array(PROFILE['Longitude'][0], duration,
+                                         1), mask_density)
+    bench('is_day_array 1Hz',
+          lambda: is_day_array(datetime(2013, 6, 1, 12, 0),
+                               np.arange(duration), latitude, longitude),
+          length=duration)
+
+    # Integration over the landing phase, from the last 5% of the descent
+    # until after touchdown.
+    for frequency in (1, 8):
+        heights = profile_array(altitude, duration, frequency)
+        land = Section('Landing', slice(int(duration * 0.85 * frequency),
+                                        int(duration * 0.95 * frequency)),
+                       int(duration * 0.85 * frequency),
+                       int(duration * 0.95 * frequency))
+        alt = P('Altitude AAL', mask_array(heights, mask_density),
+                frequency=frequency)
+        roc = P('Vertical Speed Inertial', mask_array(
+            np.gradient(heights) * 60.0 * frequency, mask_density),
+            frequency=frequency)
+        bench('touchdown_inertial %sHz' % frequency,
+              lambda: touchdown_inertial(land, roc, alt),
+              length=land.stop_edge - land.start_edge)
+
+    # Precise positioning taxi tracks, which are at most a fraction of the
+    # flight.
+    for frequency in (1, 4):
+        lat, lon, gspd, hdg = taxi_track(min(duration / 10, 1200), frequency,
+                                         8, mask_density)
+        # Masked headings are repaired in place, so each call is given a
+        # copy.
+        bench('ground_track_precise %sHz' % frequency,
+              lambda: ground_track_precise(lat, lon, gspd, hdg.copy(),
+                                           frequency, 'takeoff'),
+              length=len(lat))
+
+    bits = random_walk(duration) > 0
+    bench('runs_of_ones', lambda: runs_of_ones(bits), length=duration)
+    for count in (10, 1000):
+        first = _slices(duration, count)
+        second = _slices(duration, count)
+        bench('slices_and %d' % count,
+              lambda: slices_and(first, second), number=10, slices=count)
+        bench('slices_or %d' % count,
+              lambda: slices_or(first, second), number=10, slices=count)
+        bench('slices_not %d' % count,
+              lambda: slices_not(first, begin_at=0, end_at=duration),
+              number=10, slices=count)
+        bench('slices_remove_small_gaps %d' % count,
+              lambda: slices_remove_small_gaps(first), number=10,
+              slices=count)
+    return results
+
+
+def main():
+    print '%-40s %10s %10s' % ('Benchmark', 'Best', 'Mean')
+    for result in run():
+        print '%-40s %8.2fms %8.2fms' % (result['name'], result['best'] * 1000,
+                                         result['mean'] * 1000)
+
+
+if __name__ == '__main__':
+    main()
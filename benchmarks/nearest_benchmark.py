@@ -0,0 +1,123 @@
+'''
+Compare the performance of the local API handler's nearest airport and
+runway lookups against the previous implementation which calculated the
+distance to every airport or runway.
+
+The airports are at random locations over the world, each with a pair of
+reciprocal runways. The lookups are near random airports as they are when
+processing a flight.
+'''
+import numpy as np
+
+from copy import copy
+from operator import itemgetter
+
+from analysis_engine.api_handler_analysis_engine import (
+    AnalysisEngineAPIHandlerLocal,
+)
+from analysis_engine.library import bearing_and_distance
+
+from benchmarks import compare_legacy, print_comparison
+from benchmarks.synthetic import airport_database
+
+
+GROUP = 'nearest'
+
+# Number of airports within the database.
+CASES = (1000, 10000)
+
+LOOKUPS = 3
+
+
+def legacy_get_nearest_airport(airports, latitude, longitude):
+    '''
+    Previous implementation of AnalysisEngineAPIHandlerLocal
+    get_nearest_airport. Only used to benchmark and verify the lookup.
+    '''
+    nearest = []
+    for airport in airports:
+        if 'latitude' not in airport or 'longitude' not in airport:
+            continue
+        airport = copy(airport)
+        airport['distance'] = bearing_and_distance(latitude, longitude,
+                                                   airport['latitude'],
+                                                   airport['longitude'])[1]
+        nearest.append(airport)
+    return min(nearest, key=itemgetter('distance'))
+
+
+def legacy_get_nearest_runway(runways, latitude, longitude):
+    '''
+    Previous implementation of AnalysisEngineAPIHandlerLocal
+    get_nearest_runway with coordinates. Only used to benchmark and verify
+    the lookup.
+    '''
+    nearest = []
+    for runway in runways:
+        runway = copy(runway)
+        runway_coords = runway.get('start', runway.get('end'))
+        if not runway_coords:
+            continue
+        runway['distance'] = bearing_and_distance(
+            latitude, longitude, runway_coords['latitude'],
+            runway_coords['longitude'])[1]
+        nearest.append(runway)
+    return min(nearest, key=itemgetter('distance'))
+
+
+def local_handler(airports, runways):
+    '''
+    :returns: Local API handler with the airports and runways.
+    :rtype: AnalysisEngineAPIHandlerLocal
+    '''
+    handler = AnalysisEngineAPIHandlerLocal.__new__(
+        AnalysisEngineAPIHandlerLocal)
+    handler.aircraft = {}
+    handler.airports = airports
+    handler.runways = runways
+    handler.exports = {}
+    handler._build_indexes()
+    return handler
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, None)
+    '''
+    np.random.seed(0)
+    for count in CASES:
+        airports, runways = airport_database(count, runways_per_airport=1)
+        handler = local_handler(airports, runways)
+        locations = [(airports[i]['latitude'] + np.random.normal(0, 0.05),
+                      airports[i]['longitude'] + np.random.normal(0, 0.05))
+                     for i in np.random.randint(count, size=LOOKUPS)]
+        for name, legacy_func, func, items in (
+                ('airport', legacy_get_nearest_airport,
+                 handler.get_nearest_airport, airports),
+                ('runway', legacy_get_nearest_runway,
+                 lambda lat, lon: handler.get_nearest_runway(
+                     None, None, latitude=lat, longitude=lon), runways)):
+            yield ('%d %ss of %d airports' % (LOOKUPS, name, count),
+                   lambda: [legacy_func(items, lat, lon)
+                            for lat, lon in locations],
+                   lambda: [func(lat, lon) for lat, lon in locations],
+                   None)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
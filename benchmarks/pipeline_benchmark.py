@@ -0,0 +1,100 @@
+'''
+Time splitting and processing synthetic flights end-to-end.
+
+Each repetition works on a fresh copy of the synthetic HDF file as
+processing a flight writes derived parameters to the file.
+'''
+import os
+import shutil
+import tempfile
+import time
+
+from datetime import datetime
+
+from analysis_engine.process_flight import process_flight
+from analysis_engine.split_hdf_to_segments import split_hdf_to_segments
+
+from benchmarks import benchmark_result
+from benchmarks.synthetic import AIRCRAFT_INFO, create_flight
+
+
+GROUP = 'pipeline'
+
+START_DATETIME = datetime(2013, 6, 1, 12, 0)
+
+
+def _time_copies(func, hdf_path, temp_dir, repeat):
+    '''
+    :param func: Function called with the path of a copy of the HDF file.
+    :type func: callable
+    :returns: Time of each repetition in seconds excluding copying the file.
+    :rtype: [float]
+    '''
+    times = []
+    for index in range(repeat):
+        copy_path = os.path.join(temp_dir, 'copy_%d.hdf5' % index)
+        shutil.copy(hdf_path, copy_path)
+        start = time.time()
+        func(copy_path)
+        times.append(time.time() - start)
+    return times
+
+
+def run(durations=(3600, 3 * 60 * 60), parameter_count=50,
+        frequencies=(1, 2, 4, 8, 16), mask_density=0.001, repeat=3):
+    '''
+    :param durations: Duration in seconds of each synthetic flight.
+    :type durations: tuple
+    :param parameter_count: Number of parameters within each flight.
+    :type parameter_count: int
+    :param frequencies: Sample rates of the parameters in Hz.
+    :type frequencies: tuple
+    :param mask_density: Fraction of samples to mask at random.
+    :type mask_density: float
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each benchmark. See benchmarks.benchmark_result.
+    :rtype: [OrderedDict]
+    '''
+    results = []
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for duration in durations:
+            params = dict(duration=duration, parameter_count=parameter_count,
+                          frequencies=list(frequencies),
+                          mask_density=mask_density)
+            hdf_path = os.path.join(temp_dir, 'synthetic.hdf5')
+            create_flight(hdf_path, duration=duration,
+                          parameter_count=parameter_count,
+                          frequencies=frequencies, mask_density=mask_density)
+
+            def split(path):
+                split_hdf_to_segments(path, AIRCRAFT_INFO,
+                                      fallback_dt=START_DATETIME,
+                                      dest_dir=temp_dir)
+
+            def process(path):
+                process_flight(path, AIRCRAFT_INFO['Tail Number'],
+                               aircraft_info=AIRCRAFT_INFO,
+                               start_datetime=START_DATETIME)
+
+            results.append(benchmark_result(
+                GROUP, 'split_hdf_to_segments %ds' % duration,
+                _time_copies(split, hdf_path, temp_dir, repeat), **params))
+            results.append(benchmark_result(
+                GROUP, 'process_flight %ds' % duration,
+                _time_copies(process, hdf_path, temp_dir, repeat), **params))
+    finally:
+        shutil.rmtree(temp_dir)
+    return results
+
+
+def main():
+    print '%-40s %10s %10s' % ('Benchmark', 'Best', 'Mean')
+    for result in run():
+        print '%-40s %9.2fs %9.2fs' % (result['name'], result['best'],
+                                       result['mean'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Compare the performance of rate_of_change_array against the previous
+implementation which dilated the mask one sample at a time and built the
+padded input for the regression method as a Python list.
+
+Arrays are the length of a three hour flight at each sample rate and 1% of
+the samples are masked. The widths are those used by the vertical speed and
+attitude rate parameters.
+'''
+import numpy as np
+
+from analysis_engine.library import np_ma_zeros_like, rate_of_change_array
+
+from benchmarks import compare_legacy, print_comparison, same_masked_array
+
+
+GROUP = 'rate_of_change'
+
+DURATION = 3 * 60 * 60
+
+CASES = (
+    # frequency, width, method
+    (8, 2, 'two_points'),
+    (16, 2, 'two_points'),
+    (16, 8, 'two_points'),
+    (1, 4, 'regression'),
+    (4, 8, 'regression'),
+)
+
+
+def legacy_rate_of_change_array(to_diff, hz, width=None,
+                                method='two_points'):
+    '''
+    Previous implementation of rate_of_change_array. Only used to benchmark
+    and verify rate_of_change_array.
+    '''
+    if width is None:
+        width = 2 / hz
+    hw = int(width * hz / 2.0)
+    if hw < 1:
+        raise ValueError('Rate of change called with inadequate width.')
+    if len(to_diff) <= 2 * hw:
+        return np_ma_zeros_like(to_diff)
+    if method == 'two_points':
+        input_mask = np.ma.getmaskarray(to_diff)
+        slope = np.ma.copy(to_diff)
+        slope[hw:-hw] = (to_diff[2*hw:] - to_diff[:-2*hw])/width
+        slope[:hw] = (to_diff[1:hw+1] - to_diff[0:hw]) * hz
+        slope[-hw:] = (to_diff[-hw:] - to_diff[-hw-1:-1])* hz
+        slope.mask = np.logical_or(input_mask, np.ma.getmaskarray(slope))
+        for i in range(-hw,0):
+            slope.mask[:i] = np.logical_or(input_mask[-i:], slope.mask[:i])
+        for i in range(1,hw+1):
+            slope.mask[i:] = np.logical_or(input_mask[:-i], slope.mask[i:])
+        return slope
+    elif method == 'regression':
+        x = np.arange(-hw,hw+1)
+        sx2_hz = np.sum(x*x)/hz
+        z = np.array([to_diff[0]]*hw+list(to_diff)+[to_diff[-1]]*hw)
+        return np.convolve(z,-x,'same')[hw:-hw]/sx2_hz
+    else:
+        raise ValueError('Rate of change called with unrecognised method')
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    np.random.seed(0)
+    for frequency, width, method in CASES:
+        length = DURATION * frequency
+        array = np.ma.array(np.cumsum(np.random.randn(length)),
+                            mask=np.random.rand(length) < 0.01)
+        yield ('%s %sHz %ss' % (method, frequency, width),
+               lambda: legacy_rate_of_change_array(array, frequency, width,
+                                                   method),
+               lambda: rate_of_change_array(array, frequency, width, method),
+               same_masked_array)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
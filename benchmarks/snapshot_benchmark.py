@@ -0,0 +1,114 @@
+'''
+Compare the start up time of the local API handler loading a compiled
+snapshot against loading the JSON data files.
+
+The airports are at random locations over the world, each with two pairs of
+reciprocal runways, written as JSON which is the faster of the formats the
+handler loads data files in.
+'''
+import numpy as np
+import os
+import shutil
+import simplejson
+import tempfile
+
+from analysis_engine import settings
+from analysis_engine.api_handler_analysis_engine import (
+    AnalysisEngineAPIHandlerLocal,
+)
+from analysis_engine.api_snapshot import compile_snapshot
+
+from benchmarks import compare_legacy, print_comparison
+from benchmarks.synthetic import AIRCRAFT_INFO, airport_database
+
+
+GROUP = 'snapshot'
+
+# Number of airports within the database.
+CASES = (1000, 10000, 40000)
+
+# Number of aircraft within the database.
+AIRCRAFT = 1000
+
+
+def _load_handler(snapshot_path=None, **paths):
+    '''
+    :param snapshot_path: Path of the snapshot to load or None to load the data files.
+    :type snapshot_path: str or None
+    :param paths: Paths of the data files by setting name.
+    :returns: Local API handler.
+    :rtype: AnalysisEngineAPIHandlerLocal
+    '''
+    previous = dict((name, getattr(settings, name)) for name in
+                    paths.keys() + ['LOCAL_API_SNAPSHOT_PATH'])
+    try:
+        for name, path in paths.items():
+            setattr(settings, name, path)
+        settings.LOCAL_API_SNAPSHOT_PATH = snapshot_path
+        return AnalysisEngineAPIHandlerLocal()
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+
+def _lookups(handler, locations):
+    return [(handler.get_nearest_airport(lat, lon),
+             handler.get_nearest_runway(None, None, latitude=lat,
+                                        longitude=lon))
+            for lat, lon in locations]
+
+
+def cases():
+    '''
+    The data files are the legacy case and the snapshot the current case.
+
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    np.random.seed(0)
+    tempdir = tempfile.mkdtemp()
+    try:
+        aircraft = dict(('G-%04d' % index, AIRCRAFT_INFO)
+                        for index in range(AIRCRAFT))
+        for count in CASES:
+            airports, runways = airport_database(count)
+            paths = {}
+            for name, data in (('AIRCRAFT', aircraft), ('AIRPORT', airports),
+                               ('RUNWAY', runways), ('EXPORTS', {})):
+                path = os.path.join(tempdir, '%s.json' % name.lower())
+                with open(path, 'w') as data_file:
+                    simplejson.dump(data, data_file)
+                paths['LOCAL_API_%s_PATH' % name] = path
+            snapshot_path = os.path.join(tempdir, 'local_api.snapshot')
+            compile_snapshot(
+                snapshot_path, paths['LOCAL_API_AIRCRAFT_PATH'],
+                paths['LOCAL_API_AIRPORT_PATH'],
+                paths['LOCAL_API_RUNWAY_PATH'],
+                paths['LOCAL_API_EXPORTS_PATH'])
+
+            locations = np.random.uniform(-60, 60, (10, 2)).tolist()
+            yield ('load %d airports' % count,
+                   lambda: _load_handler(**paths),
+                   lambda: _load_handler(snapshot_path),
+                   lambda result, expected: (_lookups(result, locations) ==
+                                             _lookups(expected, locations)))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat, legacy_repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
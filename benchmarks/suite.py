@@ -0,0 +1,112 @@
+'''
+Run the benchmark suite and record the results as JSON.
+
+When a baseline results file from a previous release is provided, the
+benchmarks which have become slower than the tolerance are reported and the
+exit status is non-zero.
+'''
+import argparse
+import sys
+
+from collections import OrderedDict
+
+from benchmarks import compare_results, load_results, write_results
+from benchmarks import (
+    align_benchmark,
+    cycle_benchmark,
+    filter_benchmark,
+    ground_track_benchmark,
+    hysteresis_benchmark,
+    library_benchmark,
+    nearest_benchmark,
+    pipeline_benchmark,
+    rate_of_change_benchmark,
+    snapshot_benchmark,
+    touchdown_benchmark,
+)
+
+
+# Benchmarks comparing optimised functions with the implementations they
+# replaced, keyed by group.
+LEGACY_GROUPS = OrderedDict((module.GROUP, module) for module in (
+    align_benchmark,
+    hysteresis_benchmark,
+    touchdown_benchmark,
+    filter_benchmark,
+    rate_of_change_benchmark,
+    cycle_benchmark,
+    ground_track_benchmark,
+    nearest_benchmark,
+    snapshot_benchmark,
+))
+
+GROUPS = ('library', 'pipeline') + tuple(LEGACY_GROUPS)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help='Path of the JSON results file to write.')
+    parser.add_argument('-b', '--baseline',
+                        help='Results file to compare the results against.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Fraction by which a benchmark may be slower '
+                        'than the baseline before it is a regression.')
+    parser.add_argument('--group', action='append',
+                        choices=GROUPS,
+                        help='Only run the benchmarks of a group.')
+    parser.add_argument('--duration', type=int, action='append',
+                        help='Duration of the synthetic flights in seconds.')
+    parser.add_argument('--parameters', type=int, default=50,
+                        help='Number of parameters within synthetic flights.')
+    parser.add_argument('--frequencies', type=float, nargs='+',
+                        default=[1, 2, 4, 8, 16],
+                        help='Sample rates of the parameters in Hz.')
+    parser.add_argument('--mask-density', type=float, default=0.001,
+                        help='Fraction of samples to mask at random.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of repetitions of each benchmark.')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    groups = args.group or GROUPS
+    durations = args.duration or [3600, 3 * 60 * 60]
+    results = []
+    if 'library' in groups:
+        for duration in durations:
+            results.extend(library_benchmark.run(
+                duration=duration, mask_density=args.mask_density,
+                repeat=args.repeat))
+    if 'pipeline' in groups:
+        results.extend(pipeline_benchmark.run(
+            durations=durations, parameter_count=args.parameters,
+            frequencies=args.frequencies, mask_density=args.mask_density,
+            repeat=args.repeat))
+    for group, module in LEGACY_GROUPS.items():
+        if group in groups:
+            results.extend(module.run(repeat=args.repeat))
+    write_results(args.output, results)
+
+    if not args.baseline:
+        for result in results:
+            print '%-10s %-50s %10.4fs' % (result['group'], result['name'],
+                                           result['best'])
+        return 0
+
+    regressions = 0
+    print '%-10s %-50s %10s %10s %7s' % ('Group', 'Benchmark', 'Baseline',
+                                         'Current', 'Ratio')
+    for group, name, previous, current, ratio, regressed in \
+            compare_results(load_results(args.baseline), results,
+                            tolerance=args.tolerance):
+        regressions += regressed
+        print '%-10s %-50s %9.4fs %9.4fs %6.2fx%s' % (
+            group, name, previous, current, ratio,
+            ' REGRESSION' if regressed else '')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
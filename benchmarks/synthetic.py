@@ -0,0 +1,255 @@
+'''
+Generate synthetic HDF files of a single flight for benchmarking.
+
+The flight taxis out of Kristiansand, climbs to cruise, descends and lands
+at Oslo Gardermoen, both of which are within the local API handler's
+airports. The profile is scaled to the requested duration so that flights
+of any length have all phases of flight.
+'''
+import h5py
+import numpy as np
+
+from hdfaccess.file import hdf_file
+
+from analysis_engine.node import M, P
+
+
+AIRCRAFT_INFO = {
+    'Tail Number': 'G-SYNT',
+    'Family': 'B737',
+    'Series': 'B737-300',
+    'Model': 'B737-301',
+    'Frame': '737-5',
+    'Precise Positioning': False,
+}
+
+# Fraction of the flight's duration at which each phase begins: taxi out,
+# takeoff roll, liftoff, top of climb, top of descent, touchdown, runway
+# turnoff, taxi in.
+PROFILE_TIMES = (0.0, 0.08, 0.09, 0.3, 0.7, 0.9, 0.92, 1.0)
+
+# Value of each recorded parameter at PROFILE_TIMES, its sample rate in Hz,
+# units and the standard deviation of noise added to it.
+PROFILE = {
+    'Airspeed': ((0, 15, 150, 290, 290, 140, 15, 0), 1, 'kt', 0.5),
+    'Altitude STD': ((0, 0, 0, 35000, 35000, 0, 0, 0), 2, 'ft', 5),
+    'Heading': ((90, 30, 30, 50, 50, 10, 90, 180), 1, 'deg', 0.2),
+    'Pitch': ((0, 0, 12, 2, -2, 4, 0, 0), 4, 'deg', 0.1),
+    'Roll': ((0, 0, 0, 0, 0, 0, 0, 0), 4, 'deg', 0.5),
+    'Eng (1) N1': ((20, 25, 92, 85, 45, 30, 25, 20), 1, '%', 0.2),
+    'Eng (2) N1': ((20, 25, 92, 85, 45, 30, 25, 20), 1, '%', 0.2),
+    'Latitude': ((58.2042, 58.2042, 58.21, 58.8, 59.7, 60.1939, 60.1939,
+                  60.1939), 1, 'deg', 0.0),
+    'Longitude': ((8.08537, 8.08537, 8.1, 9.0, 10.5, 11.1004, 11.1004,
+                   11.1004), 1, 'deg', 0.0),
+    'Acceleration Normal': ((1, 1, 1.1, 1, 1, 1.3, 1, 1), 8, 'g', 0.02),
+    'Acceleration Longitudinal': ((0, 0, 0.2, 0.05, 0, -0.2, 0, 0), 4, 'g',
+                                  0.01),
+    'Acceleration Lateral': ((0, 0, 0, 0, 0, 0, 0, 0), 4, 'g', 0.01),
+}
+
+
+def profile_array(values, duration, frequency, offset=0.0, noise=0.0):
+    '''
+    Interpolate a flight profile at a sample rate.
+
+    :param values: Value at each of PROFILE_TIMES.
+    :type values: tuple
+    :param duration: Duration of the flight in seconds.
+    :type duration: int
+    :param frequency: Sample rate in Hz.
+    :type frequency: float
+    :param offset: Offset of the first sample in seconds.
+    :type offset: float
+    :param noise: Standard deviation of Gaussian noise added to the values.
+    :type noise: float
+    :returns: Array of duration * frequency samples.
+    :rtype: np.ndarray
+    '''
+    times = np.arange(int(duration * frequency)) / float(frequency) + offset
+    array = np.interp(times, np.array(PROFILE_TIMES) * duration, values)
+    if noise:
+        array += np.random.normal(0, noise, len(array))
+    return array
+
+
+def random_walk(length, scale=1.0):
+    '''
+    :returns: Smoothly varying random data.
+    :rtype: np.ndarray
+    '''
+    return np.cumsum(np.random.normal(0, scale, length))
+
+
+def mask_array(array, mask_density):
+    '''
+    :param mask_density: Fraction of samples to mask at random.
+    :type mask_density: float
+    :rtype: np.ma.masked_array
+    '''
+    return np.ma.array(array, mask=np.random.rand(len(array)) < mask_density)
+
+
+def taxi_track(duration, frequency, turns, mask_density=0.01):
+    '''
+    A taxi at about 15kts which turns at 3 deg/sec between straight sections
+    and stops at the end. The recorded position has noise and the
+    groundspeed and heading have masked samples.
+
+    :param duration: Duration of the taxi in seconds.
+    :type duration: int
+    :param frequency: Sample rate in Hz.
+    :type frequency: float
+    :param turns: Number of turns.
+    :type turns: int
+    :param mask_density: Fraction of groundspeed and heading samples to mask at random.
+    :type mask_density: float
+    :returns: Latitude, longitude, groundspeed and heading.
+    :rtype: (np.ma.masked_array, np.ma.masked_array, np.ma.masked_array, np.ma.masked_array)
+    '''
+    length = int(duration * frequency)
+    turn_samples = int(30 * frequency)
+    turn_rate = np.zeros(length)
+    for start in np.random.randint(0, length - turn_samples, turns):
+        turn_rate[start:start + turn_samples] += np.random.choice([-3.0, 3.0])
+    hdg = np.cumsum(turn_rate) / frequency + np.random.rand() * 360.0
+    gspd = np.clip(15.0 + random_walk(length, 0.1), 2.0, 30.0)
+    gspd[-int(20 * frequency):] = 0.5
+    north = np.cumsum(gspd * np.cos(np.radians(hdg))) * 0.5144 / frequency
+    east = np.cumsum(gspd * np.sin(np.radians(hdg))) * 0.5144 / frequency
+    lat = 58.2 + north / 111000.0 + np.random.normal(0, 2e-5, length)
+    lon = 8.1 + east / 58000.0 + np.random.normal(0, 2e-5, length)
+    return (np.ma.array(lat), np.ma.array(lon),
+            mask_array(gspd, mask_density),
+            mask_array(hdg + np.random.normal(0, 0.5, length), mask_density))
+
+
+def airport_database(airport_count, runways_per_airport=2):
+    '''
+    Airports at random locations over the world, each with pairs of
+    reciprocal runways, in the format of the local API handler's airports
+    and runways.
+
+    :param airport_count: Number of airports.
+    :type airport_count: int
+    :param runways_per_airport: Number of runways of each airport in each direction.
+    :type runways_per_airport: int
+    :returns: Airports and runways.
+    :rtype: ([dict], [dict])
+    '''
+    latitudes = np.degrees(np.arcsin(np.random.uniform(-1, 1, airport_count)))
+    longitudes = np.random.uniform(-180, 180, airport_count)
+    airports = []
+    runways = []
+    for index, (lat, lon) in enumerate(zip(latitudes.tolist(),
+                                           longitudes.tolist())):
+        airports.append({
+            'code': {'icao': 'X%03d' % index},
+            'id': index,
+            'latitude': lat,
+            'longitude': lon,
+        })
+        for number in range(runways_per_airport):
+            heading = np.random.uniform(0, 180)
+            start = {'latitude': lat + np.random.normal(0, 0.01),
+                     'longitude': lon + np.random.normal(0, 0.01)}
+            end = {'latitude': lat + np.random.normal(0, 0.01),
+                   'longitude': lon + np.random.normal(0, 0.01)}
+            for magnetic_heading, ends in ((heading, (start, end)),
+                                           (heading + 180, (end, start))):
+                runways.append({
+                    'id': len(runways),
+                    'start': ends[0],
+                    'end': ends[1],
+                    'localizer': {
+                        'frequency': float(np.random.randint(108, 112) * 1000 +
+                                           np.random.randint(20) * 50),
+                    },
+                    'magnetic_heading': magnetic_heading,
+                })
+    return airports, runways
+
+
+def synthetic_parameters(duration=3600, parameter_count=50,
+                         frequencies=(1, 2, 4, 8, 16), mask_density=0.001,
+                         seed=0):
+    '''
+    Create the parameters of a synthetic flight. Each parameter has a random
+    offset within its sample period.
+
+    :param duration: Duration of the flight in seconds.
+    :type duration: int
+    :param parameter_count: Number of parameters. Parameters in addition to the flight profile are random walks recorded at each of frequencies in turn.
+    :type parameter_count: int
+    :param frequencies: Sample rates of the additional parameters in Hz.
+    :type frequencies: tuple
+    :param mask_density: Fraction of samples to mask at random.
+    :type mask_density: float
+    :param seed: Seed of the random number generator so that flights are reproducible.
+    :type seed: int
+    :returns: Parameters of the flight.
+    :rtype: [P or M]
+    '''
+    np.random.seed(seed)
+    params = []
+    for name, (values, frequency, units, noise) in sorted(PROFILE.items()):
+        offset = np.random.rand() / frequency
+        array = profile_array(values, duration, frequency, offset=offset,
+                              noise=noise)
+        if name == 'Heading':
+            array %= 360
+        param = P(name, mask_array(array, mask_density),
+                  frequency=frequency, offset=offset)
+        param.units = units
+        params.append(param)
+
+    # Radio altimeters do not measure above 5000 ft.
+    offset = np.random.rand() / 4
+    altitude_radio = profile_array(PROFILE['Altitude STD'][0], duration, 4,
+                                   offset=offset, noise=1)
+    altitude_radio = mask_array(altitude_radio, mask_density)
+    altitude_radio[altitude_radio > 5000] = np.ma.masked
+    params.append(P('Altitude Radio', altitude_radio, frequency=4,
+                    offset=offset))
+    params[-1].units = 'ft'
+
+    offset = np.random.rand()
+    altitude = profile_array(PROFILE['Altitude STD'][0], duration, 1,
+                             offset=offset)
+    gear_down = mask_array((altitude < 2000).astype(int), mask_density)
+    params.append(M('Gear Down', gear_down, frequency=1, offset=offset,
+                    values_mapping={0: 'Up', 1: 'Down'}))
+
+    for index in range(parameter_count - len(params)):
+        frequency = frequencies[index % len(frequencies)]
+        array = random_walk(int(duration * frequency))
+        params.append(P('Synthetic Parameter %d' % (index + 1),
+                        mask_array(array, mask_density), frequency=frequency,
+                        offset=np.random.rand() / frequency))
+    return params
+
+
+def create_flight(hdf_path, duration=3600, parameter_count=50,
+                  frequencies=(1, 2, 4, 8, 16), mask_density=0.001, seed=0):
+    '''
+    Create an HDF file containing a synthetic flight. See
+    synthetic_parameters for a description of the arguments.
+
+    :param hdf_path: Path of the HDF file to create. An existing file is overwritten.
+    :type hdf_path: str
+    :returns: Names of the parameters within the HDF file.
+    :rtype: [str]
+    '''
+    params = synthetic_parameters(duration=duration,
+                                  parameter_count=parameter_count,
+                                  frequencies=frequencies,
+                                  mask_density=mask_density, seed=seed)
+    # Create an empty file for hdf_file to open.
+    h5py.File(hdf_path, 'w').close()
+    with hdf_file(hdf_path) as hdf:
+        hdf.duration = duration
+        hdf.superframe_present = False
+        hdf.reliable_frame_counter = False
+        for param in params:
+            hdf.set_param(param)
+    return [p.name for p in params]
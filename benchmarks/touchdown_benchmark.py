@@ -0,0 +1,104 @@
+'''
+Compare the performance of touchdown_inertial against the previous
+implementation which integrated the smoothed height one sample at a time.
+
+touchdown_inertial estimates the point of touchdown and the rate of descent
+at touchdown for aircraft without weight on wheels switches. Landing phases
+of a range of durations are timed as the integration covers the whole
+landing phase.
+'''
+import numpy as np
+
+from analysis_engine.library import (
+    index_at_value,
+    np_ma_zeros_like,
+    repair_mask,
+    touchdown_inertial,
+)
+from analysis_engine.node import P, Section
+
+from benchmarks import compare_legacy, print_comparison
+
+
+GROUP = 'touchdown'
+
+FREQUENCY = 8.0
+
+# Durations of the landing phase in seconds.
+DURATIONS = (60, 600, 3600)
+
+
+def legacy_touchdown_inertial(land, roc, alt):
+    '''
+    Previous implementation of touchdown_inertial. Only used to benchmark and
+    verify touchdown_inertial.
+    '''
+    tau = 1/6.0
+    startpoint = land.start_edge
+    endpoint = land.stop_edge
+    sm_ht = np_ma_zeros_like(roc.array[startpoint:endpoint])
+    my_roc = repair_mask(roc.array[startpoint:endpoint])
+    my_alt = repair_mask(alt.array[startpoint:endpoint])
+    sm_ht[0] = alt.array[startpoint]
+    for i in range(1, len(sm_ht)):
+        sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + my_roc[i]/60.0/roc.hz
+    index = index_at_value(sm_ht, 0.0)
+    if index:
+        return index + startpoint, my_roc[int(index)]
+    else:
+        return None, None
+
+
+def _landing(duration):
+    '''
+    :returns: Landing section, Vertical Speed Inertial and Altitude AAL for a descent at 600 fpm which touches down two thirds of the way through the landing phase.
+    :rtype: (Section, P, P)
+    '''
+    length = int(duration * FREQUENCY)
+    seconds = np.arange(length) / FREQUENCY
+    touchdown = duration * 2 / 3.0
+    altitude = np.ma.maximum((touchdown - seconds) * 10.0, 0.0)
+    altitude += np.random.randn(length) * 0.5
+    roc = np.ma.where(seconds < touchdown, -600.0, 0.0)
+    roc += np.random.randn(length) * 20.0
+    roc[np.random.rand(length) < 0.01] = np.ma.masked
+    return (Section('Landing', slice(0, length), 0, length),
+            P('Vertical Speed Inertial', roc, frequency=FREQUENCY),
+            P('Altitude AAL', altitude, frequency=FREQUENCY))
+
+
+def _same_touchdown(result, expected):
+    # Summation order differs so the index may differ by rounding.
+    return (result.value == expected[1] and
+            abs(result.index - expected[0]) < 1e-6)
+
+
+def cases():
+    '''
+    :returns: Cases for compare_legacy.
+    :rtype: iterator of (str, callable, callable, callable)
+    '''
+    np.random.seed(0)
+    for duration in DURATIONS:
+        land, roc, alt = _landing(duration)
+        yield ('%ds landing' % duration,
+               lambda: legacy_touchdown_inertial(land, roc, alt),
+               lambda: touchdown_inertial(land, roc, alt), _same_touchdown)
+
+
+def run(repeat=3):
+    '''
+    :param repeat: Number of repetitions of each benchmark.
+    :type repeat: int
+    :returns: Result of each case. See benchmarks.compare_legacy.
+    :rtype: [OrderedDict]
+    '''
+    return compare_legacy(GROUP, cases(), repeat=repeat)
+
+
+def main():
+    print_comparison(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -31,7 +31,7 @@ setup(
     platforms=pkg.__platforms__,
     license=pkg.__license__,
     keywords=pkg.__keywords__,
-    packages=find_packages(exclude=('tests',)),
+    packages=find_packages(exclude=('tests', 'benchmarks')),
     include_package_data=True,
     zip_safe=False,
     install_requires=requirements.install_requires,
@@ -44,6 +44,8 @@ setup(
         'console_scripts': [
             'FlightDataSplitter = analysis_engine.split_hdf_to_segments:main',
             'FlightDataAnalyzer = analysis_engine.process_flight:main',
+            'FlightDataBatchAnalyzer = analysis_engine.process_batch:main',
+            'FlightDataAPISnapshot = analysis_engine.api_snapshot:main',
         ],
         'gui_scripts' : [],
     },
@@ -1,22 +1,38 @@
+import BaseHTTPServer
+import SocketServer
 import httplib2
+import numpy as np
+import shutil
 import simplejson
 import socket
+import tempfile
+import threading
+import time
 import unittest
 
 from mock import Mock, patch
 
+from analysis_engine import settings
 from analysis_engine.api_handler import (
     APIConnectionError,
     APIError,
     APIHandlerHTTP,
+    CACHE_NOT_FOUND,
+    CACHE_OK,
+    HTTPConnectionPool,
     InvalidAPIInputError,
     NotFoundError,
-    UnknownAPIError
+    ResponseCache,
+    UnknownAPIError,
+    clear_api_handlers,
+    get_api_handler,
 )
 from analysis_engine.api_handler_analysis_engine import (
     AnalysisEngineAPIHandlerHTTP,
     AnalysisEngineAPIHandlerLocal,
+    LocationIndex,
 )
+from analysis_engine.library import bearing_and_distance
 
 
 class APIHandlerHTTPTest(unittest.TestCase):
@@ -52,6 +68,46 @@ class APIHandlerHTTPTest(unittest.TestCase):
         http_request_patched.side_effect = httplib2.ServerNotFoundError()
         self.assertRaises(APIConnectionError, handler._request, url)
     
+    @patch('analysis_engine.api_handler.httplib2.Http.request',
+           autospec=True)
+    def test__request_keep_alive(self, http_request_patched):
+        '''
+        Test that the HTTP client and its connections are reused.
+        '''
+        handler = APIHandlerHTTP()
+        http_request_patched.return_value = {'status': 200}, '{}'
+        handler._request('www.testcase.com')
+        handler._request('www.testcase.com')
+        first, second = [c[0][0] for c in http_request_patched.call_args_list]
+        self.assertTrue(first is second)
+        # Clients are not reused after connection errors.
+        http_request_patched.side_effect = socket.error()
+        self.assertRaises(APIConnectionError, handler._request,
+                          'www.testcase.com')
+        http_request_patched.side_effect = None
+        handler._request('www.testcase.com')
+        third, fourth = [c[0][0] for c in
+                         http_request_patched.call_args_list[2:]]
+        self.assertTrue(third is first)
+        self.assertFalse(fourth is first)
+
+    @patch('analysis_engine.api_handler.httplib2.Http.request',
+           autospec=True)
+    def test__request_timeout(self, http_request_patched):
+        '''
+        Test that the timeout is applied to the client rather than the
+        process-wide socket default.
+        '''
+        handler = APIHandlerHTTP()
+        default_timeout = socket.getdefaulttimeout()
+        timeouts = []
+        http_request_patched.side_effect = lambda http, *args: (
+            timeouts.append((http.timeout, socket.getdefaulttimeout())) or
+            ({'status': 200}, '{}'))
+        handler._request('www.testcase.com', timeout=7)
+        self.assertEqual(timeouts, [(7, default_timeout)])
+        self.assertEqual(socket.getdefaulttimeout(), default_timeout)
+
     def test__attempt_request(self):
         handler = APIHandlerHTTP(attempts=3)
         handler._request = Mock()
@@ -130,6 +186,341 @@ class APIHandlerHTTPTest(unittest.TestCase):
         # TODO: Test GET parameters.
 
 
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_lru(self):
+        cache = ResponseCache(size=2)
+        cache.set('a', (CACHE_OK, '1'), 60)
+        cache.set('b', (CACHE_OK, '2'), 60)
+        self.assertEqual(cache.get('a'), (CACHE_OK, '1'))
+        cache.set('c', (CACHE_NOT_FOUND, 'Missing'), 60)
+        # The least recently used entry is evicted.
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), (CACHE_OK, '1'))
+        self.assertEqual(cache.get('c'), (CACHE_NOT_FOUND, 'Missing'))
+        cache.clear()
+        self.assertEqual(cache.get('a'), None)
+
+    def test_ttl(self):
+        cache = ResponseCache(directory=self.tempdir)
+        with patch('analysis_engine.api_handler.time.time', return_value=100):
+            cache.set('a', (CACHE_OK, '1'), 60)
+        with patch('analysis_engine.api_handler.time.time', return_value=159):
+            self.assertEqual(cache.get('a'), (CACHE_OK, '1'))
+        with patch('analysis_engine.api_handler.time.time', return_value=160):
+            self.assertEqual(cache.get('a'), None)
+
+    def test_disk(self):
+        cache = ResponseCache(directory=self.tempdir)
+        cache.set('http://api/airport/1/', (CACHE_OK, '{"id": 1}'), 60)
+        # Entries stored on disk are reused by other caches.
+        cache = ResponseCache(size=0, directory=self.tempdir)
+        self.assertEqual(cache.get('http://api/airport/1/'),
+                         (CACHE_OK, '{"id": 1}'))
+        self.assertEqual(cache.get('http://api/airport/2/'), None)
+
+
+class _StubAPIRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Responds to requests with the responses of the server's routes.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            responses = self.server.routes.get(path, [(404, {'error': ''})])
+            # The last response is repeated.
+            status, body = responses.pop(0) if len(responses) > 1 \
+                else responses[0]
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        content = simplejson.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubAPIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class APIHandlerHTTPCacheTest(unittest.TestCase):
+    '''
+    Test the response cache against a stub API server.
+    '''
+    def setUp(self):
+        self.server = _StubAPIServer(('127.0.0.1', 0),
+                                     _StubAPIRequestHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.delay = 0
+        self.server.routes = {
+            '/api/aircraft/G-ABCD/': [(200, {'aircraft': {'id': 1}})],
+            '/api/airport/EGLL/': [(200, {'airport': {'id': 2383}})],
+        }
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        base_url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        self.patches = [patch.object(settings, 'BASE_URL', base_url)]
+        for patched in self.patches:
+            patched.start()
+        self.handler = AnalysisEngineAPIHandlerHTTP(attempts=3,
+                                                    cache=ResponseCache())
+
+    def tearDown(self):
+        for patched in self.patches:
+            patched.stop()
+        self.handler.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cache(self):
+        aircraft = self.handler.get_aircraft('G-ABCD')
+        self.assertEqual(aircraft, {'id': 1})
+        aircraft['id'] = 5
+        # The cached response is not modified by the caller.
+        self.assertEqual(self.handler.get_aircraft('G-ABCD'), {'id': 1})
+        self.assertEqual(len(self.server.requests), 1)
+        # Responses of endpoints which are not cached.
+        with patch.object(settings, 'API_CACHE_TTLS', {}):
+            self.handler.get_aircraft('G-ABCD')
+        self.assertEqual(len(self.server.requests), 2)
+        # Requests are made again once the response has expired.
+        with patch('analysis_engine.api_handler.time.time',
+                   return_value=time.time() + 2 * 24 * 60 * 60):
+            self.handler.get_aircraft('G-ABCD')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_not_found(self):
+        self.assertRaises(NotFoundError, self.handler.get_airport, 'XXXX')
+        self.assertRaises(NotFoundError, self.handler.get_airport, 'XXXX')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_coalescing(self):
+        self.server.delay = 0.2
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.handler.get_airport('EGLL')))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [{'id': 2383}] * 5)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_backoff(self):
+        self.server.routes['/api/aircraft/G-ABCD/'] = [
+            (500, {'error': 'Unavailable'}), (500, {'error': 'Unavailable'}),
+            (200, {'aircraft': {'id': 1}})]
+        handler = AnalysisEngineAPIHandlerHTTP(attempts=3, delay=1,
+                                               cache=ResponseCache())
+        with patch('analysis_engine.api_handler.time.sleep') as sleep:
+            self.assertEqual(handler.get_aircraft('G-ABCD'), {'id': 1})
+        self.assertEqual(sleep.call_args_list, [((1,), {}), ((2,), {})])
+        self.assertEqual(len(self.server.requests), 3)
+        # Delays are limited to max_delay and there is no delay after the
+        # last attempt.
+        self.server.routes['/api/aircraft/G-ABCD/'] = [
+            (500, {'error': 'Unavailable'})]
+        handler = AnalysisEngineAPIHandlerHTTP(attempts=4, delay=1,
+                                               max_delay=3,
+                                               cache=ResponseCache())
+        with patch('analysis_engine.api_handler.time.sleep') as sleep:
+            self.assertRaises(UnknownAPIError, handler.get_aircraft,
+                              'G-ABCD')
+        self.assertEqual(sleep.call_args_list,
+                         [((1,), {}), ((2,), {}), ((3,), {})])
+        handler.close()
+
+    def test_batch(self):
+        self.server.delay = 0.3
+        self.server.routes['/api/airport/nearest.json'] = [
+            (200, {'airport': {'id': 2383}})]
+        start = time.time()
+        airports = self.handler.get_nearest_airports(
+            [(51.47, -0.46), (51.15, -0.18), (51.88, 0.23)])
+        # The requests are made concurrently.
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual(airports, [{'id': 2383}] * 3)
+        self.assertEqual(len(self.server.requests), 3)
+        # Runways which are not found are None.
+        self.server.routes['/api/airport/2383/runway/nearest.json'] = [
+            (200, {'runway': {'identifier': '09L', 'end': {'latitude': 51}}})]
+        runways = self.handler.get_nearest_runways([
+            {'airport': 2383, 'heading': 90}, {'airport': 1, 'heading': 90}])
+        self.assertEqual(runways, [{'identifier': '09L',
+                                    'end': {'latitude': 51}}, None])
+        self.assertEqual(self.handler.get_nearest_airports([]), [])
+        # Other errors are raised.
+        self.server.routes['/api/airport/nearest.json'] = [
+            (500, {'error': 'Unavailable'})]
+        handler = AnalysisEngineAPIHandlerHTTP(attempts=1,
+                                               cache=ResponseCache())
+        self.assertRaises(UnknownAPIError, handler.get_nearest_airports,
+                          [(51.47, -0.46)])
+        handler.close()
+
+
+class HTTPConnectionPoolTest(unittest.TestCase):
+    def test_acquire_release(self):
+        pool = HTTPConnectionPool(size=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertFalse(first is second)
+        self.assertTrue(isinstance(first, httplib2.Http))
+        pool.release(first)
+        self.assertTrue(pool.acquire() is first)
+        # Clients are kept separately for each timeout.
+        pool.release(first)
+        self.assertFalse(pool.acquire(timeout=5) is first)
+        self.assertTrue(pool.acquire() is first)
+
+    def test_release_full(self):
+        pool = HTTPConnectionPool(size=1)
+        first = pool.acquire()
+        second = pool.acquire()
+        connection = Mock()
+        second.connections['http:www.testcase.com'] = connection
+        pool.release(first)
+        pool.release(second)
+        connection.close.assert_called_once_with()
+        self.assertTrue(pool.acquire() is first)
+
+    def test_fork(self):
+        pool = HTTPConnectionPool()
+        http = pool.acquire()
+        pool.release(http)
+        with patch('analysis_engine.api_handler.os.getpid',
+                   return_value=-1):
+            self.assertFalse(pool.acquire() is http)
+
+    def test_close(self):
+        pool = HTTPConnectionPool()
+        http = pool.acquire()
+        connection = Mock()
+        http.connections['http:www.testcase.com'] = connection
+        pool.release(http)
+        pool.close()
+        connection.close.assert_called_once_with()
+        self.assertFalse(pool.acquire() is http)
+
+
+class GetAPIHandlerTest(unittest.TestCase):
+    def setUp(self):
+        clear_api_handlers()
+
+    def tearDown(self):
+        clear_api_handlers()
+
+    def test_get_api_handler(self):
+        path = 'analysis_engine.api_handler_analysis_engine.' \
+            'AnalysisEngineAPIHandlerHTTP'
+        handler = get_api_handler(path, attempts=2)
+        self.assertTrue(isinstance(handler, AnalysisEngineAPIHandlerHTTP))
+        self.assertEqual(handler.attempts, 2)
+        self.assertTrue(get_api_handler(path, attempts=2) is handler)
+        self.assertFalse(get_api_handler(path, attempts=3) is handler)
+        self.assertFalse(get_api_handler(path) is handler)
+
+    def test_get_api_handler_unhashable(self):
+        path = 'analysis_engine.api_handler_analysis_engine.' \
+            'AnalysisEngineAPIHandlerHTTP'
+        handler = get_api_handler(path, [3])
+        self.assertEqual(handler.attempts, [3])
+        self.assertFalse(get_api_handler(path, [3]) is handler)
+
+    def test_clear_api_handlers(self):
+        path = 'analysis_engine.api_handler_analysis_engine.' \
+            'AnalysisEngineAPIHandlerHTTP'
+        handler = get_api_handler(path)
+        with patch.object(handler, 'close') as close:
+            clear_api_handlers()
+        close.assert_called_once_with()
+        self.assertFalse(get_api_handler(path) is handler)
+
+
+class LocationIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.latitudes = [51.0, 52.0, 51.0, -33.9, 0.0]
+        self.longitudes = [-1.0, 0.5, -1.0, 151.2, 179.9]
+        self.index = LocationIndex(self.latitudes, self.longitudes)
+
+    def test_nearest(self):
+        index, distance = self.index.nearest(51.9, 0.4)
+        self.assertEqual(index, 1)
+        self.assertEqual(distance,
+                         bearing_and_distance(51.9, 0.4, 52.0, 0.5)[1])
+        # Nearest across the antimeridian.
+        self.assertEqual(self.index.nearest(0.1, -179.9)[0], 4)
+        # The first of equally near locations.
+        self.assertEqual(self.index.nearest(51.0, -1.0), (0, 0.0))
+
+    def test_nearest_accept(self):
+        accept = np.array([False, False, True, True, False])
+        self.assertEqual(self.index.nearest(51.9, 0.4, accept)[0], 2)
+        self.assertEqual(self.index.nearest(0.1, -179.9, accept)[0], 3)
+        self.assertEqual(self.index.nearest(0, 0, np.zeros(5, dtype=bool)),
+                         None)
+        # Searching the tree when many locations are accepted.
+        np.random.seed(0)
+        latitudes = np.random.uniform(-90, 90, 500)
+        longitudes = np.random.uniform(-180, 180, 500)
+        index = LocationIndex(latitudes, longitudes)
+        accept = np.random.rand(500) < 0.2
+        distances = [bearing_and_distance(10, 20, lat, lon)[1] for lat, lon
+                     in zip(latitudes[accept], longitudes[accept])]
+        self.assertEqual(index.nearest(10, 20, accept),
+                         (np.flatnonzero(accept)[np.argmin(distances)],
+                          min(distances)))
+
+    def test_within(self):
+        for distance in (100000, 150000, 20000000):
+            self.assertEqual(
+                self.index.within(51.0, -1.0, distance).tolist(),
+                [bearing_and_distance(51.0, -1.0, lat, lon)[1] <= distance
+                 for lat, lon in zip(self.latitudes, self.longitudes)])
+        self.assertEqual(LocationIndex([], []).within(52.1, 0.6, 1000).tolist(),
+                         [])
+
+    def test_nearest_many(self):
+        np.random.seed(0)
+        latitudes = np.random.uniform(-90, 90, 500)
+        longitudes = np.random.uniform(-180, 180, 500)
+        # More equally near locations than are searched for at first.
+        latitudes[100:130] = 10.0
+        longitudes[100:130] = 20.0
+        index = LocationIndex(latitudes, longitudes)
+        lats = [10.0, 51.9, -33.0] + np.random.uniform(-90, 90, 20).tolist()
+        lons = [20.0, 0.4, 150.0] + np.random.uniform(-180, 180, 20).tolist()
+        nearest = index.nearest_many(lats, lons)
+        self.assertEqual(nearest[0], (100, 0.0))
+        self.assertEqual(nearest, [index.nearest(lat, lon)
+                                   for lat, lon in zip(lats, lons)])
+        self.assertEqual(self.index.nearest_many([51.0], [-1.0]),
+                         [(0, 0.0)])
+        self.assertEqual(index.nearest_many([], []), [])
+
+    def test_empty(self):
+        index = LocationIndex([], [])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.nearest(51.0, -1.0), None)
+        self.assertEqual(index.nearest_many([51.0], [-1.0]), [None])
+
+
 class AnalysisEngineAPIHandlerLocalTest(unittest.TestCase):
     def setUp(self):
         self.handler = AnalysisEngineAPIHandlerLocal()
@@ -169,3 +560,117 @@ class AnalysisEngineAPIHandlerLocalTest(unittest.TestCase):
         self.assertEqual(runway['distance'], 20972.761983734454)
         del runway['distance']
         self.assertEqual(runway, self.handler.runways[1])
+
+    def test_get_nearest_runway_airport(self):
+        # The runway of the airport rather than the nearest runway.
+        runway = self.handler.get_nearest_runway(2456, 34, latitude=60,
+                                                 longitude=11)
+        self.assertEqual(runway['id'], 8127)
+        # The location of the airport is used without coordinates.
+        runway = self.handler.get_nearest_runway('OSL', 14)
+        self.assertEqual(runway['id'], 8151)
+        self.assertRaises(NotFoundError, self.handler.get_nearest_runway,
+                          None, 14)
+        self.assertRaises(NotFoundError, self.handler.get_nearest_runway,
+                          'XXX', 14)
+
+    def test_get_nearest_runway_heading_and_ils_freq(self):
+        runway_04 = self.handler.runways[0]
+        self.handler.runways.append({
+            'id': 8128,
+            'identifier': '22',
+            'start': runway_04['end'],
+            'end': runway_04['start'],
+            'localizer': {'frequency': 109900.0},
+            'magnetic_heading': 213.9,
+        })
+        self.handler._build_indexes()
+        # Nearest to the start of runway 04.
+        kwargs = {'latitude': 58.1967, 'longitude': 8.0754}
+        self.assertEqual(
+            self.handler.get_nearest_runway(2456, None, **kwargs)['id'], 8127)
+        self.assertEqual(
+            self.handler.get_nearest_runway(2456, 214, **kwargs)['id'], 8128)
+        self.assertEqual(self.handler.get_nearest_runway(
+            2456, None, ils_freq=109.9, **kwargs)['id'], 8128)
+        # The heading is preferred to the ILS frequency.
+        self.assertEqual(self.handler.get_nearest_runway(
+            2456, 34, ils_freq=109.9, **kwargs)['id'], 8127)
+        # Filters are ignored when no runway of the airport matches them.
+        self.assertEqual(self.handler.get_nearest_runway(
+            2456, 300, ils_freq=108.1, **kwargs)['id'], 8127)
+        # Heading and ILS frequency are not used without the airport.
+        self.assertEqual(
+            self.handler.get_nearest_runway(None, 214, **kwargs)['id'], 8127)
+
+    def test_get_nearest_airports(self):
+        coordinates = [(58, 8), (60, 11), (58, 8)]
+        self.assertEqual(self.handler.get_nearest_airports(coordinates),
+                         [self.handler.get_nearest_airport(lat, lon)
+                          for lat, lon in coordinates])
+        self.assertEqual(self.handler.get_nearest_airports([]), [])
+
+    def test_get_nearest_runways(self):
+        queries = [
+            {'airport': 2456, 'heading': 34, 'latitude': 60, 'longitude': 11},
+            {'airport': 'OSL', 'heading': 14},
+            {'airport': 'XXX', 'heading': 14},
+            {'airport': 'OSL', 'heading': 14},
+        ]
+        runways = self.handler.get_nearest_runways(queries)
+        self.assertEqual([runway and runway['id'] for runway in runways],
+                         [8127, 8151, None, 8151])
+        self.assertEqual(runways[0], self.handler.get_nearest_runway(
+            2456, 34, latitude=60, longitude=11))
+        # Runways of identical queries are separate copies.
+        self.assertFalse(runways[1] is runways[3])
+
+    def test_get_nearest_runway_close_airports(self):
+        # The start of runway 09 is nearer to the heliport than its airport.
+        self.handler.airports = [
+            {'id': 1, 'code': {'icao': 'AAAA'}, 'latitude': 51.4700,
+             'longitude': -0.4543},
+            {'id': 2, 'code': {'icao': 'HHHH'}, 'latitude': 51.4780,
+             'longitude': -0.4900},
+        ]
+        self.handler.runways = [
+            {'id': 9, 'identifier': '09', 'magnetic_heading': 90.0,
+             'start': {'latitude': 51.4775, 'longitude': -0.4850},
+             'end': {'latitude': 51.4775, 'longitude': -0.4330}},
+            {'id': 27, 'identifier': '27', 'magnetic_heading': 270.0,
+             'start': {'latitude': 51.4775, 'longitude': -0.4330},
+             'end': {'latitude': 51.4775, 'longitude': -0.4850}},
+        ]
+        self.handler._build_indexes()
+        self.assertEqual(self.handler.get_nearest_runway(
+            1, 90.0, latitude=51.4775, longitude=-0.47)['identifier'], '09')
+        self.assertEqual(self.handler.get_nearest_runway(
+            'AAAA', 270.0, latitude=51.4775, longitude=-0.47)['identifier'],
+            '27')
+        # The nearest of the airport's runways when none of them match the
+        # heading.
+        self.assertEqual(self.handler.get_nearest_runway(
+            1, 180.0, latitude=51.4775, longitude=-0.48)['identifier'], '09')
+        self.assertEqual(self.handler.get_nearest_runway(
+            1, 180.0, latitude=51.4775, longitude=-0.44)['identifier'], '27')
+
+    def test_get_nearest_runway_no_heading_match(self):
+        # Runway 18 belongs to another airport about 20km away.
+        self.handler.airports = [
+            {'id': 1, 'code': {'icao': 'AAAA'}, 'latitude': 51.4700,
+             'longitude': -0.4543},
+            {'id': 2, 'code': {'icao': 'BBBB'}, 'latitude': 51.6500,
+             'longitude': -0.4543},
+        ]
+        self.handler.runways = [
+            {'id': 9, 'identifier': '09', 'magnetic_heading': 90.0,
+             'start': {'latitude': 51.4700, 'longitude': -0.4800},
+             'end': {'latitude': 51.4700, 'longitude': -0.4300}},
+            {'id': 18, 'identifier': '18', 'magnetic_heading': 180.0,
+             'start': {'latitude': 51.6600, 'longitude': -0.4543},
+             'end': {'latitude': 51.6400, 'longitude': -0.4543}},
+        ]
+        self.handler._build_indexes()
+        runway = self.handler.get_nearest_runway(
+            1, 180.0, latitude=51.5700, longitude=-0.4543)
+        self.assertEqual(runway['identifier'], '09')
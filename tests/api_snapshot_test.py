@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from mock import patch
+
+from analysis_engine import settings
+from analysis_engine.api_handler_analysis_engine import (
+    AnalysisEngineAPIHandlerLocal,
+)
+from analysis_engine.api_snapshot import (
+    CodeLookup,
+    MAGIC,
+    Snapshot,
+    SnapshotError,
+    airport_columns,
+    compile_snapshot,
+    runway_columns,
+    write_snapshot,
+)
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'local_api.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_compile_snapshot(self):
+        handler = AnalysisEngineAPIHandlerLocal()
+        compile_snapshot(self.path)
+        snapshot = Snapshot(self.path)
+        self.assertEqual(list(snapshot.airports), handler.airports)
+        self.assertEqual(list(snapshot.runways), handler.runways)
+        self.assertEqual(dict(snapshot.aircraft.items()), handler.aircraft)
+        self.assertEqual(dict(snapshot.exports.items()), handler.exports)
+        self.assertEqual(os.listdir(self.tempdir), ['local_api.snapshot'])
+
+    def test_write_snapshot_concurrent(self):
+        # Each write has its own temporary file.
+        temp_paths = []
+        mkstemp = tempfile.mkstemp
+        def record_mkstemp(*args, **kwargs):
+            fd, temp_path = mkstemp(*args, **kwargs)
+            temp_paths.append(temp_path)
+            return fd, temp_path
+        with patch('analysis_engine.api_snapshot.tempfile.mkstemp',
+                   side_effect=record_mkstemp):
+            write_snapshot(self.path, {}, [], [], {})
+            write_snapshot(self.path, {}, [], [], {})
+        self.assertEqual(len(set(temp_paths)), 2)
+        self.assertTrue(all(os.path.dirname(p) == self.tempdir
+                            for p in temp_paths))
+        self.assertEqual(os.listdir(self.tempdir), ['local_api.snapshot'])
+        # The temporary file is removed if writing fails.
+        with patch('analysis_engine.api_snapshot.os.rename',
+                   side_effect=OSError):
+            self.assertRaises(OSError, write_snapshot, self.path, {}, [], [],
+                              {})
+        self.assertEqual(os.listdir(self.tempdir), ['local_api.snapshot'])
+
+    def test_records(self):
+        airports = [
+            {'id': 1, 'code': {'icao': 'EGLL'}, 'latitude': 51.5,
+             'longitude': -0.5, 'name': u'Z\xfcrich', 'big': 2 ** 70},
+            {'id': 2, 'code': {'icao': 'EGKK'}, 'tuple': (1, [True, None])},
+        ]
+        write_snapshot(self.path, {'G-ABCD': {'Family': 'B737'}}, airports,
+                       [], {'G-ABCD': None})
+        snapshot = Snapshot(self.path)
+        self.assertEqual(len(snapshot.airports), 2)
+        self.assertEqual(snapshot.airports[0], airports[0])
+        self.assertTrue(isinstance(snapshot.airports[0]['name'], unicode))
+        # Tuples are stored as lists.
+        self.assertEqual(snapshot.airports[-1]['tuple'], [1, [True, None]])
+        # Records are decoded once.
+        self.assertTrue(snapshot.airports[0] is snapshot.airports[0])
+        self.assertRaises(IndexError, snapshot.airports.__getitem__, 2)
+        self.assertEqual(len(snapshot.runways), 0)
+        self.assertEqual(snapshot.aircraft['G-ABCD'], {'Family': 'B737'})
+        self.assertEqual(snapshot.exports['G-ABCD'], None)
+        self.assertRaises(KeyError, snapshot.aircraft.__getitem__, 'G-XXXX')
+        self.assertFalse(None in snapshot.aircraft)
+        self.assertFalse(snapshot.airport_columns()['latitude'].flags.writeable)
+
+    def test_unsupported_values(self):
+        self.assertRaises(SnapshotError, write_snapshot, self.path, {},
+                          [{'date': object()}], [], {})
+        self.assertRaises(SnapshotError, write_snapshot, self.path, {1: {}},
+                          [], [], {})
+
+    def test_invalid_snapshot(self):
+        with open(self.path, 'wb') as snapshot_file:
+            snapshot_file.write('- not a snapshot\n' * 10)
+        self.assertRaises(SnapshotError, Snapshot, self.path)
+        with open(self.path, 'wb') as snapshot_file:
+            snapshot_file.write(struct.pack('<8sII', MAGIC, 999, 2) + '{}')
+        self.assertRaises(SnapshotError, Snapshot, self.path)
+
+    def test_local_handler(self):
+        handler = AnalysisEngineAPIHandlerLocal()
+        compile_snapshot(self.path)
+        with patch.object(settings, 'LOCAL_API_SNAPSHOT_PATH', self.path):
+            snapshot_handler = AnalysisEngineAPIHandlerLocal()
+        self.assertEqual(snapshot_handler.get_aircraft('G-FDSL'),
+                         handler.get_aircraft('G-FDSL'))
+        self.assertEqual(snapshot_handler.get_data_exports('G-FDSL'),
+                         handler.get_data_exports('G-FDSL'))
+        self.assertEqual(snapshot_handler.get_airport('OSL'),
+                         handler.get_airport('OSL'))
+        self.assertEqual(snapshot_handler.get_nearest_airport(58, 8),
+                         handler.get_nearest_airport(58, 8))
+        self.assertEqual(
+            snapshot_handler.get_nearest_runway(2461, 14, latitude=60,
+                                                longitude=11),
+            handler.get_nearest_runway(2461, 14, latitude=60, longitude=11))
+
+
+class ColumnsTest(unittest.TestCase):
+    def test_airport_columns(self):
+        columns = airport_columns([
+            {'id': 7, 'code': {'iata': 'KRS', 'icao': 'ENCN'},
+             'latitude': 58.2, 'longitude': 8.1},
+            {'id': 3, 'code': {'iata': 'OSL'}},
+            {'id': 7, 'code': {'icao': u'ENGM'}},
+        ])
+        np.testing.assert_array_equal(columns['latitude'], [58.2, np.nan,
+                                                            np.nan])
+        self.assertEqual(columns['int_codes'].tolist(), [3, 7, 7])
+        self.assertEqual(columns['int_positions'].tolist(), [1, 0, 2])
+        self.assertEqual(columns['str_codes'].tolist(),
+                         ['ENCN', 'ENGM', 'KRS', 'OSL'])
+        self.assertEqual(columns['str_positions'].tolist(), [0, 2, 0, 1])
+
+    def test_runway_columns(self):
+        columns = runway_columns([
+            {'start': {'latitude': 1.0, 'longitude': 2.0},
+             'end': {'latitude': 3.0, 'longitude': 4.0},
+             'magnetic_heading': 90.0, 'localizer': {'frequency': 110300.0}},
+            {'end': {'latitude': 3.0, 'longitude': 4.0}},
+            {'start': None},
+        ])
+        np.testing.assert_array_equal(columns['latitude'], [1.0, 3.0, np.nan])
+        np.testing.assert_array_equal(columns['longitude'], [2.0, 4.0, np.nan])
+        np.testing.assert_array_equal(columns['magnetic_heading'],
+                                      [90.0, np.nan, np.nan])
+        np.testing.assert_array_equal(columns['ils_freq'],
+                                      [110300.0, np.nan, np.nan])
+
+    def test_code_lookup(self):
+        columns = airport_columns([
+            {'id': 2456, 'code': {'iata': 'KRS', 'icao': 'ENCN'}},
+            {'id': 2461, 'code': {'iata': 'OSL', 'icao': 'ENGM'}},
+            {'id': 2462, 'code': {'iata': 'OSL'}},
+        ])
+        lookup = CodeLookup(columns['int_codes'], columns['int_positions'],
+                            columns['str_codes'], columns['str_positions'])
+        self.assertEqual(lookup.get(2461), 1)
+        self.assertEqual(lookup.get(2461.0), 1)
+        self.assertEqual(lookup.get('ENCN'), 0)
+        self.assertEqual(lookup.get(u'KRS'), 0)
+        # The first airport with the code.
+        self.assertEqual(lookup.get('OSL'), 1)
+        self.assertEqual(lookup.get('ENCNX'), None)
+        self.assertEqual(lookup.get(1), None)
+        self.assertEqual(lookup.get(None), None)
+        self.assertEqual(lookup.get({}), None)
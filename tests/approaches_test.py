@@ -1,7 +1,7 @@
 import numpy as np
 import unittest
 
-from mock import call, Mock, patch
+from mock import Mock, patch
 
 from analysis_engine.approaches import ApproachInformation
 from analysis_engine.flight_phase import ApproachAndLanding
@@ -19,8 +19,9 @@ class TestApproachInformation(unittest.TestCase):
     @patch('analysis_engine.api_handler_analysis_engine.AnalysisEngineAPIHandlerLocal.get_nearest_airport')
     def test_derive(self, get_nearest_airport, get_nearest_runway):
         approaches = ApproachInformation()
-        approaches._lookup_airport_and_runway = Mock()
-        approaches._lookup_airport_and_runway.return_value = [None, None]
+        approaches._lookup_airports_and_runways = Mock()
+        approaches._lookup_airports_and_runways.side_effect = \
+            lambda approaches: [(None, None)] * len(approaches)
 
         app = ApproachAndLanding()
 
@@ -65,6 +66,7 @@ class TestApproachInformation(unittest.TestCase):
         # No approaches if no approach sections in the flight:
         approaches.derive(app, alt_aal, fast)
         self.assertEqual(approaches, [])
+        self.assertFalse(approaches._lookup_airports_and_runways.called)
         # Test the different approach types:
         slices = [slice(0, 5), slice(10, 15), slice(20, 25)]
         app.create_phases(slices)
@@ -78,18 +80,19 @@ class TestApproachInformation(unittest.TestCase):
                           ApproachItem('LANDING', slice(20, 25))])
         #approaches.set_flight_attr.assert_called_once_with()
         #approaches.set_flight_attr.reset_mock()
-        approaches._lookup_airport_and_runway.assert_has_calls([
-            call(_slice=slices[0], appr_ils_freq=[], precise=False,
+        # The airports and runways of all approaches are looked up at once:
+        approaches._lookup_airports_and_runways.assert_called_once_with([
+            dict(_slice=slices[0], appr_ils_freq=[], precise=False,
                  lowest_lat=None, lowest_lon=None, lowest_hdg=None),
-            call(_slice=slices[1], appr_ils_freq=[], precise=False,
+            dict(_slice=slices[1], appr_ils_freq=[], precise=False,
                  lowest_lat=None, lowest_lon=None, lowest_hdg=None),
-            call(_slice=slices[2], appr_ils_freq=[], precise=False,
+            dict(_slice=slices[2], appr_ils_freq=[], precise=False,
                  lowest_lat=None, lowest_lon=None, lowest_hdg=None,
                  land_afr_apt=land_afr_apt_none,
                  land_afr_rwy=land_afr_rwy_none, hint='landing'),
         ])
         del approaches[:]
-        approaches._lookup_airport_and_runway.reset_mock()
+        approaches._lookup_airports_and_runways.reset_mock()
         # Test that landing lat/lon/hdg used for landing only, else use approach
         # lat/lon/hdg:
         approaches.derive(app, alt_aal, fast, land_hdg, land_lat, land_lon,
@@ -104,24 +107,57 @@ class TestApproachInformation(unittest.TestCase):
                                        lowest_lat=land_lat[0].value,
                                        lowest_lon=land_lon[0].value,
                                        lowest_hdg=land_hdg[0].value)])
-        approaches._lookup_airport_and_runway.assert_has_calls([
-            call(_slice=slices[0], lowest_hdg=None, lowest_lat=None,
+        approaches._lookup_airports_and_runways.assert_called_once_with([
+            dict(_slice=slices[0], lowest_hdg=None, lowest_lat=None,
                  lowest_lon=None, appr_ils_freq=[], precise=False),
-            call(_slice=slices[1], lowest_hdg=appr_hdg[1].value,
+            dict(_slice=slices[1], lowest_hdg=appr_hdg[1].value,
                  lowest_lat=None, lowest_lon=None, appr_ils_freq=[],
                  precise=False),
-            call(_slice=slices[2], lowest_hdg=land_hdg[0].value,
+            dict(_slice=slices[2], lowest_hdg=land_hdg[0].value,
                  lowest_lat=land_lat[0].value, lowest_lon=land_lon[0].value,
                  appr_ils_freq=[], precise=False,
                  land_afr_apt=land_afr_apt_none, land_afr_rwy=land_afr_rwy_none,
                  hint='landing'),
         ])
-        approaches._lookup_airport_and_runway.reset_mock()
+        approaches._lookup_airports_and_runways.reset_mock()
 
         # FIXME: Finish implementing these tests to check that using the API
         #        works correctly and any fall back values are used as
         #        appropriate.
 
+    @patch('analysis_engine.api_handler_analysis_engine.AnalysisEngineAPIHandlerLocal.get_nearest_runways')
+    @patch('analysis_engine.api_handler_analysis_engine.AnalysisEngineAPIHandlerLocal.get_nearest_airports')
+    def test_lookup_airports_and_runways(self, get_nearest_airports,
+                                         get_nearest_runways):
+        get_nearest_airports.return_value = [{'id': 1}, None]
+        get_nearest_runways.return_value = [{'ident': '04'}, None]
+        appr_ils_freq = KPV(name='ILS Frequency During Approach', items=[
+            KeyPointValue(index=12, value=110.3),
+        ])
+        land_afr_apt = A(name='AFR Landing Airport', value={'id': 25})
+        land_afr_rwy = A(name='AFR Landing Runway', value={'ident': '09L'})
+        approaches = ApproachInformation()
+        found = approaches._lookup_airports_and_runways([
+            dict(_slice=slice(0, 5), precise=False, lowest_lat=None,
+                 lowest_lon=None, lowest_hdg=25, appr_ils_freq=None),
+            dict(_slice=slice(10, 15), precise=False, lowest_lat=8,
+                 lowest_lon=4, lowest_hdg=35, appr_ils_freq=appr_ils_freq),
+            dict(_slice=slice(20, 25), precise=True, lowest_lat=10,
+                 lowest_lon=-2, lowest_hdg=60, appr_ils_freq=None,
+                 land_afr_apt=land_afr_apt, land_afr_rwy=land_afr_rwy,
+                 hint='landing'),
+        ])
+        # The AFR is used where the airport or runway is not found:
+        self.assertEqual(found, [(None, None), ({'id': 1}, {'ident': '04'}),
+                                 ({'id': 25}, {'ident': '09L'})])
+        # Each is looked up once for all approaches with coordinates:
+        get_nearest_airports.assert_called_once_with([(8, 4), (10, -2)])
+        get_nearest_runways.assert_called_once_with([
+            {'airport': 1, 'heading': 35, 'ils_freq': 110.3,
+             'hint': 'approach'},
+            {'airport': 25, 'heading': 60, 'latitude': 10, 'longitude': -2},
+        ])
+
     @unittest.skip('Test Not Implemented')
     def test_derive_afr_fallback(self):
         self.assertTrue(False, msg='Test not implemented.')    
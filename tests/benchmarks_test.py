@@ -0,0 +1,101 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import (
+    benchmark_result,
+    compare_legacy,
+    compare_results,
+    load_results,
+    same_masked_array,
+    write_results,
+)
+from benchmarks.synthetic import synthetic_parameters
+
+
+class TestSyntheticParameters(unittest.TestCase):
+    def test_synthetic_parameters(self):
+        params = synthetic_parameters(duration=600, parameter_count=20,
+                                      frequencies=(1, 16), mask_density=0.1)
+        self.assertEqual(len(params), 20)
+        names = [p.name for p in params]
+        for name in ('Airspeed', 'Altitude STD', 'Altitude Radio', 'Heading',
+                     'Gear Down', 'Synthetic Parameter 1'):
+            self.assertTrue(name in names)
+        for param in params:
+            self.assertEqual(len(param.array), 600 * param.frequency)
+            self.assertTrue(0 <= param.offset < 1 / param.frequency)
+        synthetic = params[-2:]
+        self.assertEqual([p.frequency for p in synthetic], [1, 16])
+        masked = np.ma.count_masked(synthetic[1].array) / (600 * 16.0)
+        self.assertTrue(0.05 < masked < 0.15)
+        # Flights are reproducible.
+        repeated = synthetic_parameters(duration=600, parameter_count=20,
+                                        frequencies=(1, 16), mask_density=0.1)
+        self.assertEqual(repeated[-1].array.tolist(),
+                         synthetic[-1].array.tolist())
+
+
+class TestResults(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_compare_results(self):
+        baseline = [benchmark_result('library', 'align', [1.0, 2.0]),
+                    benchmark_result('library', 'removed', [1.0]),
+                    benchmark_result('pipeline', 'process_flight', [10.0])]
+        path = os.path.join(self.tempdir, 'results.json')
+        write_results(path, baseline)
+        baseline = load_results(path)
+        self.assertEqual(baseline[0]['mean'], 1.5)
+        results = [benchmark_result('library', 'align', [1.1]),
+                   benchmark_result('library', 'added', [1.0]),
+                   benchmark_result('pipeline', 'process_flight', [13.0])]
+        self.assertEqual(compare_results(baseline, results, tolerance=0.2),
+                         [('library', 'align', 1.0, 1.1, 1.1, False),
+                          ('pipeline', 'process_flight', 10.0, 13.0, 1.3,
+                           True)])
+
+
+class TestCompareLegacy(unittest.TestCase):
+    def test_compare_legacy(self):
+        def cases():
+            for value in (1, 2):
+                # Each case is run before the next rebinds value.
+                yield ('case %d' % value, lambda: value, lambda: value, None)
+            yield 'different', lambda: 1, lambda: 2, None
+            yield ('tolerance', lambda: 1.0, lambda: 1.05,
+                   lambda result, expected: abs(result - expected) < 0.1)
+            yield 'unsupported', None, lambda: 1, None
+        results = compare_legacy('group', cases(), repeat=2)
+        self.assertEqual([r['name'] for r in results],
+                         ['case 1', 'case 2', 'different', 'tolerance',
+                          'unsupported'])
+        self.assertEqual([r['params']['same'] for r in results],
+                         [True, True, False, True, None])
+        self.assertEqual(results[0]['group'], 'group')
+        self.assertEqual(results[0]['repeat'], 2)
+        self.assertTrue(results[0]['params']['legacy'] >= 0)
+        self.assertEqual(results[-1]['params']['legacy'], None)
+
+    def test_same_masked_array(self):
+        expected = np.ma.array([1.0, 2.0, 3.0], mask=[False, True, False])
+        self.assertTrue(same_masked_array(
+            np.ma.array([1.0, 5.0, 3.0], mask=[False, True, False]),
+            expected, rtol=0, atol=0))
+        self.assertFalse(same_masked_array(
+            np.ma.array([1.0, 2.0, 3.0]), expected))
+        result = np.ma.array([1.0, 2.0, 3.0 + 1e-9], mask=[False, True, False])
+        self.assertTrue(same_masked_array(result, expected))
+        self.assertFalse(same_masked_array(result, expected, rtol=0, atol=0))
+        self.assertTrue(same_masked_array(np.ma.array([np.nan]),
+                                          np.ma.array([np.nan])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,17 @@
 import collections
+import mock
+import shutil
+import tempfile
 import unittest
 import networkx as nx
 
 from datetime import datetime
 
 from analysis_engine.node import (DerivedParameterNode, Node, NodeManager, P)
+from analysis_engine import dependency_graph, settings
 from analysis_engine.dependency_graph import (
     any_predecessors_in_requested,
+    dependency_cache_key,
     dependency_order, 
     graph_nodes, 
     graph_adjacencies,
@@ -365,6 +370,93 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
         
 
 
+class TestDependencyOrderCache(unittest.TestCase):
+    def setUp(self):
+        self.lfl_params = ['Indicated Airspeed', 'Groundspeed',
+                           'Pressure Altitude', 'Heading', 'TAT', 'Latitude',
+                           'Longitude', 'Longitudinal g', 'Lateral g',
+                           'Normal g', 'Pitch', 'Roll']
+        self.requested = ['Smoothed Track', 'Vertical Speed']
+        try:
+            # for test cmd line runners
+            self.derived = get_derived_nodes(['tests.sample_derived_parameters'])
+        except ImportError:
+            # for IDE test runners
+            self.derived = get_derived_nodes(['sample_derived_parameters'])
+        self.cache_dir = tempfile.mkdtemp()
+        dependency_graph._dependency_order_cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        dependency_graph._dependency_order_cache.clear()
+
+    def _node_mgr(self, lfl_params=None, aircraft_info={}):
+        return NodeManager(datetime.now(), 10,
+                           list(lfl_params or self.lfl_params),
+                           self.requested, [], self.derived, aircraft_info,
+                           {})
+
+    def test_dependency_cache_key(self):
+        key = dependency_cache_key(self._node_mgr())
+        self.assertEqual(key, dependency_cache_key(self._node_mgr()))
+        self.assertNotEqual(
+            key, dependency_cache_key(self._node_mgr(self.lfl_params[1:])))
+        self.assertNotEqual(
+            key, dependency_cache_key(self._node_mgr(
+                aircraft_info={'Family': 'B737'})))
+        self.assertNotEqual(key, dependency_cache_key(self._node_mgr(), True))
+
+    def test_dependency_order_cache(self):
+        order, gr_st = dependency_order(self._node_mgr(), draw=False)
+        cached_order, cached_gr_st = dependency_order(
+            self._node_mgr(), draw=False, cache=True)
+        self.assertEqual(cached_order, order)
+        with mock.patch('analysis_engine.dependency_graph.graph_nodes') \
+                as graph_nodes:
+            cached_order, cached_gr_st = dependency_order(
+                self._node_mgr(), draw=False, cache=True)
+            self.assertFalse(graph_nodes.called)
+        self.assertEqual(cached_order, order)
+        self.assertEqual(sorted(cached_gr_st.edges()), sorted(gr_st.edges()))
+        # Modifying the result does not affect the cache.
+        cached_order.pop()
+        self.assertEqual(dependency_order(self._node_mgr(), draw=False,
+                                          cache=True)[0], order)
+
+    def test_dependency_order_cache_dir(self):
+        order, gr_st = dependency_order(self._node_mgr(), draw=False,
+                                        cache=True, cache_dir=self.cache_dir)
+        dependency_graph._dependency_order_cache.clear()
+        with mock.patch('analysis_engine.dependency_graph.graph_nodes') \
+                as graph_nodes:
+            cached_order, cached_gr_st = dependency_order(
+                self._node_mgr(), draw=False, cache=True,
+                cache_dir=self.cache_dir)
+            self.assertFalse(graph_nodes.called)
+        self.assertEqual(cached_order, order)
+        self.assertEqual(sorted(cached_gr_st.edges()), sorted(gr_st.edges()))
+
+    def test_dependency_order_cache_size(self):
+        node_mgrs = [self._node_mgr(), self._node_mgr(self.lfl_params[1:])]
+        keys = [dependency_cache_key(node_mgr) for node_mgr in node_mgrs]
+        with mock.patch.object(settings, 'DEPENDENCY_CACHE_SIZE', 1):
+            for node_mgr in node_mgrs:
+                dependency_order(node_mgr, draw=False, cache=True,
+                                 cache_dir=self.cache_dir)
+            # The least recently used order is evicted from memory.
+            self.assertEqual(list(dependency_graph._dependency_order_cache),
+                             keys[1:])
+            # Evicted orders are still loaded from the cache directory.
+            with mock.patch('analysis_engine.dependency_graph.graph_nodes') \
+                    as graph_nodes:
+                dependency_order(node_mgrs[0], draw=False, cache=True,
+                                 cache_dir=self.cache_dir)
+                self.assertFalse(graph_nodes.called)
+            self.assertEqual(list(dependency_graph._dependency_order_cache),
+                             keys[:1])
+
+
+
 class TestGraphAdjacencies(unittest.TestCase):
     def test_graph_adjacencies(self):
         g = nx.DiGraph()
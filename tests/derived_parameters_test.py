@@ -37,7 +37,11 @@ from analysis_engine.node import (Attribute,
                                   Section,
                                   S)
 from analysis_engine.process_flight import process_flight
-from analysis_engine.settings import GRAVITY_IMPERIAL, METRES_TO_FEET
+from analysis_engine.settings import (
+    GRAVITY_IMPERIAL,
+    GROUND_TRACK_MAX_ITERATIONS,
+    METRES_TO_FEET,
+)
 
 from flight_phase_test import buildsection
 
@@ -4668,6 +4672,22 @@ class TestCoordinatesSmoothed(TemporaryFileTest, unittest.TestCase):
         self.assertEqual(len(chunks),2)
         self.assertEqual(chunks,[slice(44,414),slice(12930,13424)])
 
+    @patch('analysis_engine.derived_parameters.ground_track_precise')
+    def test_taxi_track_pp_max_iterations(self, ground_track_precise):
+        ground_track_precise.return_value = 'lat', 'lon', 1.0
+        lat, lon, speed, hdg = [np.ma.arange(10)] * 4
+        cs = CoordinatesSmoothed()
+        self.assertEqual(cs.taxi_out_track_pp(lat, lon, speed, hdg, 1.0),
+                         ('lat', 'lon'))
+        self.assertEqual(ground_track_precise.call_args,
+                         call(lat, lon, speed, hdg, 1.0, 'takeoff',
+                              max_iterations=GROUND_TRACK_MAX_ITERATIONS))
+        self.assertEqual(cs.taxi_in_track_pp(lat, lon, speed, hdg, 1.0),
+                         ('lat', 'lon'))
+        self.assertEqual(ground_track_precise.call_args,
+                         call(lat, lon, speed, hdg, 1.0, 'landing',
+                              max_iterations=GROUND_TRACK_MAX_ITERATIONS))
+
 
 class TestApproachRange(TemporaryFileTest, unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,90 @@
+import numpy as np
+import unittest
+
+from analysis_engine.intervals import Intervals
+
+
+class TestIntervals(unittest.TestCase):
+    def test_from_slices(self):
+        intervals = Intervals.from_slices([slice(2, 5), None, slice(9, 3, -1),
+                                           slice(None, 1), slice(7, None)])
+        self.assertEqual(intervals.starts.tolist(), [2, 4, -np.inf, 7])
+        self.assertEqual(intervals.stops.tolist(), [5, 10, 1, np.inf])
+        self.assertTrue(intervals.integer)
+        self.assertEqual(intervals.to_slices(), [slice(2, 5), slice(4, 10),
+                                                 slice(None, 1),
+                                                 slice(7, None)])
+
+    def test_to_slices_float(self):
+        intervals = Intervals.from_slices([slice(2.5, 5), slice(6, 7)])
+        self.assertFalse(intervals.integer)
+        slices = intervals.to_slices()
+        self.assertEqual(slices, [slice(2.5, 5), slice(6, 7)])
+        self.assertTrue(isinstance(slices[1].start, float))
+
+    def test_length_mismatch(self):
+        self.assertRaises(ValueError, Intervals, [1, 2], [3])
+
+    def test_getitem(self):
+        intervals = Intervals([1, 5, 10], [3, 6, 20])
+        self.assertEqual(intervals[intervals.stops - intervals.starts > 1],
+                         Intervals([1, 10], [3, 20]))
+        self.assertEqual(intervals[1], Intervals([5], [6]))
+
+    def test_is_ordered(self):
+        self.assertTrue(Intervals([1, 3], [3, 5]).is_ordered())
+        self.assertFalse(Intervals([1, 2], [3, 5]).is_ordered())
+        self.assertFalse(Intervals([3, 1], [5, 2]).is_ordered())
+        self.assertFalse(Intervals([1, 4], [1, 5]).is_ordered())
+
+    def test_contains(self):
+        intervals = Intervals([None, 5, 10], [5, 10, None])
+        self.assertEqual(intervals.contains(5).tolist(), [False, True, False])
+        self.assertEqual(intervals.contains(5, inclusive=True).tolist(),
+                         [True, True, False])
+        self.assertEqual(intervals.contains(100).tolist(),
+                         [False, False, True])
+
+    def test_union(self):
+        first = Intervals.from_slices([slice(10, 13), slice(16, 25)])
+        second = Intervals.from_slices([slice(20, 31), slice(13, 14),
+                                        slice(40, 40)])
+        self.assertEqual((first | second).to_slices(),
+                         [slice(10, 14), slice(16, 31)])
+        self.assertEqual(Intervals().union().to_slices(), [])
+
+    def test_intersection(self):
+        first = Intervals.from_slices([slice(2, 5), slice(7, None)])
+        second = Intervals.from_slices([slice(3, 9), slice(12, 15)])
+        self.assertEqual((first & second).to_slices(),
+                         [slice(3, 5), slice(7, 9), slice(12, 15)])
+        # Touching intervals remain separate.
+        first = Intervals.from_slices([slice(0, 5), slice(5, 10)])
+        second = Intervals.from_slices([slice(2, 8)])
+        self.assertEqual((first & second).to_slices(),
+                         [slice(2, 5), slice(5, 8)])
+        self.assertEqual((first & Intervals()).to_slices(), [])
+
+    def test_intersection_unordered(self):
+        first = Intervals.from_slices([slice(7, 12), slice(0, 8)])
+        second = Intervals.from_slices([slice(5, 20)])
+        self.assertEqual((first & second).to_slices(), [slice(5, 12)])
+
+    def test_complement(self):
+        intervals = Intervals.from_slices([slice(16, 25), slice(10, 13)])
+        self.assertEqual(intervals.complement().to_slices(),
+                         [slice(None, 10), slice(13, 16), slice(25, None)])
+        self.assertEqual(intervals.complement(12, 20).to_slices(),
+                         [slice(13, 16)])
+        self.assertEqual(Intervals().complement(2, 5).to_slices(),
+                         [slice(2, 5)])
+
+    def test_remove_small_gaps(self):
+        intervals = Intervals.from_slices([slice(1, 3), slice(5, 7),
+                                           slice(20, 22)])
+        self.assertEqual(intervals.remove_small_gaps(10).to_slices(),
+                         [slice(1, 7), slice(20, 22)])
+        self.assertEqual(intervals.remove_small_gaps(15).to_slices(),
+                         [slice(1, 22)])
+        self.assertEqual(intervals.remove_small_gaps(2).to_slices(),
+                         intervals.to_slices())
@@ -6,6 +6,7 @@ import unittest
 
 from datetime import datetime
 from math import sqrt
+from scipy import optimize
 from time import clock
 
 from analysis_engine.flight_attribute import LandingRunway
@@ -15,6 +16,10 @@ from analysis_engine.flight_attribute import LandingRunway
 import flightdatautilities.masked_array_testutils as ma_test
 
 from analysis_engine.library import *
+from analysis_engine.library import (_dilate_mask,
+                                     _small_cycle_mask,
+                                     _hysteresis_pass_chunked,
+                                     _hysteresis_pass_loop)
 from analysis_engine.node import (A, P, S, load, M, KTI, KeyTimeInstance, Section)
 from analysis_engine.settings import METRES_TO_FEET
 from flight_phase_test import buildsections
@@ -693,12 +698,39 @@ class TestAlign(unittest.TestCase):
     def test_align_5_10_20_offset_master(self):
         master = P('master', np.ma.arange(100.0), frequency=20.0, offset=0.1)
         slave = P('slave', array=[6,5,4,3,2], frequency=1.0, offset=0.0)
-        self.assertRaises(ValueError, align, slave, master)
+        result = align(slave, master)
+        expected = 5.9-(master.array/20.0)
+        expected[78:]=np.ma.masked
+        ma_test.assert_masked_array_approx_equal(result, expected)
         
     def test_align_5_10_20_offset_slave(self):
-        master = P('master', np.ma.arange(10.0), frequency=2.0, offset=0.0)
-        slave = P('slave', array=[6,5,4,3,2], frequency=5.0, offset=0.3)
-        self.assertRaises(ValueError, align, slave, master)
+        master = P('master', np.ma.arange(4.0), frequency=2.0, offset=0.0)
+        slave = P('slave', np.ma.arange(10.0), frequency=5.0, offset=0.3)
+        result = align(slave, master)
+        ma_test.assert_masked_array_approx_equal(
+            result, np.ma.array([0.0, 1.0, 3.5, 6.0], mask=[1, 0, 0, 0]))
+
+    def test_align_5_10_20_offset_both(self):
+        master = P('master', np.ma.arange(20.0), frequency=10.0, offset=0.05)
+        slave = P('slave', np.ma.arange(8.0), frequency=4.0, offset=0.2)
+        result = align(slave, master)
+        # Master samples lie at (n/10 + 0.05 - 0.2) * 4 slave samples.
+        expected = np.ma.arange(20.0) * 0.4 - 0.6
+        expected[0:2] = np.ma.masked
+        expected[19] = np.ma.masked
+        ma_test.assert_masked_array_approx_equal(result, expected)
+
+    def test_align_5_10_20_offset_multi_state(self):
+        master = P('master', np.ma.arange(10.0), frequency=5.0, offset=0.1)
+        slave = M('slave', np.ma.array([1, 2, 3, 4]), frequency=2.0,
+                  offset=0.2, values_mapping={1: 'A', 2: 'B', 3: 'C', 4: 'D'})
+        result = align(slave, master)
+        self.assertEqual(result.dtype, int)
+        # Nearest slave sample to each master sample without interpolation.
+        np.testing.assert_array_equal(result.data,
+                                      [0, 1, 2, 2, 2, 3, 3, 4, 0, 0])
+        np.testing.assert_array_equal(result.mask,
+                                      [1, 0, 0, 0, 0, 0, 0, 0, 1, 1])
 
     def test_align_multi_state_5_10(self):
         first = P(frequency=10, offset=0.0,
@@ -1519,6 +1551,41 @@ class TestCycleFinder(unittest.TestCase):
         np.testing.assert_array_equal(idxs, [0, 5, 7, 14])
         np.testing.assert_array_equal(vals, [0, 3, 1, 6])
 
+    def test_cycle_finder_joined_removals(self):
+        # Removing each reversal joins the changes either side, which are
+        # then large enough to remain.
+        array = np.ma.array([0, 2, 1, 3, 2, 4])
+        idxs, vals = cycle_finder(array, min_step=1.5)
+        np.testing.assert_array_equal(idxs, [0, 5])
+        np.testing.assert_array_equal(vals, [0, 4])
+
+    def test_cycle_finder_equal_steps(self):
+        # The first of equal small changes is removed first.
+        array = np.ma.array([0, 1, 0, 5])
+        idxs, vals = cycle_finder(array, min_step=1.5)
+        np.testing.assert_array_equal(idxs, [2, 3])
+        np.testing.assert_array_equal(vals, [0, 5])
+
+
+class TestSmallCycleMask(unittest.TestCase):
+    def test_small_cycle_mask(self):
+        dvals = np.array([2, -1, 2, -1, 2.0])
+        self.assertEqual(_small_cycle_mask(dvals, 0.5).tolist(), [True] * 6)
+        self.assertEqual(_small_cycle_mask(dvals, 1.5).tolist(),
+                         [True, False, False, False, False, True])
+        self.assertEqual(_small_cycle_mask(dvals, 5).tolist(),
+                         [False] * 5 + [True])
+
+    def test_small_cycle_mask_ends(self):
+        dvals = np.array([-1, 3, -3, 0.5])
+        self.assertEqual(_small_cycle_mask(dvals, 2).tolist(),
+                         [False, True, True, True, False])
+
+    def test_small_cycle_mask_nan(self):
+        dvals = np.array([1, np.nan, 0.5])
+        self.assertEqual(_small_cycle_mask(dvals, 1).tolist(), [True] * 4)
+        self.assertEqual(_small_cycle_mask(np.array([]), 1).tolist(), [True])
+
 
 class TestCycleMatch(unittest.TestCase):
     def test_find_a_match(self):
@@ -1977,6 +2044,61 @@ class TestGtpWeightingVector(unittest.TestCase):
         np.testing.assert_array_almost_equal(speed_weighting , expected)
 
 
+class TestGtpWeightingBasis(unittest.TestCase):
+    def test_weighting_basis(self):
+        constant, basis = gtp_weighting_basis(8, [2, 5])
+        np.testing.assert_array_almost_equal(
+            constant, [1.0, 0.5, 0.0, 0.0, 0.0, 0.0, 0.5, 1.0])
+        np.testing.assert_array_almost_equal(
+            basis, [[0.0, 0.5, 1.0, 2/3.0, 1/3.0, 0.0, 0.0, 0.0],
+                    [0.0, 0.0, 0.0, 1/3.0, 2/3.0, 1.0, 0.5, 0.0]])
+
+    def test_weighting_basis_ends(self):
+        # Weights at the ends of the track are fixed at 1.0.
+        constant, basis = gtp_weighting_basis(5, [0, 2, 5])
+        np.testing.assert_array_almost_equal(constant,
+                                             [1.0, 0.5, 0.0, 0.5, 1.0])
+        np.testing.assert_array_almost_equal(
+            basis, [[0.0] * 5, [0.0, 0.5, 1.0, 0.5, 0.0], [0.0] * 5])
+
+
+class TestGtpTrackComponents(unittest.TestCase):
+    def test_track_components(self):
+        # The components give the ground track of the weighted speed.
+        speed = np.ma.array([10.0, 12, 14, 14, 14, 12, 10, 8, 8, 8])
+        speed[3] = np.ma.masked
+        hdg = np.ma.array([0.0, 0, 10, 40, 80, 90, 90, 120, 180, 180])
+        hdg[6] = np.ma.masked
+        lat = np.ma.zeros(10)
+        lon = np.ma.zeros(10)
+        straight_ends = [2, 5, 7]
+        weights = [0.8, 1.3, 1.1]
+        for mode in ('landing', 'takeoff'):
+            components = gtp_track_components(
+                [slice(0, 2), slice(5, 7)], straight_ends, speed,
+                hdg.copy(), 1.0, mode)
+            args = ([slice(0, 2), slice(5, 7)], straight_ends, lat, lon,
+                    speed, hdg.copy(), 1.0, mode, 'final_answer', components)
+            lat_est, lon_est, error = gtp_compute_error(weights, *args)
+            weighting = gtp_weighting_vector(speed, straight_ends, weights)
+            expected_lat, expected_lon = ground_track(
+                0.0, 0.0, speed * weighting, hdg.copy(), 1.0, mode)
+            np.testing.assert_array_almost_equal(lat_est, expected_lat)
+            np.testing.assert_array_almost_equal(lon_est, expected_lon)
+            self.assertEqual(np.ma.getmaskarray(lat_est).tolist(),
+                             [False] * 3 + [True] + [False] * 6)
+            self.assertGreater(error, 0.0)
+
+    def test_track_components_too_few_samples(self):
+        speed = np.ma.array([10.0] * 6, mask=[0, 1, 0, 1, 0, 0])
+        hdg = np.ma.array([90.0] * 6)
+        self.assertEqual(gtp_track_components([], [], speed, hdg, 1.0,
+                                              'landing'), None)
+        args = ([], [], np.ma.zeros(6), np.ma.zeros(6), speed, hdg, 1.0,
+                'landing', 'iterate')
+        self.assertRaises(ValueError, gtp_compute_error, [], *args)
+
+
 class TestGtpComputeError(unittest.TestCase):
     # Precise positioning ground track error computation.
     def test_gtp_error_basic(self):
@@ -2042,6 +2164,17 @@ class TestGroundTrackPrecise(unittest.TestCase):
         self.assertLess(wt, 100000)
         self.assertGreater(wt, 1)
 
+    def test_ppgt_max_iterations(self):
+        with mock.patch('analysis_engine.library.optimize.fmin_l_bfgs_b',
+                        wraps=optimize.fmin_l_bfgs_b) as fmin_l_bfgs_b:
+            la, lo, wt = ground_track_precise(self.lat, self.lon, self.gspd,
+                                              self.hdg, 1.0, 'landing',
+                                              max_iterations=3)
+        self.assertEqual(fmin_l_bfgs_b.call_args[1]['maxiter'], 3)
+        self.assertEqual(fmin_l_bfgs_b.call_args[1]['maxfun'], 10)
+        self.assertLess(wt, 100000)
+        self.assertGreater(wt, 1)
+
 
 class TestHashArray(unittest.TestCase):
     def test_hash_array(self):
@@ -2096,15 +2229,33 @@ class TestHysteresis(unittest.TestCase):
         np.testing.assert_array_equal(result.filled(999),
                                       [999,1,1,1,999,0,5,6,6,0.5])
 
-    """
-    Hysteresis may need to be speeded up, in which case this test can be
-    reinstated.
-
+    def test_hysteresis_float32(self):
+        data = np.ma.array([0, 1, 2, 1, 0, -1, 5, 6, 7, 0], dtype=np.float32)
+        result = hysteresis(data, 1)
+        np.testing.assert_array_equal(result.data, [0.25, 1., 1.5, 1., 0.,
+                                                    -0.5, 5., 6., 6.5, 0.25])
+
+    def test_hysteresis_pass_chunked(self):
+        # Values on a quarter grid make the comparisons tie, where rounding
+        # may make the chunked pass differ from the loop before it is
+        # corrected.
+        np.random.seed(0)
+        for values in (np.cumsum(np.random.randn(1000)),
+                       np.round(np.cumsum(np.random.randn(1000)) * 4) / 4,
+                       np.array([0.1, 0.3, np.nan, 0.7, 0.2])):
+            for quarter_range in (0.025, 0.25, 2.5):
+                result = _hysteresis_pass_chunked(values, quarter_range,
+                                                  values[0])
+                expected = _hysteresis_pass_loop(values.tolist(),
+                                                 quarter_range, values[0])
+                self.assertEqual(result.tolist(), expected)
+
+    @unittest.skip('Timing depends on the machine. Timed by '
+                   'benchmarks.hysteresis_benchmark instead.')
     def test_time_taken(self):
         from timeit import Timer
         timer = Timer(self.using_large_data)
         time = min(timer.repeat(1, 1))
-        print "Time taken %s secs" % time
         self.assertLess(time, 0.1, msg="Took too long")
 
     def using_large_data(self):
@@ -2112,8 +2263,6 @@ class TestHysteresis(unittest.TestCase):
         data[0] = np.ma.masked
         data[-1000:] = np.ma.masked
         res = hysteresis(data, 10)
-        pass
-    """
 
 
 class TestIndexAtValue(unittest.TestCase):
@@ -2605,6 +2754,59 @@ class TestMaskInsideSlices(unittest.TestCase):
                              expected_result)
 
 
+class TestMaskedFirstOrderFilter(unittest.TestCase):
+    def setUp(self):
+        # Coefficients of first_order_lag with a time constant of 2 seconds.
+        self.x_term = [0.2, 0.2]
+        self.y_term = [1.0, -0.6]
+
+    def test_masked_first_order_filter_resets_each_block(self):
+        array = np.ma.array([1.0, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+                            mask=[1, 0, 0, 1, 1, 0, 0, 0, 1, 0])
+        result = masked_first_order_filter(self.y_term, self.x_term, array,
+                                           None)
+        # Each unmasked block is filtered from the initial value, which is
+        # the first unmasked value.
+        expected = np.ma.zeros(10)
+        for block in np.ma.clump_unmasked(array):
+            expected[block] = first_order_lag(
+                array[block], 2.0, 1.0, initial_value=2.0)
+        expected[array.mask] = np.ma.masked
+        ma_test.assert_masked_array_approx_equal(result, expected)
+        self.assertEqual(result.data[array.mask].tolist(), [0, 0, 0, 0])
+
+    def test_masked_first_order_filter_many_gaps(self):
+        np.random.seed(0)
+        array = np.ma.array(np.cumsum(np.random.randn(1000)),
+                            mask=np.random.rand(1000) < 0.2)
+        result = masked_first_order_filter(self.y_term, self.x_term, array,
+                                           0.0)
+        for block in np.ma.clump_unmasked(array):
+            expected = first_order_lag(array[block].data, 2.0, 1.0,
+                                       initial_value=0.0)
+            np.testing.assert_allclose(result[block].data, expected.data,
+                                       atol=1e-12)
+        np.testing.assert_array_equal(result.mask, array.mask)
+
+    def test_masked_first_order_filter_higher_order(self):
+        array = np.ma.arange(10, dtype=float)
+        array[4] = np.ma.masked
+        y_term = [1.0, -1.5, 0.6]
+        x_term = [0.05, 0.05, 0.0]
+        result = masked_first_order_filter(y_term, x_term, array, 1.0)
+        for block in (slice(0, 4), slice(5, 10)):
+            expected = masked_first_order_filter(y_term, x_term,
+                                                 array[block], 1.0)
+            np.testing.assert_allclose(result[block].data, expected.data)
+        self.assertTrue(result[4] is np.ma.masked)
+
+    def test_masked_first_order_filter_all_masked(self):
+        array = np.ma.array([1.0, 2.0, 3.0], mask=True)
+        result = masked_first_order_filter(self.y_term, self.x_term, array,
+                                           None)
+        self.assertEqual(result.mask.tolist(), [True, True, True])
+
+
 class TestMaxContinuousUnmasked(unittest.TestCase):
     def test_max_continuous_unmasked(self):
         data = np.ma.array(range(20),
@@ -3636,6 +3838,45 @@ class TestRateOfChangeArray(unittest.TestCase):
                              mask=[0,0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0])
         ma_test.assert_array_equal(sloped, answer)
 
+    def test_masked_edges(self):
+        test_array = np.ma.arange(12, dtype=float)
+        test_array[[0, 11]] = np.ma.masked
+        sloped = rate_of_change_array(test_array, 1.0, 6.0)
+        self.assertEqual(sloped.mask.tolist(), [True] * 4 + [False] * 4 +
+                         [True] * 4)
+        self.assertEqual(sloped.compressed().tolist(), [1.0] * 4)
+
+    def test_regression(self):
+        test_array = np.ma.arange(10, dtype=float) * 2
+        sloped = rate_of_change_array(test_array, 2.0, 2.0,
+                                      method='regression')
+        # The padding at either end flattens the fit.
+        np.testing.assert_allclose(sloped, [2, 3.2, 4, 4, 4, 4, 4, 4, 3.2, 2])
+
+    def test_regression_masked(self):
+        test_array = np.ma.arange(10) * 2
+        test_array[5] = np.ma.masked
+        sloped = rate_of_change_array(test_array, 2.0, 2.0,
+                                      method='regression')
+        # The fit is not a number where masked data is used.
+        self.assertEqual(np.isnan(sloped).tolist(), [False] * 3 +
+                         [True] * 5 + [False] * 2)
+        np.testing.assert_allclose(sloped[:3], [2, 3.2, 4])
+
+
+class TestDilateMask(unittest.TestCase):
+    def test_dilate_mask(self):
+        mask = np.array([0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1], dtype=bool)
+        self.assertEqual(_dilate_mask(mask, 2).astype(int).tolist(),
+                         [0, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 1])
+        self.assertEqual(_dilate_mask(mask, 20).tolist(), [True] * 12)
+
+    def test_dilate_mask_unmasked(self):
+        mask = np.zeros(5, dtype=bool)
+        dilated = _dilate_mask(mask, 3)
+        self.assertEqual(dilated.tolist(), [False] * 5)
+        self.assertFalse(dilated is mask)
+
 
 class TestRateOfChange(unittest.TestCase):
     # 13/4/12 Changed timebase to be full width as this is more logical.
@@ -3778,6 +4019,43 @@ class TestRepairMask(unittest.TestCase):
         expected = np.ma.array([0,0,6,7,0,0,0],mask=[0,0,0,0,0,0,0])
         ma_test.assert_array_equal(res, expected)
 
+    def test_repair_mask_in_place(self):
+        array = np.ma.array([1.0, 2, 3, 4, 5], mask=[0, 1, 1, 0, 0])
+        res = repair_mask(array)
+        self.assertTrue(res is array)
+        self.assertEqual(array.tolist(), [1, 2, 3, 4, 5])
+        array = np.ma.array([1.0, 2, 3, 4, 5], mask=[0, 1, 1, 0, 0])
+        res = repair_mask(array, copy=True)
+        self.assertFalse(res is array)
+        self.assertEqual(res.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(array.tolist(), [1, None, None, 4, 5])
+
+    def test_repair_mask_many_sections(self):
+        array = np.ma.array([0.0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100],
+                            mask=[1, 0, 1, 0, 1, 1, 0, 1, 1, 1, 1])
+        res = repair_mask(array, repair_duration=3)
+        # The leading section cannot be interpolated and the trailing
+        # section is too long to repair.
+        self.assertEqual(res.tolist(),
+                         [None, 10, 20, 30, 40, 50, 60, None, None, None,
+                          None])
+
+    def test_repair_mask_duration_exceedance(self):
+        array = np.ma.arange(20)
+        array[2:4] = np.ma.masked
+        array[6:18] = np.ma.masked
+        self.assertRaises(ValueError, repair_mask, array,
+                          raise_duration_exceedance=True)
+        res = repair_mask(array, repair_duration=None,
+                          raise_duration_exceedance=True)
+        self.assertEqual(res.tolist(), range(20))
+
+    def test_repair_mask_repair_above_extrapolate(self):
+        array = np.ma.array([1, 2, 6, 7, 8, 9, 1, 9, 9],
+                            mask=[1, 0, 1, 0, 1, 0, 1, 0, 1])
+        res = repair_mask(array, repair_above=5, extrapolate=True)
+        self.assertEqual(res.tolist(), [2, 2, None, 7, 8, 9, 9, 9, 9])
+
 
 class TestResample(unittest.TestCase):
     def test_resample_upsample(self):
@@ -4554,6 +4832,11 @@ class TestSlicesNot(unittest.TestCase):
         self.assertEqual(slices_not([]), [slice(None,None,None)])
         self.assertEqual(slices_not([slice(4,6)]),[])
 
+    def test_slices_not_empty_range(self):
+        self.assertEqual(slices_not([slice(0,0)]), [slice(0,0)])
+        self.assertEqual(slices_not([slice(0,0)], begin_at=2), [slice(0,0)])
+        self.assertEqual(slices_not([slice(5,5)]), [])
+
     def test_slices_misordered(self):
         slice_list = [slice(25,16,-1),slice(10,13)]
         self.assertEqual(slices_not(slice_list), [slice(13,17)])
@@ -5033,9 +5316,52 @@ class TestSubslice(unittest.TestCase):
 
 
 class TestTouchdownInertial(unittest.TestCase):
-    @unittest.skip("Not Implemented")
+    def setUp(self):
+        self.alt = P('Altitude AAL',
+                     np.ma.array([50.0, 40, 30, 20, 10, 2, 0, 0, 0, 0]))
+        self.roc = P('Vertical Speed Inertial',
+                     np.ma.array([-600.0] * 6 + [-300.0, 0, 0, 0]))
+        self.land = Section('Landing', slice(0, 10), 0, 10)
+
     def test_touchdown_inertial(self):
-        self.assertTrue(False)
+        result = touchdown_inertial(self.land, self.roc, self.alt)
+        self.assertEqual(result, Value(5.0, -600.0))
+
+    def test_touchdown_inertial_offset_landing(self):
+        alt = P('Altitude AAL', np.ma.concatenate([np.ma.array([100.0] * 5),
+                                                   self.alt.array]))
+        roc = P('Vertical Speed Inertial',
+                np.ma.concatenate([np.ma.zeros(5), self.roc.array]))
+        land = Section('Landing', slice(5, 15), 5, 15)
+        result = touchdown_inertial(land, roc, alt)
+        self.assertEqual(result, Value(10.0, -600.0))
+
+    def test_touchdown_inertial_matches_recurrence(self):
+        # The smoothed height is a first order recurrence applied with
+        # lfilter. Compare against the recurrence evaluated sample by sample.
+        alt = np.ma.array(np.maximum(np.linspace(300, -30, 200), 0))
+        roc = np.ma.array(np.where(alt > 0, -600.0, 0.0))
+        roc[50] = np.ma.masked
+        tau = 1 / 6.0
+        my_alt = repair_mask(alt)
+        my_roc = repair_mask(roc)
+        sm_ht = np.zeros(len(alt))
+        sm_ht[0] = alt[0]
+        for i in range(1, len(sm_ht)):
+            sm_ht[i] = (1.0-tau)*sm_ht[i-1] + tau*my_alt[i-1] + \
+                my_roc[i]/60.0/2.0
+        expected = index_at_value(np.ma.array(sm_ht), 0.0)
+        result = touchdown_inertial(
+            Section('Landing', slice(0, 200), 0, 200),
+            P('Vertical Speed Inertial', roc, frequency=2.0),
+            P('Altitude AAL', alt, frequency=2.0))
+        self.assertAlmostEqual(result.index, expected)
+        self.assertEqual(result.value, -600.0)
+
+    def test_touchdown_inertial_masked_start(self):
+        self.alt.array[0] = np.ma.masked
+        result = touchdown_inertial(self.land, self.roc, self.alt)
+        self.assertEqual(result, Value(None, None))
 
 
 class TestTrackLinking(unittest.TestCase):
@@ -5559,6 +5885,72 @@ class TestIsDay(unittest.TestCase):
         self.assertEqual(is_day(datetime(2012,6,4,1,12), lat, lon), True)
 
 
+class TestIsDayArray(unittest.TestCase):
+    def test_matches_is_day(self):
+        # A day of samples every 10 minutes flying around the world.
+        start = datetime(2012, 6, 20, 0, 0)
+        times = np.arange(0, 86400, 600)
+        latitude = np.ma.array(np.linspace(-80, 80, len(times)))
+        longitude = np.ma.array(np.linspace(-180, 180, len(times)))
+        for twilight in (None, 'civil', 'nautical', 'astronomical'):
+            result = is_day_array(start, times, latitude, longitude,
+                                  twilight=twilight)
+            expected = [is_day(datetime_of_index(start, t), lat, lon,
+                               twilight=twilight)
+                        for t, lat, lon in zip(times, latitude, longitude)]
+            self.assertEqual(result.tolist(), expected)
+
+    def test_sunset(self):
+        # Sunset at Stonehenge on 20th June 2012 is between 20:25 and 20:27.
+        result = is_day_array(datetime(2012, 6, 20, 20, 25), [0, 120],
+                              [51.1789] * 2, [-1.8264] * 2, twilight=None)
+        self.assertEqual(result.tolist(), [True, False])
+
+    def test_masked(self):
+        result = is_day_array(datetime(2012, 6, 20, 12, 0), [0, 1, 2],
+                              np.ma.array([51.0, 51.0, 51.0],
+                                          mask=[False, True, False]),
+                              np.ma.array([0.0, 0.0, 0.0],
+                                          mask=[False, False, True]))
+        self.assertEqual(result.tolist(), [True, None, None])
+
+    def test_twilight(self):
+        self.assertRaises(ValueError, is_day_array, datetime(2012, 6, 20),
+                          [0], [51.0], [0.0], twilight='dusk')
+
+
+class TestSlidingMinMax(unittest.TestCase):
+    def test_sliding_min_max(self):
+        minimum, maximum = sliding_min_max(np.ma.array([3, 1, 4, 1, 5]), 1)
+        self.assertEqual(minimum.tolist(), [1, 1, 1, 1, 1])
+        self.assertEqual(maximum.tolist(), [3, 4, 4, 5, 5])
+
+    def test_sliding_min_max_masked(self):
+        array = np.ma.array([3.0, 1, 4, 1, 5, 9, 2, 6],
+                            mask=[0, 1, 0, 1, 1, 1, 0, 0])
+        minimum, maximum = sliding_min_max(array, 1)
+        self.assertEqual(minimum.tolist(),
+                         [3.0, 3.0, 4.0, 4.0, None, 2.0, 2.0, 2.0])
+        self.assertEqual(maximum.tolist(),
+                         [3.0, 4.0, 4.0, 4.0, None, 2.0, 6.0, 6.0])
+
+    def test_sliding_min_max_window(self):
+        # Compare with the extremes of each window for windows narrower and
+        # wider than the array.
+        np.random.seed(0)
+        array = np.ma.array(np.random.randn(50),
+                            mask=np.random.rand(50) < 0.2)
+        for half_width in (0, 1, 2, 7, 60):
+            minimum, maximum = sliding_min_max(array, half_width)
+            windows = [array[max(index - half_width, 0):
+                             index + half_width + 1].compressed()
+                       for index in range(len(array))]
+            self.assertEqual(minimum.tolist(),
+                             [w.min() if len(w) else None for w in windows])
+            self.assertEqual(maximum.tolist(),
+                             [w.max() if len(w) else None for w in windows])
+
+
 class TestSecondWindow(unittest.TestCase):
     
     def test_three_second_window_incrementing(self):
@@ -9,6 +9,8 @@ from random import shuffle
 
 from analysis_engine.library import min_value, max_value
 from analysis_engine.node import (
+    A,
+    AlignmentCache,
     ApproachItem,
     ApproachNode,
     Attribute,
@@ -112,6 +114,63 @@ class TestNode(unittest.TestCase):
 
         self.assertEqual(KeyPointValue123.get_dependency_names(),
                          ['Parameter A', 'Parameter B'])
+        # Dependency names are computed when the class is defined.
+        self.assertEqual(KeyPointValue123._dependency_names,
+                         ('Parameter A', 'Parameter B'))
+        # Modifying the returned list does not modify the class' names.
+        KeyPointValue123.get_dependency_names().append('Parameter C')
+        self.assertEqual(KeyPointValue123.get_dependency_names(),
+                         ['Parameter A', 'Parameter B'])
+
+    def test_get_dependency_names_invalid(self):
+        class StringDependency(DerivedParameterNode):
+            def derive(self, aa='Parameter A'):
+                pass
+        self.assertEqual(StringDependency._dependency_names, None)
+        self.assertRaises(AttributeError,
+                          StringDependency.get_dependency_names)
+
+    def test_get_can_operate_attribute_names(self):
+        class AttributeNode(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, family=A('Family'),
+                            series=A('Series')):
+                return True
+            def derive(self, aa=P('Parameter A')):
+                pass
+        self.assertEqual(AttributeNode.get_can_operate_attribute_names(),
+                         ['Family', 'Series'])
+        self.assertEqual(AttributeNode._can_operate_attribute_names,
+                         ('Family', 'Series'))
+        class InvalidNode(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, family=P('Family')):
+                return True
+            def derive(self, aa=P('Parameter A')):
+                pass
+        self.assertRaises(TypeError,
+                          InvalidNode.get_can_operate_attribute_names)
+
+    def test_metadata_reassigned(self):
+        class BaseNode(DerivedParameterNode):
+            def derive(self, aa=P('Parameter A')):
+                pass
+        class SubNode(BaseNode):
+            pass
+        BaseNode.can_operate = classmethod(
+            lambda cls, available, family=A('Family'): True)
+        self.assertEqual(BaseNode.get_can_operate_attribute_names(),
+                         ['Family'])
+        # Subclasses which inherit the method are updated.
+        self.assertEqual(SubNode.get_can_operate_attribute_names(),
+                         ['Family'])
+        with mock.patch.object(SubNode, 'derive',
+                               lambda self, bb=P('Parameter B'): None):
+            self.assertEqual(SubNode.get_dependency_names(), ['Parameter B'])
+            self.assertEqual(BaseNode.get_dependency_names(), ['Parameter A'])
+        self.assertEqual(SubNode.get_dependency_names(), ['Parameter A'])
+        del BaseNode.can_operate
+        self.assertEqual(SubNode.get_can_operate_attribute_names(), [])
 
     def test_can_operate(self):
         deps = ['a', 'b', 'c']
@@ -815,6 +874,22 @@ class TestSectionNode(unittest.TestCase):
         self.assertEqual(node.get_surrounding(12), [sect_1, sect_2])
         self.assertEqual(node.get_surrounding(-3), [])
         self.assertEqual(node.get_surrounding(25), [sect_2])
+
+    def test_get_surrounding_none(self):
+        sect_1 = Section('ThisSection', slice(None, 5), None, 5)
+        sect_2 = Section('ThisSection', slice(3, None), 3, None)
+        node = SectionNode(items=[sect_1, sect_2])
+        self.assertEqual(node.get_surrounding(-10), [sect_1])
+        self.assertEqual(node.get_surrounding(4), [sect_1, sect_2])
+        self.assertEqual(node.get_surrounding(100), [sect_2])
+
+    def test_get_intervals(self):
+        node = SectionNode(items=[Section('A', slice(10, 15), 10, 15),
+                                  Section('B', slice(2, None), 2, None)])
+        intervals = node.get_intervals()
+        self.assertEqual(intervals.to_slices(),
+                         [slice(10, 15), slice(2, None)])
+        self.assertEqual(intervals.contains(12).tolist(), [True, True])
     
     def test_get_shortest(self):
         node = SectionNode(items=[Section('ThisSection', slice(0, 5), 0, 5),
@@ -2033,6 +2108,92 @@ class TestMultistateDerivedParameterNode(unittest.TestCase):
         self.assertEqual(list(res.array), expected)
         os.remove(dest)
         
+class TestAlignmentCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = AlignmentCache(max_bytes=1024 * 1024)
+        self.param = P('Airspeed', np.ma.arange(10.0), frequency=1, offset=0)
+        self.node = P('Node', frequency=2, offset=0.25)
+
+    def test_get_aligned(self):
+        aligned = self.cache.get_aligned(self.param, self.node)
+        self.assertEqual(aligned.name, 'Airspeed')
+        self.assertEqual(aligned.frequency, 2)
+        self.assertEqual(aligned.offset, 0.25)
+        expected = self.param.get_aligned(self.node).array
+        np.testing.assert_array_equal(aligned.array, expected)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['hits'], 0)
+        self.assertEqual(len(self.cache), 1)
+        # Modifying the aligned array does not affect the cached array.
+        aligned.array[:] = 0
+        with mock.patch('analysis_engine.node.align') as align:
+            cached = self.cache.get_aligned(self.param, self.node)
+        self.assertFalse(align.called)
+        np.testing.assert_array_equal(cached.array, expected)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        # Another frequency is cached separately.
+        self.cache.get_aligned(self.param, P('Node', frequency=4, offset=0))
+        self.assertEqual(self.cache.stats()['misses'], 2)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_get_aligned_multistate(self):
+        param = M('Gear Down', np.ma.array([0, 1, 1, 0]),
+                  values_mapping={0: 'Up', 1: 'Down'}, frequency=1, offset=0)
+        self.cache.get_aligned(param, self.node)
+        aligned = self.cache.get_aligned(param, self.node)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertIsInstance(aligned, MultistateDerivedParameterNode)
+        self.assertEqual(aligned.values_mapping, {0: 'Up', 1: 'Down'})
+        self.assertEqual(aligned.array.raw.tolist(),
+                         [0, 1, 1, 1, 1, 0, None, None])
+
+    def test_get_aligned_not_required(self):
+        node = P('Node', frequency=1, offset=0)
+        aligned = self.cache.get_aligned(self.param, node)
+        self.assertEqual(aligned.array.tolist(), self.param.array.tolist())
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()['misses'], 0)
+
+    def test_invalidate(self):
+        self.cache.get_aligned(self.param, self.node)
+        self.cache.invalidate('Heading')
+        self.assertEqual(len(self.cache), 1)
+        self.cache.invalidate('Airspeed')
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()['bytes'], 0)
+        self.cache.get_aligned(self.param, self.node)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_max_bytes(self):
+        aligned = self.param.get_aligned(self.node).array
+        nbytes = aligned.nbytes + aligned.mask.nbytes
+        cache = AlignmentCache(max_bytes=nbytes * 2)
+        for frequency in (2, 4):
+            cache.get_aligned(self.param, P(frequency=frequency, offset=0))
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertTrue(cache.stats()['bytes'] <= nbytes * 2)
+        # Arrays larger than the cache are not stored.
+        cache.get_aligned(self.param, P(frequency=8, offset=0))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_get_derived(self):
+        class Example(DerivedParameterNode):
+            def derive(self, alt=P('Altitude STD'), airspeed=P('Airspeed')):
+                self.array = airspeed.array
+        alt = P('Altitude STD', np.ma.arange(20.0), frequency=2, offset=0.25)
+        node = Example()
+        node._alignment_cache = self.cache
+        node.get_derived([alt, self.param])
+        self.assertEqual(len(self.cache), 1)
+        node = Example()
+        node._alignment_cache = self.cache
+        result = node.get_derived([alt, self.param])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        np.testing.assert_array_equal(result.array,
+                                      self.param.get_aligned(alt).array)
+
+
 class TestNodeTypeAbbreviation(unittest.TestCase):
     def test_node_type_abbr_attribute(self):
         class NAME(DerivedParameterNode):
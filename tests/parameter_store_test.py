@@ -0,0 +1,129 @@
+import numpy as np
+import unittest
+
+from analysis_engine.node import P
+from analysis_engine.parameter_store import ParameterStore, ReferenceCounter
+
+
+class MockHDF(dict):
+    '''
+    Minimal dictionary based stand-in for hdf_file which records writes.
+    '''
+    duration = 10
+
+    def __init__(self, *args, **kwargs):
+        super(MockHDF, self).__init__(*args, **kwargs)
+        self.written = []
+
+    def get_param(self, name, valid_only=False):
+        return self[name]
+
+    def set_param(self, param):
+        self.written.append(param.name)
+        self[param.name] = param
+
+    def valid_param_names(self):
+        return self.keys()
+
+
+DEPENDENCIES = {
+    'Doubled': ['Raw'],
+    'Combined': ['Raw', 'Doubled'],
+    'Combined Max': ['Combined', 'Doubled'],
+}
+
+
+class TestReferenceCounter(unittest.TestCase):
+    def test_derived(self):
+        references = ReferenceCounter(DEPENDENCIES)
+        self.assertTrue(references.required('Raw'))
+        self.assertFalse(references.required('Combined Max'))
+        self.assertEqual(references.derived('Doubled'), [])
+        self.assertEqual(references.derived('Combined'), ['Raw'])
+        self.assertFalse(references.required('Raw'))
+        self.assertEqual(sorted(references.derived('Combined Max')),
+                         ['Combined', 'Combined Max', 'Doubled'])
+        self.assertFalse(references.required('Doubled'))
+
+    def test_duplicate_dependencies(self):
+        references = ReferenceCounter({'Node': ['Raw', 'Raw']})
+        self.assertEqual(references.derived('Node'), ['Node', 'Raw'])
+
+
+class TestParameterStore(unittest.TestCase):
+    def setUp(self):
+        self.hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10.0))})
+        self.references = ReferenceCounter(DEPENDENCIES)
+        self.store = ParameterStore(self.hdf, self.references,
+                                    max_bytes=1024 * 1024)
+
+    def test_get_param(self):
+        self.assertEqual(self.store.get_param('Raw').array.tolist(),
+                         range(10))
+        self.assertRaises(KeyError, self.store.get_param, 'Doubled')
+        self.store.set_param(P('Doubled', np.ma.arange(0, 20.0, 2)))
+        self.assertEqual(self.hdf.written, [])
+        doubled = self.store.get_param('Doubled', valid_only=True)
+        self.assertEqual(doubled.array.tolist(), range(0, 20, 2))
+        self.assertEqual(self.store.reads, 1)
+        # A copy of the array is returned.
+        doubled.array[:] = 0
+        self.assertEqual(self.store['Doubled'].array.tolist(),
+                         range(0, 20, 2))
+        self.assertTrue('Doubled' in self.store)
+        self.assertEqual(sorted(self.store.valid_param_names()),
+                         ['Doubled', 'Raw'])
+        # Other attributes are delegated to the HDF file.
+        self.assertEqual(self.store.duration, 10)
+
+    def _derived(self, name):
+        for released in self.references.derived(name):
+            self.store.release(released)
+
+    def test_release(self):
+        self.store.set_param(P('Doubled', np.ma.arange(10.0)))
+        self._derived('Doubled')
+        self.store.set_param(P('Combined', np.ma.arange(10.0)))
+        self._derived('Combined')
+        self._derived('Combined Max')
+        # Released parameters are kept until they have been written.
+        self.assertEqual(self.store.nbytes, self.store.peak_bytes)
+        self.store.flush()
+        self.assertEqual(self.hdf.written, ['Doubled', 'Combined'])
+        self.assertEqual(self.store.nbytes, 0)
+        self.assertEqual(self.store.writes, 2)
+
+    def test_flush_keep_required(self):
+        self.store.set_param(P('Doubled', np.ma.arange(10.0)))
+        self.store.flush(keep_required=True)
+        self.assertEqual(self.hdf.written, ['Doubled'])
+        # Doubled is required by Combined and Combined Max.
+        self.assertTrue(self.store.nbytes)
+        self.store.get_param('Doubled')
+        self.assertEqual(self.store.reads, 1)
+        self._derived('Combined')
+        self.assertTrue(self.store.nbytes)
+        # Written arrays are freed after the last consumer is derived.
+        self._derived('Combined Max')
+        self.assertEqual(self.store.nbytes, 0)
+        self.store.flush()
+        self.assertEqual(self.hdf.written, ['Doubled'])
+
+    def test_max_bytes(self):
+        array = np.ma.arange(10.0)
+        nbytes = array.nbytes + array.mask.nbytes
+        store = ParameterStore(self.hdf, self.references,
+                               max_bytes=nbytes * 2)
+        store.set_param(P('Doubled', array))
+        store.set_param(P('Combined', array))
+        self.assertEqual(self.hdf.written, [])
+        store.set_param(P('Combined Max', array))
+        self.assertEqual(self.hdf.written,
+                         ['Doubled', 'Combined', 'Combined Max'])
+        # Parameters which are still required are kept.
+        self.assertEqual(store.nbytes, nbytes * 2)
+        self.assertEqual(store.peak_bytes, nbytes * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
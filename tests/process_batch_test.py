@@ -0,0 +1,94 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from analysis_engine import process_batch
+from analysis_engine.process_batch import (
+    _process_segment,
+    expand_hdf_paths,
+    process_flights,
+)
+
+
+class TestExpandHDFPaths(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        for name in ('b.hdf5', 'a.hdf5', 'c.txt'):
+            open(os.path.join(self.tempdir, name), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_expand_hdf_paths(self):
+        a = os.path.join(self.tempdir, 'a.hdf5')
+        b = os.path.join(self.tempdir, 'b.hdf5')
+        self.assertEqual(expand_hdf_paths([self.tempdir]), [a, b])
+        self.assertEqual(
+            expand_hdf_paths([os.path.join(self.tempdir, 'a*'), a]), [a])
+        self.assertEqual(
+            expand_hdf_paths([os.path.join(self.tempdir, 'missing*')]), [])
+
+
+class TestProcessSegment(unittest.TestCase):
+    @mock.patch('analysis_engine.process_batch.process_flight')
+    def test_process_segment(self, process_flight):
+        process_flight.return_value = {'kpv': []}
+        derived_nodes = {'Node': object}
+        with mock.patch.object(process_batch, '_derived_nodes',
+                               derived_nodes):
+            res = _process_segment(('a.hdf5', 'G-ABCD',
+                                    {'aircraft_info': {'Family': 'B737'}}))
+        self.assertEqual(res, ('a.hdf5', {'kpv': []}, None))
+        process_flight.assert_called_once_with(
+            'a.hdf5', 'G-ABCD', aircraft_info={'Family': 'B737'},
+            derived_nodes=derived_nodes)
+
+    @mock.patch('analysis_engine.process_batch.process_flight')
+    def test_process_segment_error(self, process_flight):
+        process_flight.side_effect = ValueError('Broken')
+        hdf_path, res, error = _process_segment(
+            ('a.hdf5', 'G-ABCD', {'aircraft_info': {'Family': 'B737'}}))
+        self.assertEqual(hdf_path, 'a.hdf5')
+        self.assertEqual(res, None)
+        self.assertTrue('ValueError: Broken' in error)
+
+
+class TestProcessFlights(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.hdf_paths = [os.path.join(self.tempdir, name)
+                          for name in ('a.hdf5', 'b.hdf5')]
+        for hdf_path in self.hdf_paths:
+            open(hdf_path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    @mock.patch('analysis_engine.process_batch.get_api_handler')
+    @mock.patch('analysis_engine.process_batch.multiprocessing.Pool')
+    def _process_flights(self, tail_numbers, pool, get_api_handler):
+        # Return the arguments of each task rather than processing it.
+        pool.return_value.imap_unordered.side_effect = \
+            lambda func, tasks: [(hdf_path, (tail_number, kwargs), None)
+                                 for hdf_path, tail_number, kwargs in tasks]
+        return list(process_flights([self.tempdir], tail_numbers,
+                                    processes=1))
+
+    def test_process_flights(self):
+        a, b = self.hdf_paths
+        self.assertEqual(self._process_flights('G-ABCD'), [
+            (a, ('G-ABCD', {'additional_modules': []}), None),
+            (b, ('G-ABCD', {'additional_modules': []}), None),
+        ])
+
+    def test_process_flights_mixed_fleet(self):
+        a, b = self.hdf_paths
+        tail_numbers = {a: 'G-ABCD', os.path.relpath(b): 'G-EFGH'}
+        self.assertEqual(self._process_flights(tail_numbers), [
+            (a, ('G-ABCD', {'additional_modules': []}), None),
+            (b, ('G-EFGH', {'additional_modules': []}), None),
+        ])
+        self.assertRaises(ValueError, self._process_flights,
+                          {a: 'G-ABCD'})
@@ -1,5 +1,85 @@
+import numpy as np
 import unittest
 
+from datetime import datetime
+
+from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.node import (AlignmentCache, DerivedParameterNode,
+                                  FlightPhaseNode, KeyPointValueNode, KPV,
+                                  NodeManager, P)
+from analysis_engine.process_flight import (DerivedResults,
+                                            derive_parameters, store_result)
+from analysis_engine.profiler import NodeProfiler
+
+
+class MockHDF(dict):
+    '''
+    Minimal dictionary based stand-in for hdf_file.
+    '''
+    def __init__(self, params, duration):
+        super(MockHDF, self).__init__(params)
+        self.duration = duration
+
+    def get_param(self, name, valid_only=False):
+        return self[name]
+
+    def set_param(self, param):
+        self[param.name] = param
+
+    def valid_param_names(self):
+        return self.keys()
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class Incremented(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array + 1
+
+
+class Combined(DerivedParameterNode):
+    def derive(self, doubled=P('Doubled'), incremented=P('Incremented')):
+        self.array = doubled.array + incremented.array
+
+
+class Upsampled(DerivedParameterNode):
+    align_frequency = 2
+    align_offset = 0
+
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array
+
+
+class UpsampledDoubled(DerivedParameterNode):
+    align_frequency = 2
+    align_offset = 0
+
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class CombinedMax(KeyPointValueNode):
+    def derive(self, combined=P('Combined')):
+        index = np.ma.argmax(combined.array)
+        self.create_kpv(index, combined.array[index])
+
+
+class IncrementedMax(KeyPointValueNode):
+    def derive(self, incremented=P('Incremented')):
+        index = np.ma.argmax(incremented.array)
+        self.create_kpv(index, incremented.array[index])
+
+
+class CombinedMaxPlusOne(KeyPointValueNode):
+    def derive(self, combined_max=KPV('Combined Max')):
+        # Record the results held when this node is derived.
+        CombinedMaxPlusOne.held = sorted(self._p.keys())
+        for kpv in combined_max:
+            self.create_kpv(kpv.index, kpv.value + 1)
+
 
 class TestProcessFlight(unittest.TestCase):
 
@@ -15,3 +95,125 @@ class TestProcessFlight(unittest.TestCase):
         '''
         self.assertTrue(False, msg='Test not implemented.')
 
+
+class TestDeriveParameters(unittest.TestCase):
+
+    def _derive(self, workers):
+        hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))}, 10)
+        derived_nodes = dict((n.get_name(), n) for n in
+                             (Doubled, Incremented, Combined, CombinedMax,
+                              IncrementedMax))
+        node_mgr = NodeManager(datetime.now(), hdf.duration,
+                               hdf.valid_param_names(),
+                               ['Combined Max', 'Incremented Max'], [],
+                               derived_nodes, {}, {})
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        results = derive_parameters(hdf, node_mgr, process_order,
+                                    gr_st=gr_st, workers=workers)
+        return hdf, results
+
+    def test_derive_parameters(self):
+        hdf, results = self._derive(1)
+        kti_list, kpv_list, section_list, approach_list, flight_attrs = \
+            results
+        self.assertEqual(hdf['Combined'].array.tolist(),
+                         [3 * x + 1 for x in range(10)])
+        self.assertEqual(sorted((k.name, k.index, k.value) for k in kpv_list),
+                         [('Combined Max', 9, 28), ('Incremented Max', 9, 10)])
+
+    def test_derive_parameters_parallel(self):
+        serial_hdf, serial_results = self._derive(1)
+        parallel_hdf, parallel_results = self._derive(4)
+        self.assertEqual(sorted(serial_hdf.keys()),
+                         sorted(parallel_hdf.keys()))
+        for name in serial_hdf:
+            self.assertEqual(serial_hdf[name].array.tolist(),
+                             parallel_hdf[name].array.tolist())
+        # Results are returned in process order.
+        self.assertEqual(serial_results, parallel_results)
+
+    def test_derive_parameters_alignment_cache(self):
+        hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))}, 10)
+        derived_nodes = dict((n.get_name(), n) for n in
+                             (Upsampled, UpsampledDoubled))
+        node_mgr = NodeManager(datetime.now(), hdf.duration,
+                               hdf.valid_param_names(),
+                               ['Upsampled', 'Upsampled Doubled'], [],
+                               derived_nodes, {}, {})
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        alignment_cache = AlignmentCache()
+        derive_parameters(hdf, node_mgr, process_order,
+                          alignment_cache=alignment_cache)
+        # Raw is only aligned to 2Hz once.
+        stats = alignment_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        # Aligned arrays are freed once the flight has been processed.
+        self.assertEqual(len(alignment_cache), 0)
+        expected = np.ma.arange(0, 10, 0.5)
+        self.assertEqual(hdf['Upsampled'].array[:-1].tolist(),
+                         expected[:-1].tolist())
+        self.assertEqual(hdf['Upsampled Doubled'].array[:-1].tolist(),
+                         (expected[:-1] * 2).tolist())
+
+    def test_derive_parameters_releases_results(self):
+        hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))}, 10)
+        derived_nodes = dict((n.get_name(), n) for n in
+                             (Doubled, Incremented, Combined, CombinedMax,
+                              IncrementedMax, CombinedMaxPlusOne))
+        node_mgr = NodeManager(datetime.now(), hdf.duration,
+                               hdf.valid_param_names(),
+                               ['Incremented Max', 'Combined Max Plus One'],
+                               [], derived_nodes, {}, {})
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        kti_list, kpv_list, section_list, approach_list, flight_attrs = \
+            derive_parameters(hdf, node_mgr, process_order)
+        # Incremented Max is released as soon as it is derived as nothing
+        # depends upon it.
+        self.assertEqual(CombinedMaxPlusOne.held, ['Combined Max'])
+        self.assertEqual(
+            sorted((k.name, k.index, k.value) for k in kpv_list),
+            [('Combined Max', 9, 28), ('Combined Max Plus One', 9, 29),
+             ('Incremented Max', 9, 10)])
+
+    def test_derive_parameters_profiler(self):
+        hdf = MockHDF({'Raw': P('Raw', np.ma.arange(10))}, 10)
+        derived_nodes = dict((n.get_name(), n) for n in
+                             (Doubled, Upsampled, CombinedMax, Combined,
+                              Incremented))
+        node_mgr = NodeManager(datetime.now(), hdf.duration,
+                               hdf.valid_param_names(),
+                               ['Upsampled', 'Combined Max'], [],
+                               derived_nodes, {}, {})
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        profiler = NodeProfiler()
+        derive_parameters(hdf, node_mgr, process_order, profiler=profiler)
+        self.assertEqual(
+            sorted(profiler.profiles),
+            ['Combined', 'Combined Max', 'Doubled', 'Incremented',
+             'Upsampled'])
+        upsampled = profiler.profiles['Upsampled']
+        self.assertEqual(upsampled.node_type, 'Parameter')
+        self.assertEqual(upsampled.input_arrays, 1)
+        self.assertEqual(upsampled.output_bytes,
+                         hdf['Upsampled'].array.nbytes +
+                         hdf['Upsampled'].array.mask.nbytes)
+        self.assertTrue(upsampled.align_time > 0)
+        self.assertTrue(upsampled.wall_time >= upsampled.align_time)
+        self.assertEqual(profiler.profiles['Combined'].input_arrays, 2)
+        self.assertEqual(profiler.profiles['Combined Max'].node_type, 'KPV')
+        self.assertEqual(profiler.profiles['Combined Max'].output_bytes, 0)
+
+    def test_store_result_profiler_section(self):
+        hdf = MockHDF({}, 10)
+        node_mgr = NodeManager(datetime.now(), hdf.duration, [], [], [], {},
+                               {}, {})
+        section = FlightPhaseNode('Airborne', frequency=1)
+        section.create_section(slice(2, 8))
+        results = DerivedResults()
+        profiler = NodeProfiler()
+        store_result('Airborne', section, hdf, node_mgr, {}, results,
+                     profiler=profiler)
+        self.assertEqual(len(results.section_list), 1)
+        # The time taken to store the sections rather than since the epoch.
+        write_time = profiler.profiles['Airborne'].write_time
+        self.assertTrue(0 <= write_time < 1)
@@ -0,0 +1,87 @@
+import csv
+import mock
+import numpy as np
+import os
+import shutil
+import simplejson as json
+import tempfile
+import unittest
+
+from analysis_engine.node import KPV, P
+from analysis_engine.profiler import NodeProfiler
+
+
+class MockHDF(object):
+    def __init__(self):
+        self.attrs = {}
+
+    def set_attr(self, name, value):
+        self.attrs[name] = value
+
+    def get_attr(self, name, default=None):
+        return self.attrs.get(name, default)
+
+
+class TestNodeProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = NodeProfiler()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _profile(self):
+        deps = [P('Airspeed', np.ma.arange(10.0)), None,
+                KPV('Airspeed Max')]
+        self.profiler.record_read('Doubled', 'Parameter', deps, 0.5)
+        result = self.profiler.derive(
+            'Doubled', 'Parameter', lambda d: P('Doubled', d.array * 2),
+            deps[0])
+        self.profiler.record_write('Doubled', 0.25)
+        return result
+
+    @mock.patch('analysis_engine.profiler.get_memory_usage')
+    def test_derive(self, get_memory_usage):
+        get_memory_usage.side_effect = [1000, 1500]
+        result = self._profile()
+        self.assertEqual(result.array.tolist(), range(0, 20, 2))
+        profile = self.profiler.profiles['Doubled']
+        self.assertEqual(profile.node_type, 'Parameter')
+        self.assertEqual(profile.read_time, 0.5)
+        self.assertEqual(profile.write_time, 0.25)
+        self.assertTrue(profile.wall_time >= 0)
+        self.assertTrue(profile.cpu_time >= 0)
+        self.assertEqual(profile.memory_delta, 500)
+        self.assertEqual(profile.input_arrays, 1)
+        self.assertEqual(profile.input_bytes, 81)
+        self.assertEqual(profile.output_bytes, 81)
+
+    def test_write(self):
+        self._profile()
+        self.profiler.get('Airspeed Max', 'KPV')
+        json_path = os.path.join(self.tempdir, 'profile.json')
+        self.profiler.write(json_path)
+        with open(json_path) as json_file:
+            profiles = json.load(json_file)
+        self.assertEqual([p['name'] for p in profiles],
+                         ['Doubled', 'Airspeed Max'])
+        self.assertEqual(profiles[0]['read_time'], 0.5)
+        csv_path = os.path.join(self.tempdir, 'profile.csv')
+        self.profiler.write(csv_path)
+        with open(csv_path) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual([r['name'] for r in rows],
+                         ['Doubled', 'Airspeed Max'])
+        self.assertEqual(rows[1]['node_type'], 'KPV')
+        self.assertEqual(rows[0]['write_time'], '0.25')
+
+    def test_store(self):
+        hdf = MockHDF()
+        self.assertEqual(NodeProfiler.load(hdf), None)
+        self._profile()
+        self.profiler.store(hdf)
+        self.assertEqual(NodeProfiler.load(hdf), self.profiler.as_dicts())
+
+
+if __name__ == '__main__':
+    unittest.main()
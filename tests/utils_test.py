@@ -4,6 +4,7 @@ from mock import Mock, patch
 
 from analysis_engine.utils import (
     derived_trimmer,
+    get_memory_usage,
     list_derived_parameters,
     list_everything,
     list_flight_attributes,
@@ -12,6 +13,7 @@ from analysis_engine.utils import (
     list_ktis,
     list_lfl_parameter_dependencies,
     list_parameters,
+    PeakMemory,
     )
 
 class TestTrimmer(unittest.TestCase):
@@ -114,3 +116,18 @@ class TestGetNames(unittest.TestCase):
         self.assertIn('Bounced Landing', phases)
 
 
+class TestPeakMemory(unittest.TestCase):
+    @patch('analysis_engine.utils.get_memory_usage')
+    def test_sample(self, get_memory_usage):
+        get_memory_usage.return_value = 100
+        peak_memory = PeakMemory()
+        self.assertEqual(peak_memory.peak, 100)
+        get_memory_usage.return_value = 300
+        self.assertEqual(peak_memory.sample(), 300)
+        get_memory_usage.return_value = 200
+        self.assertEqual(peak_memory.sample(), 200)
+        self.assertEqual(peak_memory.peak, 300)
+
+    def test_get_memory_usage(self):
+        usage = get_memory_usage()
+        self.assertTrue(usage is None or usage > 0)